@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the bulk track parsers against the line by line readers
+
+Usage: python benchmarks/bench_parsers.py [tracks ...]
+
+For each set of tracks (default: BHAC15 Siess00 F16_std F16_mag) it reads the track
+files with the reference line by line reader and with the PMSTracks reader, checks
+that the two return identical tracks and prints the timings and the speedup.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pmstracks import PMSTracks
+from reference_readers import REFERENCE_READERS, same_tracks
+
+
+def best_time(func, repeat):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, result
+
+
+def main(args):
+    names = args if args else ['BHAC15', 'Siess00', 'F16_std', 'F16_mag']
+    print('{0:10s} {1:>12s} {2:>12s} {3:>8s} {4:>10s}'.format('tracks', 'line [s]', 'bulk [s]', 'speedup', 'identical'))
+    for name in names:
+        ptrk = PMSTracks(name, cache=False)
+        repeat = 1 if name == 'F16_std' else 3
+        t_ref, (m_ref, trk_ref) = best_time(lambda: REFERENCE_READERS[name](ptrk.infile_models), repeat)
+        t_new, (m_new, trk_new) = best_time(ptrk.reader, repeat)
+        print('{0:10s} {1:12.4f} {2:12.4f} {3:8.1f} {4:>10s}'.format(name, t_ref, t_new, t_ref/t_new,
+                                                                    str(same_tracks(m_ref, trk_ref, m_new, trk_new))))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
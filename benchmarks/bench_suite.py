@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the PMSTracks operations
+
+Usage: python benchmarks/bench_suite.py [-t TRACKS ...] [-o results.json] [--compare old.json] [--quick]
+
+For each set of tracks (default: BHAC15 Siess00 F16_std F16_mag) it times:
+  load_parse      reading and parsing the track files (no cache)
+  load_cache      loading the tracks from the binary cache
+  interp_scalar   interpolator_bilinear(), one point per call
+  interp_batch    interpolator_bilinear_batch() on an array of points
+  interp_multi    interpolator_bilinear_multi() for llum and teff at once
+  trk_dist        two_iso(), the per-point nearest tracks search
+  invert_index    construction of the HR diagram inversion index
+  invert_batch    invert_hrd() on an array of points
+  plot_tracks     plot_tracks() rendered on an Agg canvas
+The best time of --repeat runs is recorded, and the peak memory allocated by each case
+is measured (with tracemalloc) in a separate run, so that it does not affect the timings.
+
+The golden checks compare each fast path with its reference: the bulk parsers with the
+line by line readers, the batch and multi-label interpolation with interpolator_bilinear(),
+domain_status() with the batch status, and invert_hrd() with the forward interpolation.
+
+The results are written in JSON (with the git commit and the versions of the packages),
+--compare prints the ratio of the timings with a previous run and flags the regressions.
+The exit status is 1 if a golden check fails.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import scipy
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from pmstracks import PMSTracks
+from reference_readers import REFERENCE_READERS, same_tracks
+
+TRACK_SETS = ['BHAC15', 'Siess00', 'F16_std', 'F16_mag']
+
+
+def best_time(func, repeat):
+    best = None
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def random_points(pms, n, seed):
+    # masses uniform in log within the tracks and ages within the range of all the tracks
+    rng = np.random.default_rng(seed)
+    mass = 10.**rng.uniform(np.log10(pms.mass[0]), np.log10(pms.mass[-1]), n)
+    age = rng.uniform(pms.age_min.min(), pms.age_max.max(), n)
+    return mass, age
+
+
+def metadata():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        commit = None
+    return {'commit': commit, 'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'matplotlib': matplotlib.__version__, 'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+
+def cases(name, pms, sizes):
+    """
+    return the list of (case, number of points, function) for a set of tracks
+    """
+    mass, age = random_points(pms, sizes['batch'], 1)
+    smass, sage = mass[:sizes['scalar']], age[:sizes['scalar']]
+    values, status = pms.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    llum, teff = values['llum'], values['teff']
+    nd = sizes['trk_dist']
+
+    def interp_scalar():
+        for m, a in zip(smass, sage):
+            pms.interpolator_bilinear(m, a, 'llum')
+
+    def trk_dist():
+        for lum, t in zip(llum[:nd], teff[:nd]):
+            pms.two_iso(lum, t)
+
+    def invert_index():
+        pms._hrd_index = None
+        pms.invert_hrd(0., 4000.)
+
+    def plot():
+        fig, ax = plt.subplots()
+        pms.plot_tracks(ax)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    return [('load_parse', 1, lambda: PMSTracks(name, cache=False)),
+            ('load_cache', 1, lambda: PMSTracks(name)),
+            ('interp_scalar', len(smass), interp_scalar),
+            ('interp_batch', len(mass), lambda: pms.interpolator_bilinear_batch(mass, age, 'llum')),
+            ('interp_multi', len(mass), lambda: pms.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])),
+            ('trk_dist', nd, trk_dist),
+            ('invert_index', 1, invert_index),
+            ('invert_batch', len(llum), lambda: pms.invert_hrd(llum, teff)),
+            ('plot_tracks', 1, plot)]
+
+
+def golden_checks(name, pms, nscalar):
+    """
+    return the list of the golden checks for a set of tracks, as dictionaries
+    """
+    checks = []
+    #
+    # bulk parsers against the line by line readers
+    m_ref, trk_ref = REFERENCE_READERS[name](pms.infile_models)
+    m_new, trk_new = pms.reader()
+    checks.append({'check': 'parsers', 'passed': bool(same_tracks(m_ref, trk_ref, m_new, trk_new))})
+    #
+    # batch interpolation against the scalar one, including the tracks masses and the edges
+    mass, age = random_points(pms, nscalar, 2)
+    mass = np.concatenate([mass, pms.mass, [pms.mass[0]*0.9, pms.mass[-1]*1.1]])
+    age = np.concatenate([age, pms.age_min, [pms.age_min[0]-1., pms.age_max[-1]+1.]])
+    multi, mstatus = pms.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    for label in ('llum', 'teff'):
+        ref = np.array([pms.interpolator_bilinear(m, a, label)[0] for m, a in zip(mass, age)], dtype=float)
+        ref_status = np.array([pms.interpolator_bilinear(m, a, label)[1] for m, a in zip(mass, age)])
+        batch, status = pms.interpolator_bilinear_batch(mass, age, label)
+        checks.append({'check': 'batch_' + label,
+                       'passed': bool(np.array_equal(batch, ref, equal_nan=True) and
+                                      np.array_equal(status, ref_status))})
+        checks.append({'check': 'multi_' + label,
+                       'passed': bool(np.array_equal(multi[label], ref, equal_nan=True) and
+                                      np.array_equal(mstatus, ref_status))})
+    #
+    # domain bitmask against the interpolation status
+    domain = pms.domain_status(mass, age)
+    checks.append({'check': 'domain_status',
+                   'passed': bool(np.array_equal((domain & 63) != 0, mstatus != 0))})
+    #
+    # inversion of the forward interpolation, for the points inside the tracks
+    ok = mstatus == 0
+    imass, iage, istatus = pms.invert_hrd(multi['llum'][ok], multi['teff'][ok])
+    good = istatus == 0
+    err = np.abs(imass[good]/mass[ok][good]-1.)
+    checks.append({'check': 'invert_roundtrip', 'passed': bool(good.any() and np.median(err) < 0.01),
+                   'median_mass_error': float(np.median(err)) if good.any() else None,
+                   'fraction_inverted': float(good.mean())})
+    for check in checks:
+        check['tracks'] = name
+    return checks
+
+
+def compare(results, filename, threshold):
+    with open(filename) as f:
+        old = json.load(f)
+    old_times = dict(((r['tracks'], r['case']), r['seconds']) for r in old['results'])
+    print('\nComparison with {0} (commit {1})'.format(filename, old['meta'].get('commit')))
+    nslow = 0
+    for r in results:
+        key = (r['tracks'], r['case'])
+        if key in old_times:
+            ratio = r['seconds']/old_times[key]
+            flag = ''
+            if ratio > 1.+threshold:
+                flag = 'SLOWER'
+                nslow += 1
+            print('{0:10s} {1:15s} {2:8.2f} {3}'.format(key[0], key[1], ratio, flag))
+    return nslow
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PMSTracks benchmark suite')
+    parser.add_argument('-t', '--tracks', nargs='+', default=TRACK_SETS, choices=TRACK_SETS)
+    parser.add_argument('-o', '--output', default=None, help='JSON file for the results')
+    parser.add_argument('--compare', default=None, help='JSON results of a previous run')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slowdown flagged as a regression, default is 0.2')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per case, default is 3')
+    parser.add_argument('--quick', action='store_true', help='smaller samples')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the memory runs')
+    args = parser.parse_args(argv)
+    #
+    if args.quick:
+        sizes = {'scalar': 200, 'batch': 20000, 'trk_dist': 20, 'golden': 200}
+    else:
+        sizes = {'scalar': 2000, 'batch': 200000, 'trk_dist': 200, 'golden': 1000}
+    results = []
+    checks = []
+    print('{0:10s} {1:15s} {2:>10s} {3:>14s} {4:>10s}'.format('tracks', 'case', 'time [s]', 'points/s', 'peak [MB]'))
+    for name in args.tracks:
+        pms = PMSTracks(name)
+        for case, npoints, func in cases(name, pms, sizes):
+            repeat = 1 if case.startswith('load') and name == 'F16_std' else args.repeat
+            seconds = best_time(func, repeat)
+            peak = peak_memory(func) if args.memory else None
+            results.append({'tracks': name, 'case': case, 'seconds': seconds, 'points': npoints,
+                            'points_per_second': npoints/seconds, 'peak_bytes': peak})
+            print('{0:10s} {1:15s} {2:10.4f} {3:14.1f} {4:>10s}'.format(
+                name, case, seconds, npoints/seconds, '{:.1f}'.format(peak/1.e6) if peak is not None else '-'))
+        checks.extend(golden_checks(name, pms, sizes['golden']))
+    #
+    print('\nGolden checks')
+    for check in checks:
+        print('{0:10s} {1:20s} {2}'.format(check['tracks'], check['check'], 'ok' if check['passed'] else 'FAILED'))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(), 'sizes': sizes, 'results': results, 'checks': checks}, f, indent=1)
+    if args.compare is not None:
+        compare(results, args.compare, args.threshold)
+    return 0 if all(check['passed'] for check in checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+
+#
+# Line by line readers, as they were implemented in PMSTracks before the
+#   bulk parsers of pmstracks.parsers. They are kept here as the reference
+#   for the benchmarks and for checking that the fast readers return exactly
+#   the same tracks.
+
+
+def _make_track(mstar, age, lum, teff):
+    return {'model_mass': mstar, 'mass': mstar * np.ones(len(age)),
+            'nage': len(age), 'lage': np.array(age),
+            'llum': np.array(lum), 'teff': np.array(teff)}
+
+
+def reader_feiden16_std(infiles):
+    mstar = []
+    tracks = []
+    for i_f in infiles:
+        age = []
+        lum = []
+        teff = []
+        f = open(i_f, 'r')
+        for line in f.readlines():
+            if line[0] != '#':
+                columns = line.split()
+                age.append(np.log10(float(columns[0])))
+                lum.append(float(columns[3]))
+                teff.append(10**float(columns[1]))
+            else:
+                if len(line) > 8:
+                    if line[2] == 'M':
+                        mstar.append(float(line[4:8]))
+        f.close()
+        tracks.append(_make_track(mstar[-1], age, lum, teff))
+    return np.array(mstar), tracks
+
+
+def reader_feiden16_mag(infiles):
+    mstar = []
+    tracks = []
+    for i_f in infiles:
+        age = []
+        lum = []
+        teff = []
+        f = open(i_f, 'r')
+        for line in f.readlines():
+            if len(line) > 23:
+                if line[0] != '#':
+                    columns = line.split()
+                    age.append(np.log10(float(columns[2]))+9.)
+                    lum.append(float(columns[3]))
+                    teff.append(10**float(columns[6]))
+                else:
+                    if line[2:12] == 'Total mass':
+                        mstar.append(float(line[16:23]))
+        f.close()
+        tracks.append(_make_track(mstar[-1], age, lum, teff))
+    return np.array(mstar), tracks
+
+
+def reader_siess00(infiles):
+    mstar = []
+    tracks = []
+    for i_f in infiles:
+        age = []
+        lum = []
+        teff = []
+        isfirst = True
+        f = open(i_f, 'r')
+        for line in f.readlines():
+            if line[0] != '#':
+                columns = line.split()
+                if isfirst:
+                    mstar.append(float(columns[9]))
+                    isfirst = False
+                age.append(np.log10(float(columns[10])))
+                lum.append(np.log10(float(columns[2])))
+                teff.append(float(columns[6]))
+        f.close()
+        tracks.append(_make_track(mstar[-1], age, lum, teff))
+    return np.array(mstar), tracks
+
+
+def reader_bhac15(infile):
+    doread = False
+    mstar = []
+    tracks = []
+    age = []
+    lum = []
+    teff = []
+    newmass = True
+    f = open(infile, 'r')
+    dowrite = False
+    for line in f.readlines():
+        if doread:
+            if line[0] == '!':
+                if dowrite and (not newmass):
+                    tracks.append(_make_track(mstar[-1], age, lum, teff))
+                    dowrite = False
+                    newmass = True
+                    age = []
+                    lum = []
+                    teff = []
+            elif line[0] == '\n':
+                pass
+            else:
+                dowrite = True
+                columns = line.split()
+                if newmass:
+                    mstar.append(float(columns[0]))
+                    newmass = False
+                age.append(float(columns[1]))
+                lum.append(float(columns[3]))
+                teff.append(float(columns[2]))
+        else:
+            if line[0] == '!':
+                doread = True
+    f.close()
+    return np.array(mstar), tracks
+
+
+REFERENCE_READERS = {'BHAC15': reader_bhac15, 'Siess00': reader_siess00,
+                     'F16_std': reader_feiden16_std, 'F16_mag': reader_feiden16_mag}
+
+
+def same_tracks(mass1, tracks1, mass2, tracks2):
+    """
+    Returns True if the two sets of tracks are identical (same keys, same values bit by bit)
+    """
+    if not np.array_equal(mass1, mass2) or len(tracks1) != len(tracks2):
+        return False
+    for trk1, trk2 in zip(tracks1, tracks2):
+        if set(trk1.keys()) != set(trk2.keys()):
+            return False
+        for lab in trk1:
+            if not np.array_equal(trk1[lab], trk2[lab]):
+                return False
+    return True
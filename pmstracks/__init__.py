@@ -1,27 +1,51 @@
 from ._version import __version__
 
 import os
-import matplotlib
-
-# To avoid Runtime Error
-# RuntimeError: Python is not installed as a framework. The Mac OS X backend
-# will not be able to function correctly if Python is not installed as a framework.
-# See the Python documentation for more information on installing Python as a
-# framework on Mac OS X. Please either reinstall Python as a framework, or try
-# one of the other backends.
-# If you are using (Ana)Conda please install python.app and replace the use of
-# 'python' with 'pythonw'.
-# See 'Working with Matplotlib on OSX' in the Matplotlib FAQ for more information.
-# https://matplotlib.org/faq/osx_framework.html
-
-if matplotlib.get_backend().lower() == 'macosx':
-    matplotlib.use('TkAgg')
+import importlib
 
 #print('{}'.format(__path__))
 #TRACKS_DIR = os.path.join(os.path.split(__path__[0])[0],'tracks')
 TRACKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),'tracks')
 
-print('tracks_dir: '+TRACKS_DIR)
+#
+# The modules are imported the first time one of their objects is used, so that
+#   importing pmstracks is fast (numpy, scipy and matplotlib are not imported).
+#   matplotlib is never imported by the package, plot_tracks() draws on the axes it receives.
+_LAZY = {'PMSTracks': 'pmstracks',
+         'TrackLattice': 'lattice',
+         'HRDInversion': 'inversion',
+         'LRUCache': 'lru',
+         'TrackStore': 'store',
+         'PhotometricGrid': 'photometry',
+         'TrackGrid': 'grid',
+         'TrackEnsemble': 'ensemble',
+         'Population': 'population',
+         'instrument': None,
+         'registry': None}
 
-from .pmstracks import PMSTracks
+# the lazy objects are also exported by 'from pmstracks import *'
+__all__ = list(_LAZY) + ['list_tracks', 'TRACKS_DIR']
 
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module 'pmstracks' has no attribute '{}'".format(name))
+    if _LAZY[name] is None:
+        value = importlib.import_module('.'+name, __name__)
+    else:
+        value = getattr(importlib.import_module('.'+_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_LAZY.keys()))
+
+
+def list_tracks():
+    """
+    return the registered track sets with their files, mass and age ranges, without reading them
+    (see registry.list_tracks())
+    """
+    from . import registry
+    return registry.list_tracks(TRACKS_DIR)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import os
+import re
+import json
+import hashlib
+import tempfile
+
+from ._version import __version__
+
+#
+# Version of the layout of the cache files, bump it whenever the content
+#   of the cache files changes so that old caches are ignored. The version of the
+#   package is also part of the key, so that a change of the readers invalidates them
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    """
+    Returns the default directory for the tracks cache
+
+    The directory is taken from the PMSTRACKS_CACHE_DIR environment variable if defined,
+    otherwise it is $XDG_CACHE_HOME/pmstracks or ~/.cache/pmstracks
+
+    """
+    cache_dir = os.environ.get('PMSTRACKS_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+    xdg = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(xdg, 'pmstracks')
+
+
+def files_signature(infiles):
+    """
+    Returns the signature of a set of track files
+
+    The signature is a list of [file name, size, modification time] for each file, sorted
+    by name, and it is used to invalidate the cache when any of the source files change.
+
+    Parameters
+    ----------
+    infiles : string or list of strings
+
+    file name or list of file names containing the tracks
+
+    Returns
+    -------
+    signature : list
+
+    """
+    if isinstance(infiles, str):
+        infiles = [infiles]
+    signature = []
+    for i_f in sorted(infiles):
+        st = os.stat(i_f)
+        signature.append([os.path.abspath(i_f), st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def cache_file(cache_dir, tracks_name, options=None):
+    """
+    Returns the name of the cache file for a set of tracks
+
+    Parameters
+    ----------
+    cache_dir : string
+
+    directory containing the cache files
+
+    tracks_name : string
+
+    string code for the tracks
+
+    options : dictionary
+
+    reader options that change the content of the tracks, they are hashed in the file name
+
+    Returns
+    -------
+    file name of the cache
+
+    """
+    key = json.dumps({'tracks': tracks_name, 'options': options, 'format': CACHE_FORMAT,
+                      'version': __version__}, sort_keys=True)
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, '{0}_{1}.npz'.format(tracks_name, digest))
+
+
+def prune_cache(filename):
+    """
+    Removes the other cache files of the same set of tracks
+
+    The cache files written by other versions of the package, or with other options,
+    are never read again, they are removed when a new cache file of the set is written
+    so that the cache directory does not grow without bound.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the cache file to be kept, as returned by cache_file()
+
+    Returns
+    -------
+    list of the removed files
+
+    """
+    cache_dir, name = os.path.split(filename)
+    tracks_name = name[:-len('_000000000000.npz')]
+    pattern = re.compile(re.escape(tracks_name)+r'_[0-9a-f]{12}\.npz$')
+    removed = []
+    for other in os.listdir(cache_dir):
+        if other != name and pattern.match(other):
+            os.remove(os.path.join(cache_dir, other))
+            removed.append(os.path.join(cache_dir, other))
+    return removed
+
+
+def save_tracks(filename, mass, tracks, signature):
+    """
+    Saves the mass and tracks returned by a reader in a cache file
+
+    All the per-timestep arrays of the tracks are concatenated in one array per label
+    and saved together with the offsets of each track in a (uncompressed) npz file.
+    The redundant 'mass' and 'nage' entries of the tracks are not saved, they are
+    recreated when reading the cache.
+    The file is first written to a temporary file and then moved in place, so that
+    concurrent processes never read a partially written cache.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the cache file
+
+    mass : numpy array
+
+    mass of each track
+
+    tracks : list of track dictionaries
+
+    signature : list
+
+    signature of the track files, as returned by files_signature()
+
+    """
+    nage = np.array([trk['nage'] for trk in tracks], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(nage)])
+    labels = [lab for lab in sorted(tracks[0].keys()) if lab not in ('model_mass', 'mass', 'nage')]
+    data = {'mass': np.asarray(mass), 'offsets': offsets,
+            'model_mass': np.array([trk['model_mass'] for trk in tracks]),
+            'header': np.array(json.dumps({'format': CACHE_FORMAT, 'version': __version__,
+                                           'signature': signature, 'labels': labels}))}
+    for lab in labels:
+        data['col_'+lab] = np.concatenate([trk[lab] for trk in tracks])
+    #
+    cache_dir = os.path.dirname(filename)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    fd, tmpname = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **data)
+        os.replace(tmpname, filename)
+    except Exception:
+        os.remove(tmpname)
+        raise
+
+
+def load_tracks(filename, signature):
+    """
+    Reads the mass and tracks from a cache file
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the cache file
+
+    signature : list
+
+    signature of the track files, as returned by files_signature()
+
+    Returns
+    -------
+    mass, tracks
+
+    the same values returned by the reader that created the cache, or None, None
+    if the cache does not exist or it is not valid for this signature
+
+    """
+    if not os.path.isfile(filename):
+        return None, None
+    with np.load(filename) as data:
+        header = json.loads(str(data['header']))
+        if (header['format'] != CACHE_FORMAT or header.get('version') != __version__ or
+                header['signature'] != signature):
+            return None, None
+        mass = data['mass']
+        offsets = data['offsets']
+        model_mass = data['model_mass'].tolist()
+        columns = {lab: data['col_'+lab] for lab in header['labels']}
+    #
+    tracks = []
+    for i in range(len(model_mass)):
+        n = int(offsets[i+1]-offsets[i])
+        trk = {'model_mass': model_mass[i], 'mass': model_mass[i] * np.ones(n), 'nage': n}
+        for lab in header['labels']:
+            trk[lab] = columns[lab][offsets[i]:offsets[i+1]]
+        tracks.append(trk)
+    return mass, tracks
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import sys
+import argparse
+import itertools
+import collections
+import concurrent.futures
+import numpy as np
+
+from .pmstracks import PMSTracks
+from . import registry
+
+#
+# pmstracks-derive: derives the stellar parameters for the stars of a catalog.
+#   The catalog is read in chunks of lines, each chunk is parsed, interpolated
+#   (forward: mass, age -> L, Teff; inverse: L, Teff -> mass, age) and written out
+#   before reading the next one, so that the memory used does not depend on the
+#   size of the catalog. The input lines are copied to the output with the derived
+#   columns appended.
+#
+# The status column has the codes of interpolator_bilinear_multi() (forward) or of
+#   invert_hrd() (inverse), and BAD_INPUT for the lines where an input field is
+#   missing, is not a number or is not finite (the derived values are then nan).
+
+MODES = {'forward': {'input': ('mass', 'age'), 'output': ('llum', 'teff', 'status')},
+         'inverse': {'input': ('llum', 'teff'), 'output': ('mass', 'age', 'status')}}
+
+# status of the lines with missing or non finite inputs, the DOMAIN_NOT_FINITE bit of domain_status()
+BAD_INPUT = PMSTracks.DOMAIN_NOT_FINITE
+
+# tracks used by the chunks processing, in the main process or in each worker
+_tracks = None
+
+
+def _init_worker(descriptor):
+    global _tracks
+    _tracks = PMSTracks.attach(descriptor)
+
+
+def _split(line, delimiter):
+    return line.split(delimiter) if delimiter is not None else line.split()
+
+
+def _to_float(values):
+    # the fields that are not numbers (e.g. empty fields in csv files) become nan
+    try:
+        return np.asarray(values, dtype=float)
+    except ValueError:
+        out = np.empty(len(values))
+        for i, v in enumerate(values):
+            try:
+                out[i] = float(v)
+            except ValueError:
+                out[i] = np.nan
+        return out
+
+
+def derive_chunk(lines, mode, usecols, delimiter, fmt):
+    """
+    Derives the parameters for a chunk of catalog lines
+
+    Parameters
+    ----------
+    lines : list of strings
+
+    data lines of the catalog, without the newline
+
+    mode : string
+
+    'forward' or 'inverse'
+
+    usecols : list of two integers
+
+    indices of the two input columns (mass, age or Log10(L/Lsun), Teff)
+
+    delimiter : string
+
+    field delimiter, None for whitespace
+
+    fmt : string
+
+    format of the derived floating point values, e.g. '%.8g'
+
+    Returns
+    -------
+    out : string
+
+    the output lines, with the derived values appended to the input lines, the lines
+    with missing or non finite inputs have nan values and status BAD_INPUT
+
+    """
+    fields = [_split(line, delimiter) for line in lines]
+    x = []
+    for ic in usecols:
+        x.append(_to_float([f[ic] if len(f) > ic else '' for f in fields]))
+    if mode == 'forward':
+        values, status = _tracks.interpolator_bilinear_multi(x[0], x[1], ['llum', 'teff'])
+        columns = [values['llum'], values['teff']]
+    else:
+        mass, age, status = _tracks.invert_hrd(x[0], x[1])
+        columns = [mass, age]
+    bad = ~(np.isfinite(x[0]) & np.isfinite(x[1]))
+    if bad.any():
+        columns = [np.where(bad, np.nan, col) for col in columns]
+        status = np.where(bad, BAD_INPUT, status)
+    sep = delimiter if delimiter is not None else ' '
+    derived = [[fmt % v for v in col.tolist()] for col in columns]
+    derived.append([str(v) for v in status.tolist()])
+    return ''.join(sep.join([line] + list(vals)) + '\n' for line, vals in zip(lines, zip(*derived)))
+
+
+def _data_lines(f, comment):
+    for line in f:
+        line = line.rstrip('\r\n')
+        if line.strip() and not line.startswith(comment):
+            yield line
+
+
+def _first_lines(f, comment):
+    #
+    # the first non blank line that is not a comment, and the last comment line before it
+    commented = None
+    for line in f:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        if not line.startswith(comment):
+            return commented, line
+        commented = line
+    return commented, None
+
+
+def _is_number(field):
+    try:
+        float(field)
+    except ValueError:
+        return False
+    return True
+
+
+def _chunks(lines, chunk_size):
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _column_index(spec, names):
+    try:
+        return int(spec)
+    except ValueError:
+        pass
+    if names is None or spec not in names:
+        raise ValueError("column {} not found in the header".format(spec))
+    return names.index(spec)
+
+
+def derive_catalog(infile, outfile, tracks='BHAC15', mode='forward', columns=None, delimiter=None,
+                   header=True, chunk_size=100000, n_workers=None, fmt='%.8g', comment='#',
+                   verbose=False):
+    """
+    Derives the stellar parameters for all the stars of a catalog, processing it in chunks
+
+    Parameters
+    ----------
+    infile, outfile : file objects
+
+    input catalog and output file (text mode)
+
+    tracks : string
+
+    track set, one of registry.track_names(), default is 'BHAC15'
+
+    mode : string
+
+    'forward' (mass, age -> Log10(L/Lsun), Teff) or 'inverse' (Log10(L/Lsun), Teff -> mass, age),
+    default is 'forward'. Ages are in the units of the tracks, Log10(age/yr)
+
+    columns : list of two strings
+
+    names (from the header) or indices of the two input columns, default are the
+    names of the MODES input columns
+
+    delimiter : string
+
+    field delimiter, default is None: ',' if the first line contains a ',', whitespace otherwise
+
+    header : boolean
+
+    the catalog has a header with the column names, default is True. The header is the
+    first line, or the last comment line before it if the first line has numbers (e.g.
+    '# mass age'); in this case the comment line is also the header of the output
+
+    chunk_size : integer
+
+    number of lines processed at once, default is 100000
+
+    n_workers : integer
+
+    number of worker processes, default is None (the chunks are processed in this
+    process). The tracks are loaded once and shared with the workers, and at most
+    2*n_workers chunks are in memory at the same time
+
+    fmt : string
+
+    format of the derived values, default is '%.8g'
+
+    comment : string
+
+    lines starting with this string are skipped, default is '#'
+
+    verbose : boolean
+
+    print the progress on stderr, default is False
+
+    Returns
+    -------
+    nlines : integer, the number of catalog lines processed
+
+    """
+    global _tracks
+    commented, first = _first_lines(infile, comment)
+    if first is None:
+        return 0
+    lines = _data_lines(infile, comment)
+    if delimiter is None and ',' in first:
+        delimiter = ','
+    names = None
+    if header and commented is not None and any(_is_number(field) for field in _split(first, delimiter)):
+        # commented header, the first line is already data
+        names = [name.strip() for name in _split(commented[len(comment):], delimiter)]
+        lines = itertools.chain([first], lines)
+        first = commented
+    elif header:
+        names = [name.strip() for name in _split(first, delimiter)]
+    else:
+        lines = itertools.chain([first], lines)
+    if columns is None:
+        columns = MODES[mode]['input']
+    usecols = [_column_index(col, names) for col in columns]
+    #
+    sep = delimiter if delimiter is not None else ' '
+    if header:
+        outfile.write(sep.join([first] + list(MODES[mode]['output'])) + '\n')
+    _tracks = PMSTracks(tracks)
+    nlines = 0
+    if not n_workers:
+        for chunk in _chunks(lines, chunk_size):
+            outfile.write(derive_chunk(chunk, mode, usecols, delimiter, fmt))
+            nlines += len(chunk)
+            if verbose:
+                print('{} lines processed'.format(nlines), file=sys.stderr)
+        return nlines
+    #
+    # the chunks are submitted in order and the results written in the same order, no more
+    #   than 2*n_workers chunks are submitted before their results are written
+    descriptor = _tracks.publish()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                                    initargs=(descriptor,)) as pool:
+            pending = collections.deque()
+            for chunk in _chunks(lines, chunk_size):
+                pending.append((len(chunk), pool.submit(derive_chunk, chunk, mode, usecols, delimiter, fmt)))
+                while len(pending) >= 2*n_workers or (pending and pending[0][1].done()):
+                    n, future = pending.popleft()
+                    outfile.write(future.result())
+                    nlines += n
+                    if verbose:
+                        print('{} lines processed'.format(nlines), file=sys.stderr)
+            while pending:
+                n, future = pending.popleft()
+                outfile.write(future.result())
+                nlines += n
+    finally:
+        _tracks.unpublish()
+    if verbose:
+        print('{} lines processed'.format(nlines), file=sys.stderr)
+    return nlines
+
+
+def main(argv=None):
+    """
+    Entry point of the pmstracks-derive command
+    """
+    parser = argparse.ArgumentParser(
+        prog='pmstracks-derive',
+        description='Derive Log10(L/Lsun) and Teff from mass and Log10(age/yr) (forward mode), or '
+                    'mass and age from Log10(L/Lsun) and Teff (inverse mode), for the stars of a '
+                    'catalog. The catalog is processed in chunks and the derived columns are '
+                    'appended to the input lines. Lines with missing or non finite inputs get '
+                    'status {}.'.format(BAD_INPUT))
+    parser.add_argument('input', help="input catalog, '-' for the standard input")
+    parser.add_argument('-o', '--output', default='-', help="output file, default is the standard output")
+    parser.add_argument('-t', '--tracks', default='BHAC15', choices=registry.track_names(), help='track set')
+    parser.add_argument('-m', '--mode', default='forward', choices=sorted(MODES), help='derivation mode')
+    parser.add_argument('-c', '--columns', default=None,
+                        help="comma separated names or indices of the two input columns, default is "
+                             "'mass,age' (forward) or 'llum,teff' (inverse)")
+    parser.add_argument('-d', '--delimiter', default=None,
+                        help="field delimiter, default is ',' if found in the first line, whitespace otherwise")
+    parser.add_argument('--no-header', dest='header', action='store_false',
+                        help='the catalog has no header line (columns must be given as indices)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='lines per chunk')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--fmt', default='%.8g', help='format of the derived values')
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the progress on stderr')
+    args = parser.parse_args(argv)
+    #
+    columns = args.columns.split(',') if args.columns is not None else None
+    if columns is not None and len(columns) != 2:
+        parser.error('two input columns are needed')
+    if not args.header and columns is None:
+        columns = ['0', '1']
+    infile = sys.stdin if args.input == '-' else open(args.input, 'r')
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        derive_catalog(infile, outfile, tracks=args.tracks, mode=args.mode, columns=columns,
+                       delimiter=args.delimiter, header=args.header, chunk_size=args.chunk_size,
+                       n_workers=args.workers, fmt=args.fmt, verbose=args.verbose)
+    except ValueError as e:
+        parser.error(str(e))
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import concurrent.futures
+import numpy as np
+
+from .pmstracks import PMSTracks
+
+#
+# Evaluation of the same stars with several sets of tracks, to estimate the systematic
+#   errors due to the models. The sets are loaded concurrently and each query is split
+#   in tasks (one per set, or per set and chunk of stars) executed by a thread or
+#   process pool, so that the time of a query is close to that of the slowest set.
+#   With a process pool the tracks are loaded once in the main process and shared with
+#   the workers (PMSTracks.publish() and attach()).
+
+# tracks used by the tasks in the worker processes, by name of the set
+_models = {}
+
+
+def _init_worker(descriptors):
+    for name, descriptor in descriptors.items():
+        _models[name] = PMSTracks.attach(descriptor)
+
+
+def _run(pms, method, args):
+    if method == 'interpolate':
+        mass, age, labels = args
+        values, status = pms.interpolator_bilinear_multi(mass, age, labels)
+        return [values[label] for label in labels], status
+    llum, teff = args
+    mass, age, status = pms.invert_hrd(llum, teff)
+    return [mass, age], status
+
+
+def _run_worker(name, method, args):
+    return _run(_models[name], method, args)
+
+
+class TrackEnsemble(object):
+    """
+    Several sets of tracks evaluated together on the same stars
+
+    The results have the shape of the input arrays plus a last axis with one entry per
+    set of tracks (in the order of self.names), so that the spread between the models
+    can be computed directly.
+
+    Examples
+    --------
+    with TrackEnsemble(['BHAC15', 'Siess00', 'F16_std', 'F16_mag'], n_workers=4) as ens:
+        values, status = ens.interpolate(masses, ages)
+        ok = status == 0
+        spread = np.nanstd(np.where(ok, values['teff'], np.nan), axis=-1)
+
+    """
+    def __init__(self, tracks=('BHAC15', 'Siess00', 'F16_std', 'F16_mag'), n_workers=None,
+                 executor='thread', chunk_size=None, **kwargs):
+        """
+        Parameters
+        ----------
+
+        tracks : list of strings or PMSTracks
+
+        the sets of tracks, given by name (they are loaded concurrently) or as PMSTracks
+        objects, default is ('BHAC15', 'Siess00', 'F16_std', 'F16_mag')
+
+        n_workers : integer
+
+        number of workers of the pool, default is None (one per set)
+
+        executor : string
+
+        'thread' or 'process', type of pool, default is 'thread'. With 'process' the
+        tracks are published in shared memory until close() is called
+
+        chunk_size : integer
+
+        if given, the stars of a query are also split in chunks of chunk_size stars, so
+        that the workers are balanced when there are more workers than sets. Default is
+        None (one task per set)
+
+        kwargs :
+
+        options passed to PMSTracks() for the sets given by name (e.g. cache, dtype)
+
+        """
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.n_workers = n_workers if n_workers is not None else len(tracks)
+        #
+        # the sets given by name are loaded in parallel threads
+        with concurrent.futures.ThreadPoolExecutor(max(1, len(tracks))) as pool:
+            futures = [pool.submit(PMSTracks, trk, **kwargs) if isinstance(trk, str) else None
+                       for trk in tracks]
+            self.tracks = [trk if future is None else future.result() for trk, future in zip(tracks, futures)]
+        self.names = [pms.tracks_name for pms in self.tracks]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("The sets of tracks of an ensemble must be different")
+        #
+        self._published = []
+        if executor == 'process':
+            descriptors = {}
+            try:
+                for pms in self.tracks:
+                    descriptors[pms.tracks_name] = pms.publish()
+                    self._published.append(pms)
+            except Exception:
+                self._unpublish()
+                raise
+            self._pool = concurrent.futures.ProcessPoolExecutor(self.n_workers, initializer=_init_worker,
+                                                                initargs=(descriptors,))
+        else:
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.n_workers)
+
+    def __repr__(self):
+        return 'TrackEnsemble({0})'.format(', '.join(self.names))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        shuts down the pool and releases the shared memory of the tracks
+        """
+        self._pool.shutdown()
+        self._unpublish()
+
+    def _unpublish(self):
+        while self._published:
+            self._published.pop().unpublish()
+
+    def _evaluate(self, method, args, nout, shape):
+        #
+        # runs the tasks of all the sets and chunks and assembles the (star x set) tables,
+        #   reshaped to the shape of the input arrays plus one axis for the sets
+        npoints = len(args[0])
+        step = self.chunk_size if self.chunk_size else max(npoints, 1)
+        tasks = []
+        for j, pms in enumerate(self.tracks):
+            for i0 in range(0, npoints, step):
+                chunk = [arg[i0:i0+step] if isinstance(arg, np.ndarray) else arg for arg in args]
+                if self.executor == 'process':
+                    future = self._pool.submit(_run_worker, pms.tracks_name, method, chunk)
+                else:
+                    future = self._pool.submit(_run, pms, method, chunk)
+                tasks.append((j, i0, future))
+        outputs = [np.full((npoints, len(self.tracks)), np.nan) for i in range(nout)]
+        status = np.zeros((npoints, len(self.tracks)), dtype=int)
+        for j, i0, future in tasks:
+            values, stat = future.result()
+            for out, val in zip(outputs, values):
+                out[i0:i0+len(stat), j] = val
+            status[i0:i0+len(stat), j] = stat
+        shape = tuple(shape) + (len(self.tracks),)
+        return [out.reshape(shape) for out in outputs], status.reshape(shape)
+
+    def interpolate(self, mass, age, labels=('llum', 'teff')):
+        """
+        return the interpolated values of all the sets for arrays of masses and ages
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (same units as the tracks ages, Log10(age/yr))
+
+        labels : list of strings
+
+        quantities to be interpolated, default is ('llum', 'teff')
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with one array of shape mass.shape + (number of sets,) for
+                each label (mass and age broadcast together), the sets along the last
+                axis are in the order of self.names
+        status: integer array of the same shape, the status codes of
+                PMSTracks.interpolator_bilinear_multi() for each star and set
+
+        """
+        if isinstance(labels, str):
+            labels = [labels]
+        labels = list(labels)
+        mass, age = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float))
+        outputs, status = self._evaluate('interpolate', (mass.ravel(), age.ravel(), labels), len(labels),
+                                         mass.shape)
+        return dict(zip(labels, outputs)), status
+
+    def invert(self, llum, teff):
+        """
+        return the mass and age of the stars for all the sets, see PMSTracks.invert_hrd()
+
+        Parameters
+        ----------
+
+        llum, teff : float or array
+
+        Log10(L/Lsun) and effective temperature (K) of the stars
+
+        Returns
+        -------
+        mass, age, status
+
+        arrays of shape llum.shape + (number of sets,) (llum and teff broadcast together),
+        the sets along the last axis are in the order of self.names, status has the codes
+        of PMSTracks.invert_hrd()
+
+        """
+        llum, teff = np.broadcast_arrays(np.asarray(llum, dtype=float), np.asarray(teff, dtype=float))
+        (mass, age), status = self._evaluate('invert', (llum.ravel(), teff.ravel()), 2, llum.shape)
+        return mass, age, status
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+
+from . import registry
+from .store import bracket
+
+
+class TrackGrid(object):
+    """
+    This class stacks several sets of tracks that differ by one model parameter (e.g.
+    the mixing length of the BCAH98 tracks or the metallicity of the PLANET08 tracks)
+    and interpolates them in mass, age and parameter.
+
+    The parameter of each point is bracketed by two sets, each set is interpolated in
+    mass and age with PMSTracks.interpolator_bilinear_multi() and the two values are
+    interpolated linearly in the parameter. All the points are processed at once: each
+    set is queried with one call for all the points that need it, so that a sample of
+    stars is interpolated with at most one call per set instead of one PMSTracks query
+    per star and set. At the parameter values of the sets the values are those of the set.
+
+    The mass and age are bracketed within each set, not once for the grid: the sets have
+    different masses (and ages) of the tracks, and interpolator_bilinear_multi() already
+    brackets each point once per set for all the labels.
+
+    The 'F16' and 'PLANET08_Z*_irradiation' families are not physical parameters: their
+    axis blends linearly two sets (e.g. standard and magnetic tracks), only the values 0
+    and 1 are models.
+
+    The families of sets are registered in pmstracks.registry (see register_family()),
+    e.g. 'F16', 'BCAH98_lmix', 'BCAH98_mh', 'PLANET08', 'PLANET08_irrad'.
+
+    Examples
+    --------
+    grid = TrackGrid('BCAH98_lmix')
+    values, status = grid.interpolate(masses, ages, mixing_lengths)
+
+    """
+    #
+    # Status codes returned by interpolate(), 1 and 2 are those of the sets
+    STATUS_MESSAGES = {0: 'No errors',
+                       1: 'Problems with the tracks limits in mass',
+                       2: 'Problems with the tracks limits in age',
+                       4: 'Parameter outside the grid'}
+
+    def __init__(self, members, axis='parameter', name=None, **kwargs):
+        """
+        Parameters
+        ----------
+
+        members : string or list of (float, PMSTracks or string)
+
+        name of a family of the registry, or the value of the parameter and the tracks
+        (a PMSTracks object or the name of a set) for each set, at least two sets
+
+        axis : string
+
+        name of the parameter, default is 'parameter' (the axis of the family when
+        members is the name of a family)
+
+        name : string
+
+        name of the grid, default is the name of the family or the names of the sets
+
+        kwargs :
+
+        options passed to PMSTracks() for the sets given by name (e.g. cache, dtype,
+        mass_range, age_range)
+
+        """
+        from .pmstracks import PMSTracks
+        if isinstance(members, str):
+            family = registry.get_family(members)
+            name = members if name is None else name
+            axis = family['axis']
+            members = family['members']
+        members = sorted(members, key=lambda member: member[0])
+        if len(members) < 2:
+            raise ValueError("A TrackGrid needs at least two sets of tracks")
+        self.values = np.array([float(value) for value, tracks in members])
+        if (np.diff(self.values) <= 0).any():
+            raise ValueError("The parameter values of the sets must be different")
+        self.tracks = [tracks if isinstance(tracks, PMSTracks) else PMSTracks(tracks, **kwargs)
+                       for value, tracks in members]
+        self.axis = axis
+        self.name = name if name is not None else '+'.join(str(trk) for trk in self.tracks)
+
+    def __repr__(self):
+        return 'TrackGrid({0}, {1}={2})'.format(self.name, self.axis, self.values.tolist())
+
+    def labels(self):
+        """
+        return the quantities available in all the sets
+        """
+        labels = self.tracks[0]._track_labels()
+        return [label for label in labels if all(label in trk.store.columns for trk in self.tracks[1:])]
+
+    def interpolate(self, mass, age, parameter, labels=('llum', 'teff')):
+        """
+        return the interpolated values for arrays of masses, ages and parameter values
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (same units as the tracks ages, Log10(age/yr))
+
+        parameter : float or array
+
+        values of the parameter of the grid (self.axis)
+
+        labels : list of strings or 'all'
+
+        quantities to be interpolated, default is ('llum', 'teff'), 'all' for self.labels()
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with one numpy array of interpolated values for each label,
+                nan for the parameters outside the grid
+        status: numpy integer array, 0 if the point is within the two bracketing sets,
+                1 or 2 if the mass or the age is outside the tracks of one of them (as
+                for PMSTracks.interpolator_bilinear_multi()), 4 if the parameter is outside
+                the grid
+
+        Examples
+        --------
+        values, status = grid.interpolate(masses, ages, 1.7, ['llum', 'teff'])
+
+        """
+        if labels == 'all':
+            labels = self.labels()
+        elif isinstance(labels, str):
+            labels = [labels]
+        mass, age, parameter = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float),
+                                                   np.asarray(parameter, dtype=float))
+        shape = mass.shape
+        mass = mass.ravel()
+        age = age.ravel()
+        parameter = parameter.ravel()
+        #
+        # the sets bracketing each point and the weight of the upper one
+        k, f = bracket(self.values, parameter)
+        outside = ~((parameter >= self.values[0]) & (parameter <= self.values[-1]))
+        values = dict((label, np.zeros(len(mass))) for label in labels)
+        mass_status = np.zeros(len(mass), dtype=bool)
+        age_status = np.zeros(len(mass), dtype=bool)
+        for i, trk in enumerate(self.tracks):
+            # weight of this set for each point, the sets with zero weight are not queried
+            weight = np.where(k == i, 1.-f, 0.) + np.where(k+1 == i, f, 0.)
+            sel = np.flatnonzero((weight > 0.) & ~outside)
+            if len(sel) == 0:
+                continue
+            vals, status = trk.interpolator_bilinear_multi(mass[sel], age[sel], labels)
+            for label in labels:
+                values[label][sel] += weight[sel]*vals[label]
+            mass_status[sel] |= status == 1
+            age_status[sel] |= status == 2
+        #
+        status = np.zeros(len(mass), dtype=int)
+        status[age_status] = 2
+        status[mass_status] = 1
+        status[outside] = 4
+        for label in labels:
+            values[label][outside] = np.nan
+            values[label] = values[label].reshape(shape)
+        return values, status.reshape(shape)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import time
+import functools
+import threading
+import contextlib
+import numpy as np
+
+#
+# Opt-in instrumentation of PMSTracks: the loading phases (parsing, sorting, interpolators
+#   construction, ...) and the query methods are timed and counted, and the status codes
+#   returned by the queries are tallied. It is disabled by default, in this case the only
+#   cost is the test of a module level flag at each call of the instrumented methods.
+#
+#   instrument.enable()
+#   pms = PMSTracks('F16_std')
+#   pms.interpolator_bilinear_batch(masses, ages, 'llum')
+#   print(instrument.snapshot())
+#
+# The times of nested phases are included in the time of the calling phase (e.g. the
+#   'read' phase includes 'parse'). Callbacks added with add_callback() are called after
+#   each timed call with an event dictionary, so that the metrics can be exported.
+
+_enabled = False
+_lock = threading.Lock()
+_phases = {}
+_status = {}
+_callbacks = []
+
+
+def enable():
+    """
+    enables the instrumentation
+    """
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    disables the instrumentation, the collected metrics are kept
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """
+    clears all the collected metrics
+    """
+    with _lock:
+        _phases.clear()
+        _status.clear()
+
+
+def add_callback(func):
+    """
+    adds a function called after each timed phase
+
+    func is called as func(event), where event is a dictionary with the keys 'phase',
+    'seconds' and 'points' (number of points for the query methods, 0 otherwise).
+    The callbacks are called in the thread that executed the phase and they should be fast.
+    """
+    with _lock:
+        _callbacks.append(func)
+
+
+def remove_callback(func):
+    """
+    removes a function added with add_callback()
+    """
+    with _lock:
+        _callbacks.remove(func)
+
+
+def _record(phase, seconds, points):
+    with _lock:
+        stats = _phases.get(phase)
+        if stats is None:
+            stats = _phases[phase] = {'calls': 0, 'seconds': 0., 'points': 0, 'max_seconds': 0.}
+        stats['calls'] += 1
+        stats['seconds'] += seconds
+        stats['points'] += points
+        stats['max_seconds'] = max(stats['max_seconds'], seconds)
+        callbacks = list(_callbacks)
+    if callbacks:
+        event = {'phase': phase, 'seconds': seconds, 'points': points}
+        for func in callbacks:
+            func(event)
+
+
+@contextlib.contextmanager
+def phase(name, points=0):
+    """
+    context manager timing the enclosed block as the phase name
+    """
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter()-t0, points)
+
+
+def timed(name, size_arg=None):
+    """
+    decorator timing each call of the decorated function as the phase name
+
+    Parameters
+    ----------
+    name : string
+
+    name of the phase
+
+    size_arg : integer
+
+    position of the argument whose size is counted as the number of points processed
+    (self is position 0), default is None (no points counted)
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                points = int(np.size(args[size_arg])) if size_arg is not None and len(args) > size_arg else 0
+                _record(name, time.perf_counter()-t0, points)
+        return wrapper
+    return decorator
+
+
+def tally(name, status):
+    """
+    adds the status codes (an integer or an array) returned by the query name to the counts
+    """
+    if not _enabled:
+        return
+    counts = np.bincount(np.asarray(status, dtype=np.int64).ravel())
+    with _lock:
+        tallies = _status.setdefault(name, {})
+        for code in np.flatnonzero(counts):
+            tallies[int(code)] = tallies.get(int(code), 0) + int(counts[code])
+
+
+def snapshot():
+    """
+    return a copy of the collected metrics
+
+    Returns
+    -------
+    metrics : dictionary
+
+    'phases': for each phase a dictionary with 'calls', 'seconds' (total), 'max_seconds',
+              'points' and 'points_per_second'
+    'status': for each query a dictionary with the number of points returned with each status code
+
+    """
+    with _lock:
+        phases = {}
+        for name, stats in _phases.items():
+            phases[name] = dict(stats)
+            phases[name]['points_per_second'] = stats['points']/stats['seconds'] if stats['seconds'] > 0 else 0.
+        status = dict((name, dict(counts)) for name, counts in _status.items())
+    return {'phases': phases, 'status': status}
+
+
+def report():
+    """
+    return the metrics formatted as a text table
+    """
+    metrics = snapshot()
+    lines = ['{0:28s} {1:>9s} {2:>12s} {3:>12s} {4:>14s}'.format('phase', 'calls', 'total [s]', 'max [s]', 'points/s')]
+    for name in sorted(metrics['phases']):
+        stats = metrics['phases'][name]
+        lines.append('{0:28s} {1:9d} {2:12.6f} {3:12.6f} {4:14.1f}'.format(name, stats['calls'], stats['seconds'],
+                                                                          stats['max_seconds'],
+                                                                          stats['points_per_second']))
+    for name in sorted(metrics['status']):
+        lines.append('{0:28s} status counts {1}'.format(name, metrics['status'][name]))
+    return '\n'.join(lines)
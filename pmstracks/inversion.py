@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import scipy.spatial as sps
+import warnings
+
+
+class HRDInversion(object):
+    """
+    This class inverts a set of PMS tracks, returning the mass and age of a star
+    given its position in the HR diagram.
+
+    The points of the tracks are triangulated (Delaunay) once in the Log10(Teff),
+    Log10(L/Lsun) plane, the triangulation is used as a spatial index to find the
+    triangle containing each star, and the mass and age are linearly interpolated
+    with the barycentric coordinates of the star within the triangle.
+
+    Triangles connecting tracks that are not adjacent in mass do not correspond
+    to a region covered by the tracks and are flagged as invalid. Where the tracks
+    overlap in the HR diagram (e.g. close to the main sequence) a triangle can connect
+    points of very different ages, and the interpolated age is not reliable: triangles
+    whose vertices span more than age_tol in Log10(age) are flagged as ambiguous.
+
+    """
+    def __init__(self, ptracks, max_points=500, age_tol=0.5):
+        """
+        Creates the triangulation of the tracks
+
+        Parameters
+        ----------
+
+        ptracks : PMSTracks
+
+        the tracks to be inverted
+
+        max_points : integer
+
+        maximum number of points used for each track, the longest tracks are
+        subsampled uniformly in the time step index, default is 500
+
+        age_tol : float
+
+        maximum spread of Log10(age) between the vertices of a triangle, the stars in
+        triangles with a larger spread are flagged as ambiguous, default is 0.5 dex
+        (None to disable the check)
+
+        """
+        self.ptracks = ptracks
+        self.max_points = max_points
+        self.age_tol = age_tol
+        #
+        lteff = []
+        llum = []
+        mass = []
+        lage = []
+        itrack = []
+        for im, trk in enumerate(ptracks.tracks):
+            n = len(trk['lage'])
+            if n > max_points:
+                idx = np.unique(np.linspace(0, n-1, max_points).round().astype(int))
+            else:
+                idx = np.arange(n)
+            lteff.append(np.log10(trk['teff'][idx]))
+            llum.append(trk['llum'][idx])
+            lage.append(trk['lage'][idx])
+            mass.append(ptracks.mass[im] * np.ones(len(idx)))
+            itrack.append(im * np.ones(len(idx), dtype=int))
+        self.lteff = np.concatenate(lteff)
+        self.llum = np.concatenate(llum)
+        self.mass = np.concatenate(mass)
+        self.lage = np.concatenate(lage)
+        self.itrack = np.concatenate(itrack)
+        #
+        # the two axes are normalized to the same range before the triangulation
+        self._offset = np.array([self.lteff.min(), self.llum.min()])
+        self._scale = np.array([np.ptp(self.lteff), np.ptp(self.llum)])
+        self.tri = sps.Delaunay(self._normalize(self.lteff, self.llum))
+        #
+        # a triangle is valid if it connects points of the same or of adjacent tracks
+        vtrack = self.itrack[self.tri.simplices]
+        self.valid_simplex = (vtrack.max(axis=1)-vtrack.min(axis=1)) <= 1
+        #
+        # a valid triangle is ambiguous if its vertices have very different ages
+        self.age_spread = np.ptp(self.lage[self.tri.simplices], axis=1)
+        if age_tol is None:
+            self.ambiguous_simplex = np.zeros(len(self.valid_simplex), dtype=bool)
+        else:
+            self.ambiguous_simplex = self.valid_simplex & (self.age_spread > age_tol)
+
+    def __repr__(self):
+        return 'HRDInversion({0}, {1} points)'.format(self.ptracks, len(self.mass))
+
+    def _normalize(self, lteff, llum):
+        return (np.column_stack([lteff, llum])-self._offset)/self._scale
+
+    def invert(self, llum, teff):
+        """
+        return the mass and age of stars from their luminosity and effective temperature
+
+        Parameters
+        ----------
+
+        llum : float or array
+
+        Log10(L/Lsun) of the stars
+
+        teff : float or array
+
+        effective temperature of the stars (K)
+
+        Returns
+        -------
+        mass, age, status
+
+        mass: numpy array with the interpolated masses (Msun), nan if status > 0
+        age: numpy array with the interpolated Log10(age), nan if status > 0
+        status: numpy integer array, 0 if the star is within the tracks, 1 if it is
+                outside the region covered by the tracks, 2 if it falls in a region
+                between non adjacent tracks, 3 if it falls where the tracks overlap
+                and the age is ambiguous (triangle spanning more than age_tol)
+
+        """
+        llum, teff = np.broadcast_arrays(np.asarray(llum, dtype=float), np.asarray(teff, dtype=float))
+        shape = llum.shape
+        with np.errstate(divide='ignore', invalid='ignore'):
+            xy = self._normalize(np.log10(teff.ravel()), llum.ravel())
+        good = np.isfinite(xy).all(axis=1)
+        simplex = -np.ones(len(xy), dtype=int)
+        simplex[good] = self.tri.find_simplex(xy[good])
+        #
+        status = np.zeros(len(xy), dtype=int)
+        status[simplex < 0] = 1
+        status[(simplex >= 0) & ~self.valid_simplex[simplex]] = 2
+        status[(simplex >= 0) & self.ambiguous_simplex[simplex]] = 3
+        #
+        # barycentric coordinates of the stars within their triangles
+        ok = status == 0
+        s = simplex[ok]
+        trans = self.tri.transform[s]
+        b = np.einsum('ijk,ik->ij', trans[:, :2, :], xy[ok]-trans[:, 2, :])
+        weights = np.column_stack([b, 1.-b.sum(axis=1)])
+        vert = self.tri.simplices[s]
+        #
+        mass = np.full(len(xy), np.nan)
+        age = np.full(len(xy), np.nan)
+        mass[ok] = (weights*self.mass[vert]).sum(axis=1)
+        age[ok] = (weights*self.lage[vert]).sum(axis=1)
+        return mass.reshape(shape), age.reshape(shape), status.reshape(shape)
+
+    def invert_mc(self, llum, teff, ellum, eteff, corr=0., ndraw=1000, chunk_size=1000000,
+                  seed=None, percentiles=(16., 50., 84.), return_samples=False):
+        """
+        Monte Carlo propagation of the luminosity and temperature uncertainties to mass and age
+
+        For each star ndraw values of (L, Teff) are drawn from a bivariate normal distribution
+        and inverted with invert(). The draws are processed in chunks of at most chunk_size
+        points, so that the memory used does not depend on the number of stars (unless the
+        samples are returned).
+
+        Parameters
+        ----------
+
+        llum, teff : float or array
+
+        Log10(L/Lsun) and effective temperature (K) of the stars
+
+        ellum, eteff : float or array
+
+        uncertainties (standard deviations) on Log10(L/Lsun) and Teff (K)
+
+        corr : float or array
+
+        correlation coefficient between the Log10(L/Lsun) and Teff errors, default is 0
+
+        ndraw : integer
+
+        number of draws per star, default is 1000
+
+        chunk_size : integer
+
+        maximum number of draws processed at once, default is 1000000
+
+        seed : integer or numpy.random.Generator
+
+        seed of the random generator. Each star uses a fixed portion of the random stream,
+        so that the results do not depend on chunk_size
+
+        percentiles : list of floats
+
+        percentiles of the mass and age distributions to be returned, default is (16, 50, 84)
+
+        return_samples : boolean
+
+        return also all the drawn masses and ages, default is False
+
+        Returns
+        -------
+        result : dictionary
+
+        'mass', 'age': arrays (nstars, len(percentiles)) with the percentiles of the mass
+                       and age of the valid draws, nan if no draw is valid
+        'fvalid': array (nstars) with the fraction of the draws within the tracks (status 0)
+        'mass_samples', 'age_samples': arrays (nstars, ndraw), only if return_samples is True,
+                       nan for the draws outside of the tracks
+
+        """
+        llum, teff, ellum, eteff, corr = [np.asarray(x, dtype=float).ravel() for x in
+                                          np.broadcast_arrays(llum, teff, ellum, eteff, corr)]
+        nstar = len(llum)
+        rng = np.random.default_rng(seed)
+        nchunk = max(1, chunk_size // ndraw)
+        #
+        result = {'mass': np.full((nstar, len(percentiles)), np.nan),
+                  'age': np.full((nstar, len(percentiles)), np.nan),
+                  'fvalid': np.zeros(nstar)}
+        if return_samples:
+            result['mass_samples'] = np.empty((nstar, ndraw))
+            result['age_samples'] = np.empty((nstar, ndraw))
+        for i0 in range(0, nstar, nchunk):
+            sl = slice(i0, min(i0+nchunk, nstar))
+            z = rng.standard_normal((sl.stop-sl.start, ndraw, 2))
+            zl = z[:, :, 0]
+            zt = corr[sl, None]*z[:, :, 0] + np.sqrt(1.-corr[sl, None]**2)*z[:, :, 1]
+            mass, age, status = self.invert(llum[sl, None] + ellum[sl, None]*zl,
+                                            teff[sl, None] + eteff[sl, None]*zt)
+            result['fvalid'][sl] = (status == 0).mean(axis=1)
+            with warnings.catch_warnings():
+                # stars without valid draws give all nan slices
+                warnings.simplefilter('ignore', RuntimeWarning)
+                result['mass'][sl] = np.nanpercentile(mass, percentiles, axis=1).T
+                result['age'][sl] = np.nanpercentile(age, percentiles, axis=1).T
+            if return_samples:
+                result['mass_samples'][sl] = mass
+                result['age_samples'][sl] = age
+        return result
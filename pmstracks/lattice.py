@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+
+# quantities stored as logarithms, their relative errors are those of the linear quantity
+_LOG_LABELS = ('llum', 'logg', 'lage')
+
+
+class TrackLattice(object):
+    """
+    This class resamples a set of PMS tracks on a regular grid of Log10(mass) and
+    Log10(age), so that the interpolation of the tracks is reduced to the computation
+    of the grid indices and of the bilinear weights of each point.
+
+    The grid values are computed with PMSTracks.interpolator_bilinear_batch() at the
+    nodes of the lattice. A cell of the lattice is valid only if its four nodes are
+    within the original tracks, points in invalid cells are flagged in the returned
+    status.
+
+    The accuracy of the lattice depends on its resolution, max_error() compares the
+    lattice with interpolator_bilinear_batch() so that the resolution can be chosen
+    trading memory for accuracy.
+
+    """
+    def __init__(self, ptracks, nmass=200, nage=200, labels=('llum', 'teff'),
+                 mass_range=None, age_range=None):
+        """
+        Creates the lattice from a set of tracks
+
+        Parameters
+        ----------
+
+        ptracks : PMSTracks
+
+        the tracks to be resampled
+
+        nmass, nage : integer
+
+        number of nodes of the lattice in Log10(mass) and Log10(age), default is 200 x 200
+
+        labels : list of strings
+
+        track quantities stored in the lattice, default is ('llum', 'teff')
+
+        mass_range : list of two floats
+
+        minimum and maximum mass of the lattice (Msun), default is the mass range of the tracks
+
+        age_range : list of two floats
+
+        minimum and maximum Log10(age) of the lattice, default is the age range of the tracks
+
+        """
+        self.ptracks = ptracks
+        self.labels = list(labels)
+        if mass_range is None:
+            mass_range = (ptracks.mass[0], ptracks.mass[-1])
+        if age_range is None:
+            age_range = (min(trk['lage'][0] for trk in ptracks.tracks),
+                         max(trk['lage'][-1] for trk in ptracks.tracks))
+        self.lmass = np.linspace(np.log10(mass_range[0]), np.log10(mass_range[1]), nmass)
+        self.lage = np.linspace(age_range[0], age_range[1], nage)
+        self._dlmass = self.lmass[1]-self.lmass[0]
+        self._dlage = self.lage[1]-self.lage[0]
+        #
+        mm, aa = np.meshgrid(10.**self.lmass, self.lage, indexing='ij')
+        self.values = {}
+        for label in self.labels:
+            self.values[label], status = ptracks.interpolator_bilinear_batch(mm, aa, label)
+        #
+        # a cell is valid if all its nodes are within the tracks
+        node_valid = status == 0
+        self.valid = (node_valid[:-1, :-1] & node_valid[1:, :-1] &
+                      node_valid[:-1, 1:] & node_valid[1:, 1:])
+
+    def __repr__(self):
+        return 'TrackLattice({0}, {1}x{2})'.format(self.ptracks, len(self.lmass), len(self.lage))
+
+    @property
+    def nbytes(self):
+        """
+        memory used by the lattice values and masks, in bytes
+        """
+        return sum(v.nbytes for v in self.values.values()) + self.valid.nbytes
+
+    def _cells(self, mass, age):
+        #
+        # indices of the lattice cell containing each point and the position within the cell,
+        #   the points with nan (or non positive) masses or nan ages are put in the first cell
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = (np.log10(mass)-self.lmass[0])/self._dlmass
+        y = (age-self.lage[0])/self._dlage
+        finite = np.isfinite(x) & np.isfinite(y)
+        x = np.where(finite, x, 0.)
+        y = np.where(finite, y, 0.)
+        ix = np.clip(np.floor(x), 0, len(self.lmass)-2).astype(int)
+        iy = np.clip(np.floor(y), 0, len(self.lage)-2).astype(int)
+        fx = np.clip(x-ix, 0., 1.)
+        fy = np.clip(y-iy, 0., 1.)
+        status = np.zeros(x.shape, dtype=int)
+        status[~self.valid[ix, iy] | (y < 0) | (y > len(self.lage)-1) | ~np.isfinite(age)] = 2
+        status[(x < 0) | (x > len(self.lmass)-1) | ~(mass > 0) | np.isinf(mass)] = 1
+        return ix, iy, fx, fy, status, finite
+
+    def interpolate(self, mass, age, label):
+        """
+        return the interpolated values for the specified label parameter
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (same units as the tracks ages)
+
+        label : string
+
+        label of the quantity to be interpolated, one of self.labels
+
+        Returns
+        -------
+        value, status
+
+        value: numpy array with the interpolated values, points outside the lattice
+               get the value at the lattice edge, nan for nan (or non positive) masses
+               and nan ages
+        status: numpy integer array, 0 if the point is within the tracks, 1 if the mass
+                is outside the lattice, 2 if the age is outside the lattice or the lattice
+                cell is not entirely covered by the tracks
+
+        """
+        mass, age = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float))
+        ix, iy, fx, fy, status, finite = self._cells(mass, age)
+        grid = self.values[label]
+        value = ((1.-fx)*(1.-fy)*grid[ix, iy] + fx*(1.-fy)*grid[ix+1, iy] +
+                 (1.-fx)*fy*grid[ix, iy+1] + fx*fy*grid[ix+1, iy+1])
+        return np.where(finite, value, np.nan), status
+
+    def max_error(self, label, nsample=100000, seed=0):
+        """
+        Returns the maximum difference between the lattice and the tracks interpolation
+
+        The lattice is compared with PMSTracks.interpolator_bilinear_batch() on random
+        points uniformly distributed in the valid cells of the lattice.
+
+        Parameters
+        ----------
+
+        label : string
+
+        label of the quantity to be checked
+
+        nsample : integer
+
+        number of random points used, default is 100000
+
+        seed : integer
+
+        seed for the random generator, default is 0
+
+        Returns
+        -------
+        max_abs_error, max_rel_error
+
+        maximum absolute and relative differences found, nan if none of the points is
+        within the tracks. For the logarithmic quantities (llum, logg) the relative
+        error is that of the linear quantity, 10**max_abs_error-1
+
+        """
+        rng = np.random.default_rng(seed)
+        cells = np.argwhere(self.valid)
+        if len(cells) == 0:
+            return np.nan, np.nan
+        pick = cells[rng.integers(len(cells), size=nsample)]
+        mass = 10.**(self.lmass[pick[:, 0]] + rng.random(nsample)*self._dlmass)
+        age = self.lage[pick[:, 1]] + rng.random(nsample)*self._dlage
+        value, status = self.interpolate(mass, age, label)
+        ref, ref_status = self.ptracks.interpolator_bilinear_batch(mass, age, label)
+        ok = (status == 0) & (ref_status == 0)
+        if not ok.any():
+            return np.nan, np.nan
+        diff = np.abs(value[ok]-ref[ok])
+        if label in _LOG_LABELS:
+            return diff.max(), 10.**diff.max()-1.
+        return diff.max(), (diff/np.abs(ref[ok])).max()
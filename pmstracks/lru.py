@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A simple thread safe, size bounded, least recently used cache
+
+    Values are stored with put() and retrieved with get(), when the cache is full the
+    least recently used entry is removed. The number of hits, misses and evictions
+    is counted and can be obtained with stats().
+
+    """
+    def __init__(self, maxsize=128):
+        """
+        Parameters
+        ----------
+
+        maxsize : integer
+
+        maximum number of entries in the cache, default is 128
+
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return 'LRUCache({0}/{1})'.format(len(self._data), self.maxsize)
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key, or default if key is not in the cache
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value for key, removing the least recently used entries if needed
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries, the statistics are kept
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Returns a dictionary with the number of hits, misses, evictions and the size of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._data), 'maxsize': self.maxsize}
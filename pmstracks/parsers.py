@@ -0,0 +1,582 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import re
+import numpy as np
+
+from .store import select_bracketed
+
+#
+# These functions parse the track files in bulk: each file is read at once in
+#   a numpy byte array, the comment and separator lines are identified from the
+#   first character of each line, and the required columns of all the data lines
+#   are converted to float arrays in one go. The unit conversions are then applied
+#   to the whole columns.
+#   They are used by the PMSTracks readers and return the same track dictionaries
+#   that were originally built line by line.
+
+_NEWLINE = ord('\n')
+_SPACE = ord(' ')
+_TAB = ord('\t')
+
+
+def _read_lines(filename):
+    """
+    Reads a file and returns the bytes and the limits of each line
+
+    Returns
+    -------
+    buf, starts, ends
+
+    buf: numpy uint8 array with the content of the file
+    starts: index in buf of the first character of each line
+    ends: index in buf of the end of each line (the newline is excluded)
+
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data and data[-1:] != b'\n':
+        data += b'\n'
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == _NEWLINE)
+    starts = np.concatenate([[0], ends[:-1]+1]).astype(ends.dtype)
+    return buf, starts, ends
+
+
+def _first_char(buf, starts, ends):
+    # first character of each line, newline for the empty lines
+    return np.where(ends > starts, buf[np.minimum(starts, len(buf)-1)], _NEWLINE)
+
+
+def _decode_lines(buf, starts, ends, select):
+    return [buf[s:e].tobytes().decode() for s, e in zip(starts[select], ends[select])]
+
+
+def _fixed_width_columns(buf, starts, ends, usecols):
+    """
+    Extracts the usecols columns when all the lines have the same width and the
+    fields are aligned. Returns None if this is not the case.
+    """
+    width = ends[0]-starts[0]
+    if width == 0 or (ends-starts != width).any():
+        return None
+    nrows = len(starts)
+    if starts[-1]-starts[0] == (nrows-1)*(width+1):
+        # contiguous lines, the rows are a view of the buffer
+        rows = buf[starts[0]:starts[0]+nrows*(width+1)].reshape(nrows, width+1)
+    else:
+        rows = buf[starts[:, None] + np.arange(width+1)]
+    #
+    # the fields are the runs of columns that are not blank in at least one line,
+    #   only the leading part of the lines containing the fields we need is checked
+    ncols = max(usecols)+1
+    prefix = min(width, 32*ncols)
+    while True:
+        nonsp = (rows[:, :prefix] != _SPACE) & (rows[:, :prefix] != _TAB)
+        used = np.concatenate([[0], nonsp.any(axis=0).astype(np.int8), [0]])
+        run_start = np.flatnonzero(np.diff(used) == 1)
+        run_end = np.flatnonzero(np.diff(used) == -1)
+        if prefix == width or (len(run_start) >= ncols and run_end[ncols-1] < prefix):
+            break
+        prefix = width
+    if len(run_start) < ncols:
+        return None
+    #
+    # each of the fields we need must contain exactly one token in every line,
+    #   otherwise the file is not in columns and the general parser is needed
+    nonsp = nonsp[:, :run_end[ncols-1]]
+    tok_start = nonsp.copy()
+    tok_start[:, 1:] &= ~nonsp[:, :-1]
+    ntok = np.add.reduceat(tok_start, run_start[:ncols], axis=1)
+    if (ntok != 1).any():
+        return None
+    #
+    columns = []
+    for ic in usecols:
+        field = np.ascontiguousarray(rows[:, run_start[ic]:run_end[ic]])
+        columns.append(field.view('S{}'.format(run_end[ic]-run_start[ic])).ravel().astype(float))
+    return columns
+
+
+def _read_columns(buf, starts, ends, select, usecols):
+    """
+    Returns the float columns usecols of the lines selected by the boolean array select
+    """
+    starts = starts[select]
+    ends = ends[select]
+    if len(starts) == 0:
+        return [np.array([]) for ic in usecols]
+    columns = _fixed_width_columns(buf, starts, ends, usecols)
+    if columns is None:
+        lines = _decode_lines(buf, starts, ends, slice(None))
+        data = np.loadtxt(lines, comments=None, usecols=usecols, ndmin=2)
+        columns = [data[:, i].copy() for i in range(len(usecols))]
+    return columns
+
+
+def _pow10(x):
+    # np.power and the python ** operator can differ in the last bit, use the
+    # python operator so that the tracks are exactly those of the line by line readers,
+    # the values in the files are rounded so it is only computed for the unique values
+    xu, inverse = np.unique(x, return_inverse=True)
+    return np.fromiter((10.**v for v in xu.tolist()), dtype=float, count=len(xu))[inverse]
+
+
+def _make_track(mstar, age, lum, teff):
+    return {'model_mass': mstar, 'mass': mstar * np.ones(len(age)),
+            'nage': len(age), 'lage': age,
+            'llum': lum, 'teff': teff}
+
+
+def parse_feiden16_std(filename):
+    """
+    Parses one Feiden et al. (2016) standard track file
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the .trk file
+
+    Returns
+    -------
+    mass, track
+
+    mass: the mass of the track (from the M= header line)
+    track: the track dictionary, see PMSTracks.reader_feiden16_std()
+
+    """
+    buf, starts, ends = _read_lines(filename)
+    first = _first_char(buf, starts, ends)
+    comment = first == ord('#')
+    mstar = None
+    for line in _decode_lines(buf, starts, ends, comment & (ends-starts > 7)):
+        if line[2] == 'M':
+            mstar = float(line[4:8])
+    age, logt, lum = _read_columns(buf, starts, ends, ~comment, (0, 1, 3))
+    return mstar, _make_track(mstar, np.log10(age), lum, _pow10(logt))
+
+
+def parse_feiden16_mag(filename):
+    """
+    Parses one Feiden et al. (2016) magnetic track file
+
+    Ages are given in Gyr in the files and converted to Log10(age/yr).
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the .ntrk file
+
+    Returns
+    -------
+    mass, track
+
+    mass: the mass of the track (from the Total mass header line)
+    track: the track dictionary, see PMSTracks.reader_feiden16_mag()
+
+    """
+    buf, starts, ends = _read_lines(filename)
+    first = _first_char(buf, starts, ends)
+    comment = first == ord('#')
+    long_line = ends-starts > 22
+    mstar = None
+    for line in _decode_lines(buf, starts, ends, comment & long_line):
+        if line[2:12] == 'Total mass':
+            mstar = float(line[16:23])
+    age, lum, logt = _read_columns(buf, starts, ends, ~comment & long_line, (2, 3, 6))
+    return mstar, _make_track(mstar, np.log10(age)+9., lum, _pow10(logt))
+
+
+def parse_siess00(filename):
+    """
+    Parses one Siess et al. (2000) track file
+
+    The header lines starting with '#' can be repeated within the file.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the .hrd file
+
+    Returns
+    -------
+    mass, track
+
+    mass: the mass of the track (from the first model in the file)
+    track: the track dictionary, see PMSTracks.reader_siess00()
+
+    """
+    buf, starts, ends = _read_lines(filename)
+    first = _first_char(buf, starts, ends)
+    lum, teff, mass, age = _read_columns(buf, starts, ends, first != ord('#'), (2, 6, 9, 10))
+    mstar = float(mass[0])
+    return mstar, _make_track(mstar, np.log10(age), np.log10(lum), teff)
+
+
+def parse_bhac15(filename, mass_range=None):
+    """
+    Parses the Baraffe et al. (2015) tracks file
+
+    The file contains one block per mass, each block is delimited by the lines starting
+    with '!'. The text before the first '!' line is the file description and a block
+    that is not closed by a '!' line is ignored. All the data lines of the file are
+    converted at once and then split in blocks.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the tracks file
+
+    mass_range : list of two floats
+
+    if given, only the blocks of the masses in mass_range and of the closest masses
+    outside of it are converted (see store.select_bracketed()), default is None (all the blocks)
+
+    Returns
+    -------
+    mass, tracks
+
+    mass: a numpy array containing the mass of each track
+    tracks: a list of track dictionaries, see PMSTracks.reader_bhac15()
+
+    """
+    buf, starts, ends = _read_lines(filename)
+    first = _first_char(buf, starts, ends)
+    separator = first == ord('!')
+    block = np.cumsum(separator)
+    data = ~separator & (first != _NEWLINE) & (block > 0) & (block < block[-1])
+    if mass_range is not None and data.any():
+        # the mass of each block is read from its first data line
+        idata = np.flatnonzero(data)
+        first_line = idata[np.concatenate([[True], block[idata][1:] != block[idata][:-1]])]
+        block_mass = [float(line.split()[0]) for line in _decode_lines(buf, starts, ends, first_line)]
+        wanted = block[first_line][select_bracketed(block_mass, mass_range[0], mass_range[1])]
+        data &= np.isin(block, wanted)
+    mass, age, teff, lum = _read_columns(buf, starts, ends, data, (0, 1, 2, 3))
+    #
+    # the data lines of each block are contiguous, split them at the block changes
+    block = block[data]
+    edges = np.concatenate([[0], np.flatnonzero(np.diff(block))+1, [len(block)]])
+    mstar = []
+    tracks = []
+    for i0, i1 in zip(edges[:-1], edges[1:]):
+        mstar.append(float(mass[i0]))
+        tracks.append(_make_track(mstar[-1], age[i0:i1].copy(), lum[i0:i1].copy(), teff[i0:i1].copy()))
+    return np.array(mstar), tracks
+
+
+#
+# Names of the physical columns of the BHAC15 isochrone tables, the other columns
+#   are the magnitudes and keep the names of the header
+_ISO_COLUMNS = {'M/Ms': 'mass', 'Teff': 'teff', 'L/Ls': 'llum', 'g': 'logg', 'R/Rs': 'radius', 'Li/Li0': 'li'}
+
+
+def parse_bhac15_iso(filename):
+    """
+    Parses a Baraffe et al. (2015) photometric isochrones file (BHAC15_iso.*)
+
+    The file contains one table per age, each table starts with a '!  t (Gyr) = ' line
+    followed by the header with the names of the columns. The masses of the tables of
+    different ages are not the same. All the data lines of the file are converted at
+    once and then split in tables.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the isochrones file
+
+    Returns
+    -------
+    lage, labels, tables
+
+    lage: numpy array with the Log10(age/yr) of each table
+    labels: list with the names of the columns: 'mass', 'teff', 'llum', 'logg', 'radius',
+            'li' and the names of the magnitudes as in the header of the file
+    tables: list of 2D numpy arrays (one row per mass, one column per label)
+
+    """
+    buf, starts, ends = _read_lines(filename)
+    first = _first_char(buf, starts, ends)
+    second = np.where(ends-starts > 1, buf[np.minimum(starts+1, len(buf)-1)], _NEWLINE)
+    #
+    # the age lines start a new table, the header is the first line with the mass column
+    comment = np.flatnonzero((first == ord('!')) | (second == ord('!')))
+    ages = []
+    age_lines = []
+    labels = None
+    for iline, line in zip(comment, _decode_lines(buf, starts, ends, comment)):
+        if 't (Gyr)' in line:
+            ages.append(float(line.split('=')[1]))
+            age_lines.append(iline)
+        elif labels is None and 'M/Ms' in line:
+            labels = [_ISO_COLUMNS.get(name, name) for name in line.replace('!', ' ').split()]
+    if labels is None or not ages:
+        raise ValueError("{} is not a BHAC15 isochrones file".format(filename))
+    block = np.zeros(len(starts), dtype=int)
+    block[age_lines] = 1
+    block = np.cumsum(block)
+    digit = (first >= ord('0')) & (first <= ord('9'))
+    digit |= (first == _SPACE) & (second >= ord('0')) & (second <= ord('9'))
+    data = digit & (block > 0)
+    columns = _read_columns(buf, starts, ends, data, tuple(range(len(labels))))
+    values = np.column_stack(columns)
+    #
+    # the data lines of each table are contiguous
+    edges = np.searchsorted(block[data], np.arange(1, len(ages)+2))
+    tables = [values[i0:i1] for i0, i1 in zip(edges[:-1], edges[1:])]
+    return np.log10(np.array(ages))+9., labels, tables
+
+
+#
+# Streaming reader of the Baraffe et al. model files (BCAH98, DUSTY00, COND03, PLANET08):
+#   each file holds several tables, separated by lines giving the age of an isochrone
+#   (t (Gyr) = 0.001, age =7.00Gyr, log t (yr) = 6.2) or the parameters of the models
+#   (TABLE 2  Z= 0.10, [M/H]=0  Y=0.275). The file is read line by line and each table
+#   is converted and returned as soon as it ends, only the lines of one table are kept.
+
+_COLUMN_LABELS = {'m': 'mass', 'M/Ms': 'mass', 'M': 'mass_earth', 'age': 'age', 'Teff': 'teff',
+                  'logL': 'llum', 'L/Ls': 'llum', 'L': 'llum', 'g': 'logg', 'R': 'radius',
+                  'R/Rs': 'radius', 'R/R_J': 'radius_jup', 'Li/Li0': 'li', 'Z': 'z'}
+
+_DATA_LINE = re.compile(r'^\s*[-+]?\.?[0-9]')
+_AGE_LINE = re.compile(r'(log t \(yr\)|t \(Gyr\)|age)\s*=\s*([-+0-9.eE]+)')
+_PARAMETER = re.compile(r'([A-Za-z_\[\]/]+)\s*=\s*([-+]?[0-9.]+)(?=\s|$)')
+
+# constants used to convert the PLANET08 models (as given in the files), cgs
+_MEARTH_MSUN = 3.0035e-6
+_RJUP = 7.149e9
+_LSUN = 3.9e33
+_SIGMA_SB = 5.6704e-5
+
+
+def _column_labels(header):
+    header = header.replace('!', ' ').replace('log L', 'logL')
+    return [_COLUMN_LABELS.get(name, name) for name in header.split()]
+
+
+def _table_values(lines, ncols):
+    #
+    # in some files the mass is given only in the first line of each track
+    rows = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) == ncols-1 and rows:
+            fields.insert(0, rows[-1][0])
+        rows.append(fields)
+    return np.array(rows, dtype=float).reshape(-1, ncols)
+
+
+def iter_tables(filename):
+    """
+    Reads a file with several tables, one table at a time
+
+    The file is read line by line, the tables are separated by the age lines and by
+    the lines with model parameters (e.g. 'TABLE 2  Z= 0.10'). The parameters apply to
+    all the following tables until they are redefined.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the file
+
+    Returns
+    -------
+    tables : generator of dictionaries
+
+    'parameters': dictionary of the model parameters (e.g. {'Z': 0.1} or {'[M/H]': 0., 'Y': 0.275})
+    'lage': Log10(age/yr) of the table for isochrones, None for tracks
+    'labels': names of the columns, the standard columns are renamed as in the tracks
+              ('mass', 'age', 'teff', 'llum', 'logg', 'radius', ...)
+    'values': 2D numpy array with one row per line and one column per label
+
+    """
+    parameters = {}
+    lage = None
+    header = None
+    labels = None
+    lines = []
+    with open(filename) as f:
+        for line in f:
+            if _DATA_LINE.match(line):
+                if not lines:
+                    labels = _column_labels(header) if header is not None else None
+                lines.append(line)
+                continue
+            text = line.replace('!', ' ').strip()
+            if not text or text.startswith('---'):
+                continue
+            age = _AGE_LINE.search(text)
+            found = _PARAMETER.findall(text) if age is None else []
+            if lines and (age is not None or found or header is not None):
+                if labels is None:
+                    raise ValueError("{} contains a table without header".format(filename))
+                yield {'parameters': dict(parameters), 'lage': lage, 'labels': labels,
+                       'values': _table_values(lines, len(labels))}
+                lines = []
+            if age is not None:
+                value = float(age.group(2))
+                lage = value if age.group(1).startswith('log') else float(np.log10(value))+9.
+                header = None
+            elif found:
+                parameters.update((key, float(value)) for key, value in found)
+                lage = None
+                header = None
+            else:
+                header = text
+    if lines:
+        if labels is None:
+            raise ValueError("{} contains a table without header".format(filename))
+        yield {'parameters': dict(parameters), 'lage': lage, 'labels': labels,
+               'values': _table_values(lines, len(labels))}
+
+
+def _select(tables, parameters):
+    # tables with the requested values of the model parameters
+    for table in tables:
+        if parameters is None or all(key in table['parameters'] and np.isclose(table['parameters'][key], value)
+                                     for key, value in parameters.items()):
+            yield table
+
+
+def _track_columns(labels, values):
+    #
+    # mass (Msun), Log10(age/yr), Log10(L/Lsun) and Teff (K) from the columns of a table
+    columns = dict((label, values[:, i]) for i, label in enumerate(labels))
+    if 'mass' in columns:
+        mass = columns['mass']
+    else:
+        mass = columns['mass_earth']*_MEARTH_MSUN
+    if 'llum' in columns:
+        lum = columns['llum']
+    else:
+        lum = (4.74-columns['Mbol'])/2.5
+    if 'teff' in columns:
+        teff = columns['teff']
+    else:
+        # Stefan-Boltzmann law, from the luminosity and the radius
+        teff = (10.**lum*_LSUN/(4.*np.pi*_SIGMA_SB*(columns['radius_jup']*_RJUP)**2))**0.25
+    age = np.log10(columns['age'])+9. if 'age' in columns else None
+    return mass, age, lum, teff
+
+
+def _group_tracks(mass, age, lum, teff):
+    #
+    # one track per mass, the tracks with less than two ages cannot be interpolated
+    mstar = []
+    tracks = []
+    for m in np.unique(mass):
+        sel = np.flatnonzero(mass == m)
+        if len(sel) < 2:
+            continue
+        mstar.append(float(m))
+        tracks.append(_make_track(mstar[-1], age[sel], lum[sel], teff[sel]))
+    return np.array(mstar), tracks
+
+
+def parse_baraffe_tracks(filename, parameters=None):
+    """
+    Parses the tracks of a Baraffe et al. models file (BCAH98_models.*, PLANET08_tracks.*)
+
+    The lines of all the tracks are in one table (or in one table per set of model
+    parameters), the tracks are separated by the value of the mass. Ages in Gyr are
+    converted to Log10(age/yr), the masses of the planets from Earth to Sun masses, the
+    bolometric magnitudes to Log10(L/Lsun) and, when Teff is not given, it is computed
+    from the luminosity and the radius.
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the models file
+
+    parameters : dictionary
+
+    model parameters of the tables to be read, e.g. {'Z': 0.1} for the PLANET08 files,
+    default is None (all the tables)
+
+    Returns
+    -------
+    mass, tracks
+
+    mass: a numpy array containing the mass of each track
+    tracks: a list of track dictionaries, see PMSTracks.reader_bhac15()
+
+    """
+    columns = []
+    for table in _select(iter_tables(filename), parameters):
+        mass, age, lum, teff = _track_columns(table['labels'], table['values'])
+        if age is None:
+            raise ValueError("{} does not contain tracks (no age column)".format(filename))
+        columns.append((mass, age, lum, teff))
+    if not columns:
+        raise ValueError("No table with parameters {0} in {1}".format(parameters, filename))
+    return _group_tracks(*[np.concatenate(col) for col in zip(*columns)])
+
+
+def parse_baraffe_isochrones(filename, parameters=None):
+    """
+    Parses the isochrones of a Baraffe et al. models file (DUSTY00_models, COND03_models, BCAH98_iso.*)
+
+    Parameters
+    ----------
+    filename : string
+
+    name of the isochrones file
+
+    parameters : dictionary
+
+    model parameters of the tables to be read, default is None (all the tables)
+
+    Returns
+    -------
+    lage, labels, tables
+
+    the same values returned by parse_bhac15_iso(), the first label is 'mass' (Msun)
+
+    """
+    lage = []
+    tables = []
+    labels = None
+    for table in _select(iter_tables(filename), parameters):
+        if table['lage'] is None:
+            raise ValueError("{} does not contain isochrones (no age lines)".format(filename))
+        if labels is None:
+            labels = table['labels']
+        elif table['labels'] != labels:
+            raise ValueError("The isochrones of {} do not have the same columns".format(filename))
+        lage.append(table['lage'])
+        tables.append(table['values'])
+    if not tables:
+        raise ValueError("No isochrones with parameters {0} in {1}".format(parameters, filename))
+    if labels[0] == 'mass_earth':
+        labels = ['mass'] + labels[1:]
+        tables = [np.column_stack([table[:, 0]*_MEARTH_MSUN, table[:, 1:]]) for table in tables]
+    return np.array(lage), labels, tables
+
+
+def parse_baraffe_isochrone_tracks(filename, parameters=None):
+    """
+    Parses the isochrones of a Baraffe et al. models file and returns them as tracks
+
+    The points of the same mass in the isochrones of the different ages are the track
+    of that mass, see parse_baraffe_isochrones() for the parameters.
+
+    Returns
+    -------
+    mass, tracks
+
+    mass: a numpy array containing the mass of each track
+    tracks: a list of track dictionaries, see PMSTracks.reader_bhac15()
+
+    """
+    lage, labels, tables = parse_baraffe_isochrones(filename, parameters)
+    mass, age, lum, teff = _track_columns(labels, np.concatenate(tables))
+    age = np.repeat(lage, [len(table) for table in tables])
+    return _group_tracks(mass, age, lum, teff)
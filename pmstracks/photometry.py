@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+
+from . import parsers
+from .store import bracket
+
+
+class PhotometricGrid(object):
+    """
+    This class stores a set of photometric isochrones (e.g. the BHAC15_iso.* tables) in
+    a single (age x mass x column) array and interpolates the magnitudes, and the other
+    quantities of the tables, for arrays of masses and ages.
+
+    The grid masses are all the masses found in the tables. The nodes of the masses
+    missing in the table of an age are interpolated linearly along the masses of that
+    table when they are within its mass range, and are nan outside of it. Each point is
+    interpolated along the masses of the two isochrones around its age, and then linearly
+    in Log10(age). As the mass ranges of the isochrones change with the age, the mass range
+    at the age of the point is interpolated between those of the two isochrones, and each
+    isochrone is read at the mass in the same position within its own range, so that the
+    points between two isochrones of different mass ranges are not lost. The magnitudes
+    are obtained directly from the models instead of converting L and Teff with
+    bolometric corrections.
+
+    """
+    def __init__(self, lage, mass, labels, values, name=''):
+        """
+        Parameters
+        ----------
+
+        lage : numpy array
+
+        increasing Log10(age/yr) of the isochrones
+
+        mass : numpy array
+
+        increasing masses (Msun) of the grid
+
+        labels : list of strings
+
+        names of the quantities in the grid
+
+        values : numpy array
+
+        array of shape (len(lage), len(mass), len(labels)), nan for the missing nodes
+
+        name : string
+
+        name of the photometric system, default is ''
+
+        """
+        self.lage = np.asarray(lage, dtype=float)
+        self.mass = np.asarray(mass, dtype=float)
+        self.labels = list(labels)
+        self.values = np.asarray(values, dtype=float)
+        self.name = name
+        self._index = dict((label, i) for i, label in enumerate(self.labels))
+        if self.values.shape != (len(self.lage), len(self.mass), len(self.labels)):
+            raise ValueError("the values must have shape (nage, nmass, nlabels)")
+        #
+        # mass range of each isochrone, nan for the isochrones without any mass
+        finite = np.isfinite(self.values).all(axis=2)
+        found = finite.any(axis=1)
+        self.mass_min = np.where(found, self.mass[np.argmax(finite, axis=1)], np.nan)
+        self.mass_max = np.where(found, self.mass[len(self.mass)-1-np.argmax(finite[:, ::-1], axis=1)], np.nan)
+
+    @classmethod
+    def from_tables(cls, lage, labels, tables, name=''):
+        """
+        return a PhotometricGrid from the tables of the isochrones, one per age
+
+        The first column of the tables is the mass, see parsers.parse_bhac15_iso()
+        """
+        isort = np.argsort(lage, kind='stable')
+        mass = np.unique(np.concatenate([table[:, 0] for table in tables]))
+        values = np.full((len(lage), len(mass), len(labels)-1), np.nan)
+        for ia, i in enumerate(isort):
+            #
+            # the masses of the grid that are missing in this table, but within its mass
+            #   range, are interpolated along the masses of the table, so that only the
+            #   masses outside of the isochrone are nan
+            table = tables[i][np.argsort(tables[i][:, 0], kind='stable')]
+            inside = (mass >= table[0, 0]) & (mass <= table[-1, 0])
+            for j in range(table.shape[1]-1):
+                values[ia, inside, j] = np.interp(mass[inside], table[:, 0], table[:, j+1])
+        return cls(np.asarray(lage)[isort], mass, labels[1:], values, name=name)
+
+    @classmethod
+    def from_file(cls, filename, name='', parser=None):
+        """
+        return a PhotometricGrid reading a photometric isochrones file
+
+        parser is the function reading the file, it returns the ages, the labels and the
+        tables as parsers.parse_bhac15_iso() (the default) and parsers.parse_baraffe_isochrones()
+        """
+        if parser is None:
+            parser = parsers.parse_bhac15_iso
+        lage, labels, tables = parser(filename)
+        return cls.from_tables(lage, labels, tables, name=name)
+
+    def __repr__(self):
+        return 'PhotometricGrid({0}, {1}x{2})'.format(self.name, len(self.lage), len(self.mass))
+
+    @property
+    def bands(self):
+        """
+        names of the magnitudes in the grid
+        """
+        return [label for label in self.labels if label not in ('teff', 'llum', 'logg', 'radius', 'li')]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.lage.nbytes + self.mass.nbytes
+
+    def _columns(self, labels):
+        if labels == 'all':
+            return list(self.labels)
+        if isinstance(labels, str):
+            labels = [labels]
+        for label in labels:
+            if label not in self._index:
+                raise ValueError("unknown label {0}, the {1} grid has {2}".format(label, self.name, self.labels))
+        return list(labels)
+
+    def interpolate(self, mass, age, labels='all'):
+        """
+        return the interpolated values of several quantities for arrays of masses and ages
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (expected units: Log10(age/yr), as the tracks)
+
+        labels : list of strings or 'all'
+
+        names of the magnitudes (or of the other quantities in self.labels) to be
+        interpolated, 'all' (the default) for all of them
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with one numpy array of interpolated values for each label,
+                nan where the status is not 0
+        status: numpy integer array, 0 if the point is within the grid, 1 if the mass
+                is outside the masses of the grid, 2 if the age is outside the ages of
+                the grid or the mass is outside the mass range of the isochrones,
+                interpolated at the age of the point
+
+        Examples
+        --------
+        grid = PhotometricGrid.from_file('BHAC15_iso.2mass', '2MASS')
+        mags, status = grid.interpolate(masses, ages, ['Mj', 'Mh', 'Mk'])
+
+        """
+        labels = self._columns(labels)
+        mass, age = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float))
+        shape = mass.shape
+        mass = mass.ravel()
+        age = age.ravel()
+        #
+        ia, fa = bracket(self.lage, age)
+        cols = np.array([self._index[label] for label in labels], dtype=int)
+        #
+        # mass range at the age of each point, linear in age between the two isochrones,
+        #   and position of the point within it
+        lo = (1.-fa)*self.mass_min[ia] + fa*self.mass_min[ia+1]
+        hi = (1.-fa)*self.mass_max[ia] + fa*self.mass_max[ia+1]
+        inside = (mass >= lo) & (mass <= hi)
+        span = np.where(hi > lo, hi-lo, 1.)
+        position = np.where(inside, (mass-lo)/span, 0.)
+        #
+        # the two nodes around the mass of the point in each isochrone, the nodes with
+        #   zero weight are not used so that the points on the edges of the missing nodes
+        #   are still interpolated
+        nodes = self.values[:, :, cols].reshape(-1, len(cols))
+        result = np.zeros((len(mass), len(cols)))
+        missing = ~inside
+        for da, wa in ((0, 1.-fa), (1, fa)):
+            iso_min = self.mass_min[ia+da]
+            iso_max = self.mass_max[ia+da]
+            iso_mass = np.clip(iso_min + position*(iso_max-iso_min), iso_min, iso_max)
+            im, fm = bracket(self.mass, np.where(inside, iso_mass, self.mass[0]))
+            for dm, wm in ((0, 1.-fm), (1, fm)):
+                w = wa*wm
+                node = nodes[(ia+da)*len(self.mass) + im+dm]
+                used = inside & (w > 0.)
+                missing |= used & np.isnan(node).any(axis=1)
+                result += np.where(used[:, None], w[:, None]*node, 0.)
+        #
+        status = np.zeros(len(mass), dtype=int)
+        status[missing | ~((age >= self.lage[0]) & (age <= self.lage[-1]))] = 2
+        status[~((mass >= self.mass[0]) & (mass <= self.mass[-1]))] = 1
+        result[status > 0] = np.nan
+        values = dict((label, result[:, i].reshape(shape)) for i, label in enumerate(labels))
+        return values, status.reshape(shape)
@@ -5,8 +5,15 @@ from __future__ import print_function
 import numpy as np
 import scipy.interpolate as spi
 import os
-import glob
+import threading
+import concurrent.futures
 from . import TRACKS_DIR
+from . import cache as tcache
+from . import parsers
+from . import registry
+from .lru import LRUCache
+from .store import TrackStore, select_bracketed
+from . import instrument
 
 
 class PMSTracks(object):
@@ -22,10 +29,45 @@ class PMSTracks(object):
 
     The track options are defined in __init__()
 
-    The interpolation method is implemented in interpolator_bilinear()
+    The interpolation method is implemented in interpolator_bilinear(), its
+    array version for large samples of stars is interpolator_bilinear_batch()
 
     """
-    def __init__(self, tracks='BHAC15', verbose=False):
+    #
+    # Messages for the status codes returned by the interpolation methods
+    STATUS_MESSAGES = {0: 'No errors',
+                       1: 'Problems with the tracks limits in mass',
+                       2: 'Problems with the tracks limits in age',
+                       3: 'Problems with the tracks limits in both age and mass'}
+    INTVAL_MESSAGES = {0: 'No errors',
+                       1: 'Age for lower mass below tracks limits', 2: 'Age for lower mass above tracks limits',
+                       3: 'Age for higher mass below tracks limits', 6: 'Age for higher mass above tracks limits',
+                       4: 'Age for both masses below tracks limits', 8: 'Age for both masses above tracks limits',
+                       7: 'Unexpected age out of limits for both tracks',
+                       5: 'Unexpected age out of limits for both tracks'}
+    LINT_MESSAGES = {0: 'No errors', 1: 'Requested age for this mass below tracks limits',
+                     2: 'Requested age for this mass above tracks limits'}
+    MASS_MESSAGES = {0: 'No errors', 1: 'Requested mass below tracks limits',
+                     2: 'Requested mass above tracks limits'}
+    #
+    # Bits of the domain status returned by domain_status()
+    DOMAIN_MASS_BELOW = 1
+    DOMAIN_MASS_ABOVE = 2
+    DOMAIN_AGE_BELOW_M1 = 4
+    DOMAIN_AGE_ABOVE_M1 = 8
+    DOMAIN_AGE_BELOW_M2 = 16
+    DOMAIN_AGE_ABOVE_M2 = 32
+    DOMAIN_NOT_FINITE = 64
+    DOMAIN_MESSAGES = {1: 'Requested mass below tracks limits',
+                       2: 'Requested mass above tracks limits',
+                       4: 'Age for lower mass below tracks limits',
+                       8: 'Age for lower mass above tracks limits',
+                       16: 'Age for higher mass below tracks limits',
+                       32: 'Age for higher mass above tracks limits',
+                       64: 'Mass or age not finite'}
+    def __init__(self, tracks='BHAC15', verbose=False, cache=True, cache_dir=None,
+                 n_workers=None, executor='thread', dtype=None,
+                 decimate_tol=None, mass_range=None, age_range=None):
         """
         When instantiated, the object creates a set of pms tracks reading the
         appropriate track files and the interpolators used to manipulate the
@@ -34,6 +76,13 @@ class PMSTracks(object):
         At the moment we have implemented readers for the following tracks:
          BHAC15  : Baraffe et al. 2015 tracks
          Siess00 : Siess et al. 2000 tracks
+         F16_std : Feiden 2016 standard tracks
+         F16_mag : Feiden 2016 magnetic tracks
+         BCAH98, BCAH98_ext, BCAH98_lmix1.0, BCAH98_lmix1.5, BCAH98_mh05 : Baraffe et al. 1998 tracks
+         DUSTY00 : Chabrier et al. 2000 DUSTY models
+         COND03  : Baraffe et al. 2003 COND models
+         PLANET08_Z0.02, ..., PLANET08_Z0.90_irrad : Baraffe et al. 2008 planet tracks
+        the available sets are listed (without reading them) by pmstracks.list_tracks()
 
         Parameters
         ----------
@@ -46,37 +95,271 @@ class PMSTracks(object):
 
         print out status messages, default is False
 
+        cache : boolean
+
+        keep a binary copy of the tracks read from the files in cache_dir, so that the
+        next time the same tracks are requested they are loaded without parsing the
+        track files. The cache is automatically refreshed when the track files change
+        (size or modification time). Default is True
+
+        cache_dir : string
+
+        directory used for the tracks cache, default is the PMSTRACKS_CACHE_DIR
+        environment variable or ~/.cache/pmstracks
+
+        n_workers : integer
+
+        number of parallel workers used to parse the track files of the sets with one
+        file per mass (Siess00, F16_std, F16_mag), default is None (files parsed serially).
+        The tracks are identical to those obtained with the serial reader.
+
+        executor : string
+
+        'thread' or 'process', type of pool used when n_workers is set, default is 'thread'
+
+        dtype : numpy dtype
+
+        floating point type used to store the tracks, e.g. np.float32 to halve the memory
+        used by the tracks, default is None (float64, as read from the files)
+        The interpolations are always computed in double precision, with float32 tracks
+        the results of interpolator_bilinear() and of the batch methods agree to the
+        rounding errors instead of being identical.
+
+        decimate_tol : dictionary
+
+        if given, the points of the tracks that are not needed by the linear interpolation
+        in age are removed, keeping the interpolation error below the tolerance given for
+        each quantity, e.g. {'llum': 0.001, 'teff': 1.} (see TrackStore.decimate()).
+        The ratio between the original and the retained number of points is stored in
+        self.decimation_ratio. Default is None (all the points are kept)
+
+        mass_range : list of two floats
+
+        if given, only the tracks with mass (Msun) within mass_range, and the closest
+        tracks outside of it, are read. For the sets with one file per track the files
+        are selected from the masses in their names, the other files are not read at all.
+        The interpolation at the masses within the range is the same as with all the
+        tracks. None is no limit for that side, default is None (all the tracks)
+
+        age_range : list of two floats
+
+        if given, only the points of each track with age (same units as the tracks ages)
+        within age_range, and the closest points outside of it, are kept. The
+        interpolation at the ages within the range is the same as with the complete
+        tracks. Default is None (all the points)
+
         """
         self.tracks_name = tracks
 
         self.verbose = verbose
 
-        self.tracks_path = os.path.join(TRACKS_DIR, self.tracks_name)
+        self.cache = cache
 
-        if self.tracks_name == 'BHAC15':
-            self.infile_models = os.path.join(self.tracks_path, 'BHAC15_tracks.dat')
-            self.reader = self.reader_bhac15
-        elif self.tracks_name == 'Siess00':
-            self.infile_models = glob.glob(os.path.join(self.tracks_path, "*.hrd"))
-            if self.verbose:
-                print('{}'.format(self.infile_models))
-            self.reader = self.reader_siess00
-        elif self.tracks_name == 'F16_std':
-            self.infile_models = glob.glob(os.path.join(self.tracks_path, "*.trk"))
-            if self.verbose:
-                print('{}'.format(self.infile_models))
-            self.reader = self.reader_feiden16_std
-        elif self.tracks_name == 'F16_mag':
-            self.infile_models = glob.glob(os.path.join(self.tracks_path, "*.ntrk"))
-            if self.verbose:
-                print('{}'.format(self.infile_models))
-            self.reader = self.reader_feiden16_mag
-        else:
-            raise ValueError("No valid reader method specified in pmstracks.")
+        self.query_cache = None
+
+        self._hrd_lock = threading.Lock()
+
+        self.cache_dir = cache_dir if cache_dir is not None else tcache.default_cache_dir()
+
+        self.n_workers = n_workers
+
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.executor = executor
+
+        self.mass_range = tuple(mass_range) if mass_range is not None else None
+
+        self.age_range = tuple(age_range) if age_range is not None else None
+
+        # the files and the reader of the tracks are taken from the registry
+        track_set = registry.get_track_set(self.tracks_name)
+        self.tracks_path = track_set.path(TRACKS_DIR)
+        self.infile_models = track_set.infiles(TRACKS_DIR)
+        if self.mass_range is not None and track_set.multi_file:
+            self.infile_models = track_set.select_files(self.infile_models, self.mass_range)
+            if not self.infile_models:
+                raise ValueError("No track files found for the {0} tracks".format(self.tracks_name))
+        if self.verbose and track_set.multi_file:
+            print('{}'.format(self.infile_models))
+        self.reader = getattr(self, track_set.reader)
+        self.track_parameters = track_set.parameters
         #
-        self.mass, self.tracks = self.reader()
+        self.mass, self.tracks = self._read_tracks()
         self.mass, self.tracks = self._sort_tracks()
+        if self.mass_range is not None:
+            # the files names may not give the masses of all the sets
+            keep = np.flatnonzero(select_bracketed(self.mass, self.mass_range[0], self.mass_range[1]))
+            self.mass, self.tracks = self.mass[keep], [self.tracks[i] for i in keep]
+        #
+        # the tracks are kept in a columnar store, self.tracks are views of the store
+        with instrument.phase('store'):
+            store = TrackStore.from_tracks(self.tracks, dtype=dtype)
+            if self.age_range is not None:
+                store = store.window(self.age_range)
+        self.decimation_ratio = 1.
+        if decimate_tol is not None:
+            npoints = store.offsets[-1]
+            with instrument.phase('decimate'):
+                store = store.decimate(decimate_tol)
+            self.decimation_ratio = float(npoints)/store.offsets[-1]
+            if self.verbose:
+                print("Tracks decimated from {0} to {1} points, compression ratio {2:.1f}".format(
+                    npoints, store.offsets[-1], self.decimation_ratio))
+        self._set_store(store)
+
+    #
+    # Sets up the tracks and the interpolators from a TrackStore, this is the part of
+    #   __init__ shared with attach()
+    def _set_store(self, store):
+        self.store = store
+        self.mass = store.model_mass
+        self.tracks = store.tracks()
+        # age range of each track, used by domain_status()
+        self.age_min = store.columns['lage'][store.offsets[:-1]].astype(float)
+        self.age_max = store.columns['lage'][store.offsets[1:]-1].astype(float)
         self.interp_age = self._tracks_age_interp()
+        self.tracks_changed()
+
+    #
+    # The caches depend on the tracks, they are cleared every time the tracks change
+    def tracks_changed(self):
+        """
+        clears the caches and the indices that depend on the tracks
+
+        This is called automatically when the tracks are loaded or replaced, it must be
+        called explicitly after modifying the tracks arrays in place.
+        """
+        self.tracks_version = getattr(self, 'tracks_version', 0) + 1
+        self._hrd_index = None
+        if getattr(self, 'isochrone_cache', None) is None:
+            self.isochrone_cache = LRUCache(maxsize=128)
+        else:
+            self.isochrone_cache.clear()
+        if self.query_cache is not None:
+            self.query_cache.clear()
+
+    #
+    # Opt-in cache of interpolator_bilinear: the masses and ages are rounded to a fixed
+    #   precision, so that close requests share the same entry of the cache
+    def enable_query_cache(self, maxsize=65536, mass_precision=1.e-4, age_precision=1.e-4):
+        """
+        enables the cache of the values returned by interpolator_bilinear()
+
+        The requests are quantized, the mass and the age are rounded to multiples of
+        mass_precision and age_precision and the interpolation is computed (once) at the
+        rounded mass and age. The values returned with the cache enabled can therefore
+        differ from the exact ones by the variation of the tracks over the precision.
+        The cache is a LRUCache, it is thread safe and it is cleared when the tracks change.
+
+        Parameters
+        ----------
+
+        maxsize : integer
+
+        maximum number of (mass, age, label) entries kept, default is 65536
+
+        mass_precision : float
+
+        quantization step of the mass (Msun), default is 1e-4
+
+        age_precision : float
+
+        quantization step of the age (same units as the tracks ages), default is 1e-4
+
+        Examples
+        --------
+        pms.enable_query_cache(mass_precision=1e-3)
+        ...
+        print(pms.query_cache.stats())
+
+        """
+        self.query_cache = LRUCache(maxsize=maxsize)
+        self._query_precision = (float(mass_precision), float(age_precision))
+
+    def disable_query_cache(self):
+        """
+        disables the cache enabled by enable_query_cache()
+        """
+        self.query_cache = None
+
+    #
+    # Shared tracks for process pools: the parent process loads the tracks and publishes
+    #   them, the workers attach to them without reading the track files
+    def publish(self, filename=None, name=None):
+        """
+        copies the tracks in shared memory (or in a file) so that other processes can use them
+
+        The returned descriptor is a small dictionary that can be sent to other processes
+        (e.g. as argument of the initializer of a process pool), where PMSTracks.attach()
+        creates a PMSTracks object using the published tracks without copies and without
+        reading the track files. See TrackStore.publish() for the parameters.
+        The shared memory is released with unpublish().
+
+        Examples
+        --------
+        pms = PMSTracks('F16_std')
+        descriptor = pms.publish()
+        with concurrent.futures.ProcessPoolExecutor(initializer=init_worker,
+                                                    initargs=(descriptor,)) as pool:
+            ...
+        pms.unpublish()
+
+        where init_worker() calls PMSTracks.attach(descriptor)
+
+        """
+        descriptor = self.store.publish(filename=filename, name=name)
+        descriptor['tracks'] = self.tracks_name
+        descriptor['decimation_ratio'] = self.decimation_ratio
+        return descriptor
+
+    def unpublish(self):
+        """
+        releases the shared memory created by publish()
+        """
+        self.store.unpublish()
+
+    @classmethod
+    @instrument.timed('attach')
+    def attach(cls, descriptor, verbose=False):
+        """
+        return a PMSTracks object using the tracks published by PMSTracks.publish()
+
+        The tracks are not read from the files and the arrays are shared with the
+        publishing process (they are read only), the object can be used as any other
+        PMSTracks object.
+
+        Parameters
+        ----------
+
+        descriptor : dictionary
+
+        the value returned by PMSTracks.publish()
+
+        verbose : boolean
+
+        print out status messages, default is False
+
+        """
+        self = cls.__new__(cls)
+        self.tracks_name = descriptor['tracks']
+        self.verbose = verbose
+        self.cache = False
+        self.cache_dir = None
+        self.n_workers = None
+        self.executor = 'thread'
+        self.mass_range = None
+        self.age_range = None
+        self.tracks_path = os.path.join(TRACKS_DIR, self.tracks_name)
+        self.infile_models = None
+        self.reader = None
+        self.track_parameters = None
+        self.query_cache = None
+        self._hrd_lock = threading.Lock()
+        self.decimation_ratio = descriptor['decimation_ratio']
+        self._set_store(TrackStore.attach(descriptor))
+        if self.verbose:
+            print("Attached to the {0} tracks published in {1}".format(self.tracks_name, descriptor['name']))
+        return self
 
     def __repr__(self):
         str = '{}'.format(self.tracks_name)
@@ -90,7 +373,7 @@ class PMSTracks(object):
     # This method determines the two closest tracks from a given (L, T) point
     #   the idea is to use this to identify the two closest tracks and then interpolate
     #   to get the stellar mass and age from tracks.
-    def _iso_dist(lstar,tstar,mytrack):
+    def _iso_dist(self,lstar,tstar,mytrack):
         '''
         this utility function returns the minimum distance from a track, the corresponding signed
         luminosity and teff difference, and the indices of the two nearest point
@@ -120,13 +403,95 @@ class PMSTracks(object):
             n1.append(n1t)
         return dd, dl, dt, n0, n1
 
+    @instrument.timed('two_iso')
     def two_iso(self,lstar,tstar):
         '''
-        this utility function returns the minimum distance from a track, the corresponding signed
-        luminosity and teff difference, and the indices of the two nearest point
+        this utility function returns the indices of the two tracks closest to the (L, T) point
+        and the corresponding minimum distances
         '''
         ddt, dlt, dtt, n0t, n1t = self._get_trk_dist(lstar,tstar)
-        
+        i0, i1 = np.argsort(ddt)[:2]
+        return i0, i1, ddt[i0], ddt[i1]
+
+    #
+    # The triangulation used by invert_hrd() and invert_hrd_mc() is built by the first call,
+    #   under a lock so that the threads querying the same tracks build it only once
+    def _hrd_inversion(self):
+        index = self._hrd_index
+        if index is None:
+            with self._hrd_lock:
+                index = self._hrd_index
+                if index is None:
+                    from .inversion import HRDInversion
+                    with instrument.phase('hrd_index'):
+                        index = HRDInversion(self)
+                    self._hrd_index = index
+        return index
+
+    #
+    # HR diagram inversion: the triangulation of the tracks is built the first time
+    #   it is needed and then reused for all the following calls
+    @instrument.timed('invert_hrd', size_arg=1)
+    def invert_hrd(self, llum, teff):
+        """
+        return the interpolated mass and age for stars of given luminosity and effective temperature
+
+        This is the inverse of interpolator_bilinear_batch(), the mass and age are obtained
+        from the triangle of track points (in the Log10(Teff), Log10(L) plane) containing
+        each star. The triangulation is computed once per PMSTracks object (see HRDInversion).
+
+        Parameters
+        ----------
+
+        llum : float or array
+
+        values of Log10(L/Lsun) of the stars
+
+        teff : float or array
+
+        values of the effective temperature of the stars (K)
+
+        Returns
+        -------
+        mass, age, status
+
+        mass: numpy array with the masses (Msun), nan if status > 0
+        age: numpy array with the ages (same units as the tracks ages), nan if status > 0
+        status: numpy integer array, 0 if the star is within the tracks, 1 if it is
+                outside the region covered by the tracks, 2 if it falls between non adjacent tracks,
+                3 if it falls where the tracks overlap and the age is ambiguous (see HRDInversion)
+
+        Examples
+        --------
+        masses, ages, code_status = invert_hrd(llums, teffs)
+
+        """
+        mass, age, status = self._hrd_inversion().invert(llum, teff)
+        instrument.tally('invert_hrd', status)
+        return mass, age, status
+
+    #
+    # Monte Carlo version of invert_hrd, to propagate the uncertainties on L and Teff
+    @instrument.timed('invert_hrd_mc', size_arg=1)
+    def invert_hrd_mc(self, llum, teff, ellum, eteff, corr=0., ndraw=1000, chunk_size=1000000,
+                      seed=None, percentiles=(16., 50., 84.), return_samples=False):
+        """
+        return the percentiles of the mass and age distributions of stars with uncertain L and Teff
+
+        For each star, ndraw values of L and Teff are drawn from a bivariate normal distribution
+        and all the draws are inverted with the same triangulation used by invert_hrd().
+        See HRDInversion.invert_mc() for the description of the parameters and of the
+        returned dictionary.
+
+        Examples
+        --------
+        res = invert_hrd_mc(llums, teffs, ellums, eteffs, ndraw=2000, seed=1)
+        median_mass = res['mass'][:, 1]
+
+        """
+        return self._hrd_inversion().invert_mc(llum, teff, ellum, eteff, corr=corr, ndraw=ndraw,
+                                               chunk_size=chunk_size, seed=seed, percentiles=percentiles,
+                                               return_samples=return_samples)
 
     #
     # This method uses the scipy.interpolate.interp1d
@@ -138,6 +503,7 @@ class PMSTracks(object):
     #   It has to be called specifying the mass and age for which we want the
     #   interpolation and using the correct dictionary label for the quantity
     #   that we want to get out.
+    @instrument.timed('interpolator_bilinear')
     def interpolator_bilinear(self, mass, age, label, debug=False):
         """
         return the interpolated value for the specified label parameter
@@ -165,7 +531,7 @@ class PMSTracks(object):
 
         debug : boolean
 
-        prints status messages for debug purposes
+        prints status messages for debug purposes, the query cache is not used in debug mode
 
         Returns
         -------
@@ -188,13 +554,27 @@ class PMSTracks(object):
         is what I am assuming. Furthermore, typically I have the 'llum' as Log10(L/Lsun) and
         'teff' in K.
 
+        If the query cache is enabled (see enable_query_cache()), the mass and age are
+        quantized and the value is taken from the cache when possible.
+
         """
         #
-        states = {0: 'No errors',
-                  1: 'Problems with the tracks limits in mass',
-                  2: 'Problems with the tracks limits in age',
-                  3: 'Problems with the tracks limits in both age and mass'
-                  }
+        if self.query_cache is not None and not debug and np.isfinite(mass) and np.isfinite(age):
+            mass_precision, age_precision = self._query_precision
+            # the version in the key protects from entries computed while the tracks are changed
+            key = (self.tracks_version, int(round(mass/mass_precision)), int(round(age/age_precision)), label)
+            result = self.query_cache.get(key)
+            if result is None:
+                result = self._interpolate_point(key[1]*mass_precision, key[2]*age_precision, label)
+                self.query_cache.put(key, result)
+        else:
+            result = self._interpolate_point(mass, age, label, debug=debug)
+        instrument.tally('interpolator_bilinear', result[1])
+        return result
+
+    #
+    # The interpolation of interpolator_bilinear, without the cache
+    def _interpolate_point(self, mass, age, label, debug=False):
         #
         # Find the two indices that bound the star
         im1, im2, m_status, ml_status = self._find_m1m2(mass)
@@ -214,7 +594,608 @@ class PMSTracks(object):
             print('age={0} label={1} interpolated_value:{2}'.format(age, label, int_value))
             print('    returned i_status={0} {1}'.format(i_status, il_status))
 
-        return int_value, status, states[status]
+        return int_value, status, self.STATUS_MESSAGES[status]
+
+    #
+    # This is the array version of interpolator_bilinear: the mass bracketing
+    #   is done with np.searchsorted and the age interpolation reproduces the
+    #   np.interp arithmetic used by the interp1d objects, so that large catalogs
+    #   can be processed without looping in python over the stars.
+    #   The results are the same as those of interpolator_bilinear.
+    @instrument.timed('interpolator_bilinear_batch', size_arg=1)
+    def interpolator_bilinear_batch(self, mass, age, label):
+        """
+        return the interpolated values for the specified label parameter for arrays of masses and ages
+
+        This is the vectorized equivalent of interpolator_bilinear(), it accepts arrays (or
+        anything that can be broadcast together) of masses and ages and returns arrays
+        with the interpolated values and the integer status codes.
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass for which we want to have the interpolation
+        (expected units: Msun)
+
+        age : float or array
+
+        values of the age for which we want to have the interpolation
+        (expected units: Log10(age/Myr)
+
+        label : string
+
+        dictionary label for the quantity to be interpolated
+
+        Returns
+        -------
+        value, status
+
+        value: numpy array with the results of the interpolation, with the broadcast shape of mass and age
+        status: numpy integer array, same codes as interpolator_bilinear:
+                0 if the input age is within the tracks, 1 to 3 out of tracks edges
+
+        Examples
+        --------
+        vals, code_status = interpolator_bilinear_batch(masses, ages, 'llum')
+
+        vals[i] and code_status[i] are the same as the first two values returned by
+        interpolator_bilinear(masses[i], ages[i], 'llum')
+
+        """
+        #
+        values, status = self.interpolator_bilinear_multi(mass, age, [label])
+        return values[label], status
+
+    #
+    # Several labels are interpolated at once: the mass brackets and the position
+    #   of the age on the two tracks are computed only once and then used for all
+    #   the labels
+    @instrument.timed('interpolator_bilinear_multi', size_arg=1)
+    def interpolator_bilinear_multi(self, mass, age, labels='all'):
+        """
+        return the interpolated values of several label parameters for arrays of masses and ages
+
+        Same as interpolator_bilinear_batch(), but the mass and age brackets are computed
+        once and used to interpolate all the requested labels.
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass for which we want to have the interpolation
+        (expected units: Msun)
+
+        age : float or array
+
+        values of the age for which we want to have the interpolation
+        (expected units: Log10(age/Myr)
+
+        labels : list of strings or 'all'
+
+        dictionary labels for the quantities to be interpolated, 'all' (the default) for
+        all the quantities stored in the tracks
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with one numpy array of interpolated values for each label
+        status: numpy integer array, same codes as interpolator_bilinear, the status does not
+                depend on the label
+
+        Examples
+        --------
+        vals, code_status = interpolator_bilinear_multi(masses, ages, ['llum', 'teff'])
+
+        vals['llum'] is the same as interpolator_bilinear_batch(masses, ages, 'llum')[0]
+
+        """
+        #
+        if labels == 'all':
+            labels = self._track_labels()
+        mass, age = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float))
+        shape = mass.shape
+        mass = mass.ravel()
+        age = age.ravel()
+        #
+        # Find the two indices that bound each star
+        im1, im2, m_status = self._find_m1m2_batch(mass)
+        #
+        # get the interpolated values
+        int_values, i_status = self._get_intval_batch(im1, im2, mass, age, labels)
+        #
+        status = np.zeros(len(mass), dtype=int)
+        status[i_status > 0] = 2
+        status[m_status > 0] = 1
+        #
+        values = {label: int_values[label].reshape(shape) for label in labels}
+        instrument.tally('interpolator_bilinear_multi', status)
+        return values, status.reshape(shape)
+
+    #
+    # Array version of _get_intval, status codes are the same
+    def _get_intval_batch(self, im1, im2, mass, age, labels):
+        """
+        return the interpolated values between two tracks for the specified label parameters
+
+        Array version of _get_intval(), the tracks indices, masses and ages are arrays
+        of the same length. The age brackets on the two tracks are computed once for all
+        the labels.
+
+        Parameters
+        ----------
+        im1, 1m2 : integer arrays
+
+        indices for the tracks to be used
+
+        mass : numpy array
+
+        values of the mass for which we want to have the interpolation
+
+        age : numpy array
+
+        values of the age for which we want to have the interpolation
+
+        labels : list of strings
+
+        dictionary labels for the quantities to be interpolated
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with the numpy arrays of the results of the interpolation
+        status: numpy integer array, same codes as _get_intval()
+
+        """
+        #
+        bracket1 = self._age_bracket_batch(im1, age)
+        bracket2 = self._age_bracket_batch(im2, age)
+        status = bracket1['status']+3*bracket2['status']
+        #
+        m1 = self.mass[im1]
+        m2 = self.mass[im2]
+        use1 = m1 >= mass
+        use2 = (m2 <= mass) & ~use1
+        values = {}
+        for label in labels:
+            int1_value = self._age_eval_batch(bracket1, label)
+            int2_value = self._age_eval_batch(bracket2, label)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dm = mass - m1
+                ddm = m2 - m1
+                ddy = int2_value - int1_value
+                int_value = ddy/ddm*dm + int1_value
+            int_value[use2] = int2_value[use2]
+            int_value[use1] = int1_value[use1]
+            values[label] = int_value
+        #
+        return values, status
+
+    #
+    # Array version of the age part of _my_lint: finds the position of the ages
+    #    along the tracks, the points are grouped by track and located with a
+    #    single np.searchsorted call per track
+    def _age_bracket_batch(self, im, age):
+        """
+        return the position of the ages along the specified tracks
+
+        The position is returned as indices within the columns of self.store,
+        so that the same bracket can be used to interpolate any label with
+        self._age_eval_batch(). The status codes are the same of _my_lint().
+
+        Parameters
+        ----------
+        im : integer array
+
+        indices for the tracks to be used
+
+        age : numpy array
+
+        values of the age for which we want to have the interpolation
+
+        Returns
+        -------
+        bracket : dictionary
+
+        'lo', 'hi': indices of the track points bracketing each age
+        'age', 'xlo', 'xhi': the ages and the ages of the bracketing points
+        'edge': True where the value of point 'lo' is returned without interpolation
+        'status': numpy integer array, 0 if the input age is within the tracks, 1 if below, 2 if above
+
+        """
+        #
+        xflat = self.store.columns['lage']
+        offsets = self.store.offsets
+        lo = np.zeros(len(age), dtype=int)
+        status = np.zeros(len(age), dtype=int)
+        #
+        # group the points by track, the sort is stable so that the groups are deterministic
+        order = np.argsort(im, kind='stable')
+        bounds = np.searchsorted(im[order], np.arange(len(self.mass)+1))
+        for itrk in range(len(self.mass)):
+            if bounds[itrk] == bounds[itrk+1]:
+                continue
+            sel = order[bounds[itrk]:bounds[itrk+1]]
+            i0 = offsets[itrk]
+            i1 = offsets[itrk+1]
+            lage = xflat[i0:i1]
+            a = age[sel]
+            below = a < lage[0]
+            above = a > lage[-1]
+            # the same bracketing of np.interp: lage[j] <= a < lage[j+1]
+            j = np.searchsorted(lage, a, side='right')-1
+            j[below] = 0
+            j[above] = len(lage)-1
+            lo[sel] = i0+j
+            status[sel[below]] = 1
+            status[sel[above]] = 2
+        #
+        # np.interp works in double precision also when the tracks are stored as float32
+        xlo = xflat[lo].astype(float)
+        edge = (status > 0) | (xlo == age) | np.isnan(age)
+        hi = np.where(edge, lo, lo+1)
+        return {'lo': lo, 'hi': hi, 'age': age, 'xlo': xlo, 'xhi': xflat[hi].astype(float), 'edge': edge,
+                'status': status}
+
+    #
+    # Interpolates one label using the bracket from _age_bracket_batch
+    def _age_eval_batch(self, bracket, label):
+        """
+        return the interpolated values of label at the positions given by bracket
+
+        The arithmetic is the same of np.interp (and therefore of the interp1d objects
+        used by _my_lint), including its handling of non finite results.
+
+        Parameters
+        ----------
+        bracket : dictionary
+
+        the positions returned by self._age_bracket_batch()
+
+        label : string
+
+        dictionary label for the quantity to be interpolated
+
+        Returns
+        -------
+        value: numpy array with the results of the interpolation
+
+        """
+        #
+        yflat = self.store.columns[label]
+        ylo = yflat[bracket['lo']].astype(float)
+        yhi = yflat[bracket['hi']].astype(float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (yhi - ylo)/(bracket['xhi'] - bracket['xlo'])
+            intval = slope*(bracket['age'] - bracket['xlo']) + ylo
+            redo = np.isnan(intval)
+            if redo.any():
+                # if we get nan in one direction, np.interp tries the other
+                intval[redo] = slope[redo]*(bracket['age'][redo] - bracket['xhi'][redo]) + yhi[redo]
+                same = redo & np.isnan(intval) & (ylo == yhi)
+                intval[same] = ylo[same]
+        edge = bracket['edge']
+        intval[edge] = ylo[edge]
+        intval[np.isnan(bracket['age'])] = np.nan
+        #
+        return intval
+
+    #
+    # Returns the list of the labels of the quantities stored in the tracks
+    def _track_labels(self):
+        """
+        return the labels of the per time step quantities stored in the tracks
+        (all the arrays except 'lage')
+        """
+        return [label for label in self.store.labels if label != 'lage']
+
+    #
+    # Validity of (mass, age) points with respect to the tracks: the tests are done on the
+    #   precomputed mass and age ranges of the tracks, without interpolating, and the
+    #   result is a bitmask with one bit for each of the conditions of _find_m1m2 and _my_lint
+    @instrument.timed('domain_status', size_arg=1)
+    def domain_status(self, mass, age):
+        """
+        return the bitmask of the tracks limits violated by each (mass, age) point
+
+        The bits are the DOMAIN_* class attributes:
+            DOMAIN_MASS_BELOW (1), DOMAIN_MASS_ABOVE (2): mass outside the tracks
+            DOMAIN_AGE_BELOW_M1 (4), DOMAIN_AGE_ABOVE_M1 (8): age outside the lower mass track
+            DOMAIN_AGE_BELOW_M2 (16), DOMAIN_AGE_ABOVE_M2 (32): age outside the higher mass track
+            DOMAIN_NOT_FINITE (64): mass or age is nan or infinite
+        The tracks used for each point are those of interpolator_bilinear(), a point has
+        status 0 in interpolator_bilinear_batch() if and only if its mask has none of the
+        first six bits set. Use domain_message() to convert a mask to a message.
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (same units as the tracks ages)
+
+        Returns
+        -------
+        status : numpy uint8 array with the broadcast shape of mass and age
+
+        Examples
+        --------
+        good = pms.domain_status(masses, ages) == 0
+
+        """
+        mass, age = np.broadcast_arrays(np.asarray(mass, dtype=float), np.asarray(age, dtype=float))
+        shape = mass.shape
+        mass = mass.ravel()
+        age = age.ravel()
+        im1, im2, m_status = self._find_m1m2_batch(mass)
+        status = np.zeros(len(mass), dtype=np.uint8)
+        status[m_status == 1] |= self.DOMAIN_MASS_BELOW
+        status[m_status == 2] |= self.DOMAIN_MASS_ABOVE
+        status[age < self.age_min[im1]] |= self.DOMAIN_AGE_BELOW_M1
+        status[age > self.age_max[im1]] |= self.DOMAIN_AGE_ABOVE_M1
+        status[age < self.age_min[im2]] |= self.DOMAIN_AGE_BELOW_M2
+        status[age > self.age_max[im2]] |= self.DOMAIN_AGE_ABOVE_M2
+        status[~(np.isfinite(mass) & np.isfinite(age))] |= self.DOMAIN_NOT_FINITE
+        return status.reshape(shape)
+
+    def in_domain(self, mass, age):
+        """
+        return a boolean array, True for the (mass, age) points within the tracks limits
+        """
+        return self.domain_status(mass, age) == 0
+
+    def domain_message(self, status):
+        """
+        return the message describing a domain_status() bitmask
+
+        Parameters
+        ----------
+        status : integer
+
+        one of the values returned by domain_status()
+
+        Returns
+        -------
+        message : string, the messages of all the bits set separated by '; '
+
+        """
+        status = int(status)
+        if status == 0:
+            return 'No errors'
+        return '; '.join(self.DOMAIN_MESSAGES[bit] for bit in sorted(self.DOMAIN_MESSAGES) if status & bit)
+
+    #
+    # Array version of _find_m1m2, the bisection is replaced by np.searchsorted
+    def _find_m1m2_batch(self, m):
+        """
+        Returns the indices of the tracks that bracket each of the input masses
+
+        Array version of _find_m1m2(), the brackets and status codes are the same.
+
+        This function assumes that self.mass is ordered by increasing mass
+
+        Parameters
+        ----------
+        m : numpy array
+
+        masses that we want to bracket
+
+        Returns
+        -------
+        imin, imax, status
+
+        imin: integer array of indices within self.mass for the lower bracket
+        imax: integer array of indices within self.mass for the upper bracket
+        status: integer array, 0 if the input mass is within the tracks, 1 if below, 2 if above
+
+        """
+        #
+        nmass = len(self.mass)
+        status = np.zeros(len(m), dtype=int)
+        below = m < self.mass[0]
+        above = m > self.mass[-1]
+        status[below] = 1
+        status[above] = 2
+        #
+        # the bisection in _find_m1m2 returns the last track with mass <= m as lower bracket
+        imin = np.clip(np.searchsorted(self.mass, m, side='right')-1, 0, max(nmass-2, 0))
+        imax = np.minimum(imin+1, nmass-1)
+        imin[below] = 0
+        imax[below] = 0
+        imin[above] = nmass-1
+        imax[above] = nmass-1
+        #
+        return imin, imax, status
+
+    #
+    # Resample the tracks on a regular grid for fast lookups
+    @instrument.timed('lattice')
+    def lattice(self, nmass=200, nage=200, labels=('llum', 'teff'), mass_range=None, age_range=None):
+        """
+        Returns a TrackLattice, the tracks resampled on a regular Log10(mass) x Log10(age) grid
+
+        The lattice trades memory and accuracy for speed: each lookup is reduced to index
+        arithmetic and bilinear weights. Use the max_error() method of the lattice
+        to check its accuracy against interpolator_bilinear_batch().
+
+        Parameters
+        ----------
+
+        nmass, nage : integer
+
+        number of nodes of the lattice in Log10(mass) and Log10(age), default is 200 x 200
+
+        labels : list of strings
+
+        track quantities stored in the lattice, default is ('llum', 'teff')
+
+        mass_range, age_range : list of two floats
+
+        limits of the lattice, default are the limits of the tracks
+
+        Returns
+        -------
+        lattice : TrackLattice
+
+        Examples
+        --------
+        lat = self.lattice(nmass=400, nage=400)
+        vals, code_status = lat.interpolate(masses, ages, 'llum')
+        max_abs_err, max_rel_err = lat.max_error('llum')
+
+        """
+        from .lattice import TrackLattice
+        return TrackLattice(self, nmass=nmass, nage=nage, labels=labels,
+                            mass_range=mass_range, age_range=age_range)
+
+    #
+    # Isochrones are computed with a single vectorized interpolation of all the masses
+    #   and kept in a LRU cache, as the same ages are usually requested many times
+    @instrument.timed('isochrone')
+    def isochrone(self, age, masses=None, labels=('llum', 'teff')):
+        """
+        return the isochrone for the specified age
+
+        All the masses are interpolated at once with interpolator_bilinear_batch() and the
+        result is stored in self.isochrone_cache (a LRUCache), keyed by age, masses and labels,
+        so that the following requests of the same isochrone are not recomputed.
+        The returned arrays are read only, as they are shared with the cache.
+
+        Parameters
+        ----------
+
+        age : float
+
+        age of the isochrone (same units as the tracks ages)
+
+        masses : array
+
+        masses of the isochrone points (Msun), default are the masses of the tracks
+
+        labels : list of strings
+
+        quantities to be interpolated, default is ('llum', 'teff')
+
+        Returns
+        -------
+        isochrone : dictionary
+
+        'age': the age, 'mass': the masses, one array for each label, and 'status': the
+        integer status array (same codes as interpolator_bilinear)
+
+        Examples
+        --------
+        iso = self.isochrone(6.5)
+        plt.plot(iso['teff'], iso['llum'])
+
+        """
+        if isinstance(labels, str):
+            labels = (labels,)
+        key = (float(age), None if masses is None else tuple(np.asarray(masses, dtype=float).ravel()),
+               tuple(labels))
+        iso = self.isochrone_cache.get(key)
+        if iso is not None:
+            return iso
+        #
+        masses = np.array(self.mass if masses is None else masses, dtype=float)
+        iso = {'age': float(age), 'mass': masses}
+        for label in labels:
+            iso[label], iso['status'] = self.interpolator_bilinear_batch(masses, age, label)
+        for val in iso.values():
+            if isinstance(val, np.ndarray):
+                val.flags.writeable = False
+        self.isochrone_cache.put(key, iso)
+        return iso
+
+    #
+    # Photometry: the photometric isochrones of the set (e.g. BHAC15_iso.2mass) are read the
+    #   first time a system is requested and kept as PhotometricGrid objects
+    def photometric_systems(self):
+        """
+        return the names of the photometric systems available for these tracks
+        """
+        return list(registry.get_track_set(self.tracks_name).photometry)
+
+    def photometry(self, system):
+        """
+        return the PhotometricGrid with the isochrones of the photometric system
+
+        The file of the system is read the first time, the grid is then kept in
+        self.photometry_grids. ValueError if the tracks have no such photometry.
+        """
+        if getattr(self, 'photometry_grids', None) is None:
+            self.photometry_grids = {}
+        grid = self.photometry_grids.get(system)
+        if grid is None:
+            from .photometry import PhotometricGrid
+            track_set = registry.get_track_set(self.tracks_name)
+            filename = track_set.photometry_file(system, TRACKS_DIR)
+            if self.verbose:
+                print("Reading file: {}".format(filename))
+            with instrument.phase('photometry_read'):
+                grid = PhotometricGrid.from_file(filename, name=system,
+                                                 parser=getattr(parsers, track_set.photometry_parser))
+            self.photometry_grids[system] = grid
+        return grid
+
+    @instrument.timed('magnitudes', size_arg=1)
+    def magnitudes(self, mass, age, system, bands='all'):
+        """
+        return the absolute magnitudes in several bands for arrays of masses and ages
+
+        The magnitudes are interpolated in the photometric isochrones of the models
+        (see photometry()), bilinearly in mass and age, so that no bolometric correction
+        of the interpolated luminosity and temperature is needed.
+
+        Parameters
+        ----------
+
+        mass : float or array
+
+        values of the mass (expected units: Msun)
+
+        age : float or array
+
+        values of the age (same units as the tracks ages, Log10(age/yr))
+
+        system : string
+
+        photometric system, one of self.photometric_systems(), e.g. '2MASS'
+
+        bands : list of strings or 'all'
+
+        names of the bands (as in the header of the isochrones file, see the bands
+        attribute of the PhotometricGrid), default is 'all'. The other quantities of the
+        isochrones ('teff', 'llum', 'logg', 'radius', 'li') can also be requested
+
+        Returns
+        -------
+        values, status
+
+        values: dictionary with one numpy array of magnitudes for each band, nan where the
+                status is not 0
+        status: numpy integer array, 0 if the point is within the isochrones, 1 if the mass
+                is outside the isochrones masses, 2 if the age is outside the isochrones
+
+        Examples
+        --------
+        mags, code_status = self.magnitudes(masses, ages, '2MASS', ['Mj', 'Mh', 'Mk'])
+
+        """
+        grid = self.photometry(system)
+        if bands == 'all':
+            bands = grid.bands
+        values, status = grid.interpolate(mass, age, bands)
+        instrument.tally('magnitudes', status)
+        return values, status
 
     #
     # This method returns the the interpolated value and a status
@@ -270,13 +1251,6 @@ class PMSTracks(object):
 
         """
         #
-        states = {0: 'No errors',
-                  1: 'Age for lower mass below tracks limits', 2: 'Age for lower mass above tracks limits',
-                  3: 'Age for higher mass below tracks limits', 6: 'Age for higher mass above tracks limits',
-                  4: 'Age for both masses below tracks limits', 8: 'Age for both masses above tracks limits',
-                  7: 'Unexpected age out of limits for both tracks', 5: 'Unexpected age out of limits for both tracks'
-                  }
-        #
         int1_value, i1_status, l1_status = self._my_lint(im1, label, age)
         int2_value, i2_status, l2_status = self._my_lint(im2, label, age)
         status = i1_status+3*i2_status
@@ -291,7 +1265,7 @@ class PMSTracks(object):
             ddy = int2_value - int1_value
             int_value = ddy/ddm*dm + int1_value
         #
-        return int_value, status, states[status]
+        return int_value, status, self.INTVAL_MESSAGES[status]
 
     #
     # used by _get_intval to extract the correct interpolation value and
@@ -342,8 +1316,6 @@ class PMSTracks(object):
         #
         intlabel = label+'_int'
         #
-        states = {0: 'No errors', 1: 'Requested age for this mass below tracks limits',
-                  2: 'Requested age for this mass above tracks limits'}
         status = 0
         if age < ((self.tracks[im])['lage'])[0]:
             intval = ((self.tracks[im])[label])[0]
@@ -354,7 +1326,7 @@ class PMSTracks(object):
         else:
             intval = ((self.interp_age[im])[intlabel])(age)
         #
-        return intval, status, states[status]
+        return intval, status, self.LINT_MESSAGES[status]
 
     #
     # This method returns the two closest masses indices in the tracks
@@ -400,8 +1372,6 @@ class PMSTracks(object):
 
         """
         #
-        states = {0: 'No errors', 1: 'Requested mass below tracks limits',
-                  2: 'Requested mass above tracks limits'}
         status = 0
         if m < self.mass[0]:
             imin = 0
@@ -426,7 +1396,7 @@ class PMSTracks(object):
                     else:
                         imin = itry
         #
-        return imin, imax, status, states[status]
+        return imin, imax, status, self.MASS_MESSAGES[status]
 
     def reader_feiden16_std(self):
         """
@@ -476,30 +1446,14 @@ class PMSTracks(object):
         #
         mstar = []
         tracks = []
-        for i_f in self.infile_models:
-            age = []
-            lum = []
-            teff = []
+        for i_f, (m, trk) in zip(self.infile_models, self._parse_files(parsers.parse_feiden16_std)):
             if self.verbose:
                 print("Reading file: {}".format(i_f))
-            f = open(i_f, 'r')
-            for line in f.readlines():
-                if line[0] != '#':
-                    columns = line.split()
-                    age.append(np.log10(float(columns[0])))
-                    lum.append(float(columns[3]))
-                    teff.append(10**float(columns[1]))
-                else:
-                    if len(line) > 8:
-                        if line[2] == 'M':
-                            mstar.append(float(line[4:8]))
-            f.close()
-            tracks.append({'model_mass': mstar[-1], 'mass': mstar[-1] * np.ones(len(age)),
-                           'nage': len(age), 'lage': np.array(age),
-                           'llum': np.array(lum), 'teff': np.array(teff)})
+            mstar.append(m)
+            tracks.append(trk)
             #
             if self.verbose:
-                print("    Model Mass: {0}  nages={1}  age_start={2}  age_end={3}".format(mstar[-1],len(age),age[0],age[-1]))
+                print("    Model Mass: {0}  nages={1}  age_start={2}  age_end={3}".format(m, trk['nage'], trk['lage'][0], trk['lage'][-1]))
         return np.array(mstar), tracks
 
     def reader_feiden16_mag(self):
@@ -550,32 +1504,93 @@ class PMSTracks(object):
         #
         mstar = []
         tracks = []
-        for i_f in self.infile_models:
-            age = []
-            lum = []
-            teff = []
+        for i_f, (m, trk) in zip(self.infile_models, self._parse_files(parsers.parse_feiden16_mag)):
             if self.verbose:
                 print("Reading file: {}".format(i_f))
-            f = open(i_f, 'r')
-            for line in f.readlines():
-                if len(line) > 23:
-                    if line[0] != '#':
-                        columns = line.split()
-                        age.append(np.log10(float(columns[2]))+9.)
-                        lum.append(float(columns[3]))
-                        teff.append(10**float(columns[6]))
-                    else:
-                        if line[2:12] == 'Total mass':
-                            mstar.append(float(line[16:23]))
-            if self.verbose:
-                print("    Model Mass: {0}  nages={1}  age_start={2}  age_end={3}".format(mstar[-1],len(age),age[0],age[-1]))
-            f.close()
-            tracks.append({'model_mass': mstar[-1], 'mass': mstar[-1] * np.ones(len(age)),
-                           'nage': len(age), 'lage': np.array(age),
-                           'llum': np.array(lum), 'teff': np.array(teff)})
+            mstar.append(m)
+            tracks.append(trk)
             #
+            if self.verbose:
+                print("    Model Mass: {0}  nages={1}  age_start={2}  age_end={3}".format(m, trk['nage'], trk['lage'][0], trk['lage'][-1]))
         return np.array(mstar), tracks
 
+    #
+    # This method runs the parser of a single track file on all the files
+    #   of self.infile_models, either serially or in a pool of workers
+    def _parse_files(self, parser):
+        """
+        Parses all the files in self.infile_models
+
+        When self.n_workers is larger than 1, the files are parsed in a pool of
+        self.n_workers threads or processes (self.executor). The results are always
+        returned in the order of self.infile_models, so that the tracks are the same
+        as those obtained with the serial loop.
+
+        Parameters
+        ----------
+        parser : function
+
+        function parsing one track file, one of the pmstracks.parsers functions
+
+        Returns
+        -------
+        list with the (mass, track) returned by the parser for each file
+
+        """
+        if self.n_workers is None or self.n_workers <= 1 or len(self.infile_models) < 2:
+            return [parser(i_f) for i_f in self.infile_models]
+        #
+        if self.executor == 'process':
+            pool = concurrent.futures.ProcessPoolExecutor
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor
+        with pool(max_workers=self.n_workers) as ex:
+            results = list(ex.map(parser, self.infile_models))
+        return results
+
+    #
+    # These functions are the readers for the Baraffe et al. models (BCAH98, DUSTY00,
+    #   COND03, PLANET08), the files contain several tables and self.track_parameters
+    #   selects those of the set
+    def reader_baraffe_tracks(self):
+        """
+        Reader for the Baraffe et al. track files (BCAH98_models.*, PLANET08_tracks.*)
+
+        The file self.infile_models is read one table at a time (see parsers.iter_tables()),
+        the tables with the model parameters of the set (self.track_parameters, e.g. the
+        metallicity of the PLANET08 tables) are split in one track per mass.
+
+        Returns
+        -------
+        mass, tracks
+
+        the same values returned by reader_bhac15(), the ages of the files (Gyr) are
+        converted to Log10(age/yr) and the masses to Msun
+
+        """
+        if self.verbose:
+            print("Reading file: {}".format(self.infile_models))
+        return parsers.parse_baraffe_tracks(self.infile_models, parameters=self.track_parameters)
+
+    def reader_baraffe_isochrones(self):
+        """
+        Reader for the Baraffe et al. isochrone files (DUSTY00_models, COND03_models)
+
+        The files contain one table per age, the points of the same mass in the different
+        isochrones are the track of that mass (the masses found in less than two isochrones
+        are not used).
+
+        Returns
+        -------
+        mass, tracks
+
+        the same values returned by reader_bhac15()
+
+        """
+        if self.verbose:
+            print("Reading file: {}".format(self.infile_models))
+        return parsers.parse_baraffe_isochrone_tracks(self.infile_models, parameters=self.track_parameters)
+
     #
     # This function is the reader for the Siess00 Evolutionary tracks
     def reader_siess00(self):
@@ -624,27 +1639,11 @@ class PMSTracks(object):
         #
         mstar = []
         tracks = []
-        for i_f in self.infile_models:
-            age = []
-            lum = []
-            teff = []
-            isfirst = True
+        for i_f, (m, trk) in zip(self.infile_models, self._parse_files(parsers.parse_siess00)):
             if self.verbose:
                 print("Reading file: {}".format(i_f))
-            f = open(i_f, 'r')
-            for line in f.readlines():
-                if line[0] != '#':
-                    columns = line.split()
-                    if isfirst:
-                        mstar.append(float(columns[9]))
-                        isfirst = False
-                    age.append(np.log10(float(columns[10])))
-                    lum.append(np.log10(float(columns[2])))
-                    teff.append(float(columns[6]))
-            f.close()
-            tracks.append({'model_mass': mstar[-1], 'mass': mstar[-1] * np.ones(len(age)),
-                           'nage': len(age), 'lage': np.array(age),
-                           'llum': np.array(lum), 'teff': np.array(teff)})
+            mstar.append(m)
+            tracks.append(trk)
             #
         return np.array(mstar), tracks
 
@@ -696,51 +1695,74 @@ class PMSTracks(object):
         if self.verbose:
             print("Reading file: {}".format(self.infile_models))
         #
-        doread = False
-        mstar = []
-        tracks = []
-        age = []
-        lum = []
-        teff = []
-        newmass = True
-        f = open(self.infile_models, 'r')
-        dowrite = False
-        for line in f.readlines():
-            if doread:
-                if line[0] == '!':
-                    if dowrite and (not newmass):
-                        tracks.append({'model_mass': mstar[-1], 'mass': mstar[-1] * np.ones(len(age)),
-                                       'nage': len(age), 'lage': np.array(age),
-                                       'llum': np.array(lum), 'teff': np.array(teff)})
-                        dowrite = False
-                        newmass = True
-                        age = []
-                        lum = []
-                        teff = []
-                    else:
-                        pass
-                elif line[0] == '\n':
-                    pass
-                else:
-                    dowrite = True
-                    columns = line.split()
-                    if newmass:
-                        mstar.append(float(columns[0]))
-                        newmass = False
-                    age.append(float(columns[1]))
-                    lum.append(float(columns[3]))
-                    teff.append(float(columns[2]))
+        return parsers.parse_bhac15(self.infile_models, mass_range=getattr(self, 'mass_range', None))
+
+    #
+    # This method reads the tracks with self.reader, going through the binary
+    #   cache of the tracks if it is enabled
+    @instrument.timed('read')
+    def _read_tracks(self):
+        """
+        Reads the tracks using the binary cache if possible
+
+        If self.cache is True, the tracks are loaded from the cache file in self.cache_dir
+        when it exists and it was created from the current version of the track files,
+        otherwise self.reader is used to parse the track files and the cache file is
+        (re)written, and the older cache files of the set are removed. Only the complete
+        set is cached: with a mass_range the tracks are taken from the cache of the
+        complete set if it exists (they are selected afterwards), otherwise only the
+        needed files are parsed and the cache is not written. Problems in writing the
+        cache are not fatal, the tracks are returned anyway.
+
+        Returns
+        -------
+        mass, tracks
+
+        the same values returned by self.reader()
+
+        Examples
+        --------
+        self.mass, self.tracks = self._read_tracks()
 
-            else:
-                if line[0] == '!':
-                    doread = True
+        """
+        if not self.cache:
+            with instrument.phase('parse'):
+                return self.reader()
         #
-        f.close()
+        # the signature is that of all the files of the set, also when reading a mass range
+        signature = tcache.files_signature(registry.get_track_set(self.tracks_name).infiles(TRACKS_DIR))
+        cfile = tcache.cache_file(self.cache_dir, self.tracks_name)
+        try:
+            with instrument.phase('cache_load'):
+                mass, tracks = tcache.load_tracks(cfile, signature)
+        except Exception as e:
+            if self.verbose:
+                print("Cannot read the tracks cache {0}: {1}".format(cfile, e))
+            mass, tracks = None, None
+        if tracks is not None:
+            if self.verbose:
+                print("Tracks read from cache: {}".format(cfile))
+            return mass, tracks
         #
-        return np.array(mstar), tracks
+        with instrument.phase('parse'):
+            mass, tracks = self.reader()
+        if self.mass_range is not None:
+            return mass, tracks
+        try:
+            tcache.save_tracks(cfile, mass, tracks, signature)
+            if self.verbose:
+                print("Tracks saved in cache: {}".format(cfile))
+            for old in tcache.prune_cache(cfile):
+                if self.verbose:
+                    print("Removed old tracks cache: {}".format(old))
+        except Exception as e:
+            if self.verbose:
+                print("Cannot write the tracks cache {0}: {1}".format(cfile, e))
+        return mass, tracks
 
     #
     # This method sorts the tracks in increasing mass and per age for each mass
+    @instrument.timed('sort')
     def _sort_tracks(self):
         """
         Used to sort the tracks by mass and then each track by age.
@@ -757,7 +1779,8 @@ class PMSTracks(object):
         sorted_mass : numpy array
             copy of self.mass sorted by increasing mass
         sorted_tracks : list of track disctionaries
-            copy of self.tracks sorted by mass and with the tracks resoted by increasing age
+            copy of self.tracks sorted by mass and with the tracks resorted by increasing age,
+            all the per-point arrays of each track are resorted with the same order
 
         Examples
         --------
@@ -773,14 +1796,16 @@ class PMSTracks(object):
         for im in range(len(self.mass)):
             sorted_tracks.append(self.tracks[msort[im]])
             isort = np.argsort((sorted_tracks[im])['lage'])
-            ((sorted_tracks[im])['lage'])[:] = ((self.tracks[msort[im]])['lage'])[isort]
-            ((sorted_tracks[im])['llum'])[:] = ((self.tracks[msort[im]])['llum'])[isort]
-            ((sorted_tracks[im])['teff'])[:] = ((self.tracks[msort[im]])['teff'])[isort]
+            # all the per-point arrays of the track (lage, llum, teff, mass, radius, ...)
+            for key, values in (sorted_tracks[im]).items():
+                if isinstance(values, np.ndarray) and values.shape[:1] == isort.shape:
+                    values[:] = values[isort]
 
         return sorted_mass, sorted_tracks
 
     #
     # this method sets up the age interpolators
+    @instrument.timed('interp_setup')
     def _tracks_age_interp(self):
         """
         Used to compute the interpolation functions for llum and teff as a function of age.
@@ -812,8 +1837,11 @@ class PMSTracks(object):
         #
         interp_age = []
         for im in range(len(self.mass)):
-            interp_age.append({'llum_int': spi.interp1d((self.tracks[im])['lage'], (self.tracks[im])['llum']),
-                               'teff_int': spi.interp1d((self.tracks[im])['lage'], (self.tracks[im])['teff'])})
+            # the tracks are already sorted, the interpolators use the store arrays without copies
+            interp_age.append({'llum_int': spi.interp1d((self.tracks[im])['lage'], (self.tracks[im])['llum'],
+                                                        copy=False, assume_sorted=True),
+                               'teff_int': spi.interp1d((self.tracks[im])['lage'], (self.tracks[im])['teff'],
+                                                        copy=False, assume_sorted=True)})
         return interp_age
 
     def plot_tracks(self, ax, ages=None, masses=None):
@@ -825,21 +1853,16 @@ class PMSTracks(object):
         :return:
         """
         # TODO: ages grid are hardcoded. Should they change?
-        if not ages:
+        if ages is None:
             ages = np.linspace(5.2, 9.7, 50)
-        if not masses:
+        if masses is None:
             masses = np.array([0.011, 0.014, 0.083, 0.12, 0.17,
                                0.25, 0.3, 0.35, 0.77, 0.95, 1.05, 1.32])
 
-        nages = len(ages)
-        nmasses = len(masses)
-
-        interp_ls00 = np.zeros((nmasses, nages))
-        interp_ts00 = np.zeros((nmasses, nages))
-        for i in range(nmasses):
-            for j in range(nages):
-                interp_ls00[i, j] = self.interpolator_bilinear(masses[i], ages[j], 'llum')[0]
-                interp_ts00[i, j] = self.interpolator_bilinear(masses[i], ages[j], 'teff')[0]
+        mm, aa = np.meshgrid(masses, ages, indexing='ij')
+        interp, status = self.interpolator_bilinear_multi(mm, aa, ['llum', 'teff'])
+        interp_ls00 = interp['llum']
+        interp_ts00 = interp['teff']
 
         # plot evolutionary tracks
         for i in range(len(self.tracks)):
@@ -847,6 +1870,6 @@ class PMSTracks(object):
                     color='k', linestyle='solid')
 
         # plot iso-mass tracks
-        for i in range(nmasses):
+        for i in range(len(masses)):
             ax.plot(interp_ts00[i, :], interp_ls00[i, :],
                     color='red', linestyle='dotted')
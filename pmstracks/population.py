@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import collections
+import concurrent.futures
+import numpy as np
+
+from .pmstracks import PMSTracks
+
+#
+# Synthetic stellar populations: the masses are drawn from an initial mass function,
+#   the ages from a star formation history, and the stars are interpolated in the
+#   tracks with interpolator_bilinear_multi().
+#
+# A population of n stars is made of shards of shard_size stars. Each shard has its
+#   own random generator, seeded with the i-th child of np.random.SeedSequence(seed),
+#   so that the shards can be generated in any order and in different processes, and
+#   the population depends only on (seed, n, shard_size) and not on the number of
+#   workers. The shards are returned (or written) one at a time, in order, so that
+#   the memory used does not depend on n.
+
+
+def _power_law_sample(u, m0, m1, alpha):
+    # inverse of the cumulative distribution of dN/dm ~ m^-alpha in [m0, m1]
+    if alpha == 1.:
+        return m0*(m1/m0)**u
+    e = 1.-alpha
+    return (m0**e + u*(m1**e-m0**e))**(1./e)
+
+
+def _power_law_integral(m0, m1, alpha):
+    if alpha == 1.:
+        return np.log(m1/m0)
+    e = 1.-alpha
+    return (m1**e-m0**e)/e
+
+
+class BrokenPowerLawIMF(object):
+    """
+    Initial mass function made of power laws, dN/dm ~ m^-alpha_i between the masses
+    breaks[i] and breaks[i+1], continuous at the breaks
+
+    Examples
+    --------
+    imf = BrokenPowerLawIMF([0.01, 0.08, 0.5, 1.4], [0.3, 1.3, 2.3])   # Kroupa (2001)
+
+    """
+    def __init__(self, breaks, slopes):
+        """
+        Parameters
+        ----------
+
+        breaks : list of floats
+
+        increasing masses (Msun) of the limits of the power laws, the first and the last
+        are the mass range of the IMF
+
+        slopes : list of floats
+
+        exponents alpha of each power law, len(breaks)-1 values
+
+        """
+        self.breaks = np.array(breaks, dtype=float)
+        self.slopes = np.array(slopes, dtype=float)
+        if len(self.slopes) != len(self.breaks)-1 or (np.diff(self.breaks) <= 0).any():
+            raise ValueError("breaks must be increasing and have one element more than slopes")
+        #
+        # normalization of each segment, so that the IMF is continuous
+        self._norm = np.ones(len(self.slopes))
+        for i in range(1, len(self.slopes)):
+            self._norm[i] = self._norm[i-1]*self.breaks[i]**(self.slopes[i]-self.slopes[i-1])
+        weights = np.array([k*_power_law_integral(m0, m1, a) for k, m0, m1, a in
+                            zip(self._norm, self.breaks[:-1], self.breaks[1:], self.slopes)])
+        self._total = weights.sum()
+        self._cumulative = np.concatenate([[0.], np.cumsum(weights)/self._total])
+
+    def __repr__(self):
+        return 'BrokenPowerLawIMF({0}, {1})'.format(self.breaks.tolist(), self.slopes.tolist())
+
+    @property
+    def mass_range(self):
+        return self.breaks[0], self.breaks[-1]
+
+    def pdf(self, mass):
+        """
+        return the normalized dN/dm at the masses (0 outside the mass range)
+        """
+        mass = np.asarray(mass, dtype=float)
+        i = np.clip(np.searchsorted(self.breaks, mass, side='right')-1, 0, len(self.slopes)-1)
+        inside = (mass >= self.breaks[0]) & (mass <= self.breaks[-1])
+        return np.where(inside, self._norm[i]*mass**-self.slopes[i]/self._total, 0.)
+
+    def sample(self, rng, n):
+        """
+        return n masses drawn with the numpy Generator rng
+        """
+        u = rng.random(n)
+        i = np.clip(np.searchsorted(self._cumulative, u, side='right')-1, 0, len(self.slopes)-1)
+        # position within the segment
+        v = (u-self._cumulative[i])/(self._cumulative[i+1]-self._cumulative[i])
+        mass = np.empty(n)
+        for k in range(len(self.slopes)):
+            sel = i == k
+            mass[sel] = _power_law_sample(v[sel], self.breaks[k], self.breaks[k+1], self.slopes[k])
+        return mass
+
+
+def SalpeterIMF(mmin=0.1, mmax=1.4, alpha=2.35):
+    """
+    return the Salpeter (1955) power law IMF in [mmin, mmax], a BrokenPowerLawIMF
+    """
+    return BrokenPowerLawIMF([mmin, mmax], [alpha])
+
+
+def KroupaIMF(mmin=0.01, mmax=1.4):
+    """
+    return the Kroupa (2001) IMF in [mmin, mmax], a BrokenPowerLawIMF with slopes 0.3,
+    1.3 and 2.3 below 0.08 Msun, between 0.08 and 0.5 Msun and above 0.5 Msun
+    """
+    breaks = [0., 0.08, 0.5, np.inf]
+    slopes = [0.3, 1.3, 2.3]
+    keep = [i for i in range(3) if breaks[i] < mmax and breaks[i+1] > mmin]
+    inner = [breaks[i+1] for i in keep[:-1]]
+    return BrokenPowerLawIMF([mmin] + inner + [mmax], [slopes[i] for i in keep])
+
+
+class ChabrierIMF(object):
+    """
+    Chabrier (2003) system IMF: log-normal below 1 Msun (characteristic mass 0.22 Msun,
+    sigma 0.57 dex) and a power law with alpha=2.3 above it. The masses are sampled
+    with the inverse of the cumulative distribution tabulated on a fine Log10(mass) grid.
+
+    Set system=False for the single stars IMF (0.079 Msun, 0.69 dex).
+    """
+    def __init__(self, mmin=0.01, mmax=1.4, system=True, ngrid=4096):
+        """
+        Parameters
+        ----------
+
+        mmin, mmax : float
+
+        mass range (Msun), default is [0.01, 1.4]
+
+        system : boolean
+
+        True (the default) for the system IMF, False for the single stars IMF
+
+        ngrid : integer
+
+        number of points of the tabulated cumulative distribution, default is 4096
+
+        """
+        self.mmin = float(mmin)
+        self.mmax = float(mmax)
+        self.system = system
+        self._mc, self._sigma = (0.22, 0.57) if system else (0.079, 0.69)
+        self._lmass = np.linspace(np.log10(self.mmin), np.log10(self.mmax), ngrid)
+        dndlm = self._dndlogm(self._lmass)
+        cdf = np.concatenate([[0.], np.cumsum(0.5*(dndlm[1:]+dndlm[:-1])*np.diff(self._lmass))])
+        self._total = cdf[-1]
+        self._cdf = cdf/cdf[-1]
+
+    def __repr__(self):
+        return 'ChabrierIMF({0}, {1}, system={2})'.format(self.mmin, self.mmax, self.system)
+
+    @property
+    def mass_range(self):
+        return self.mmin, self.mmax
+
+    def _dndlogm(self, lmass):
+        lognormal = np.exp(-(lmass-np.log10(self._mc))**2/(2.*self._sigma**2))
+        # power law above 1 Msun, continuous with the log-normal
+        at_one = np.exp(-np.log10(self._mc)**2/(2.*self._sigma**2))
+        return np.where(lmass <= 0., lognormal, at_one*10.**(-1.3*lmass))
+
+    def pdf(self, mass):
+        """
+        return the normalized dN/dm at the masses (0 outside the mass range)
+        """
+        mass = np.asarray(mass, dtype=float)
+        inside = (mass >= self.mmin) & (mass <= self.mmax)
+        lmass = np.log10(np.where(inside, mass, 1.))
+        return np.where(inside, self._dndlogm(lmass)/(self._total*mass*np.log(10.)), 0.)
+
+    def sample(self, rng, n):
+        """
+        return n masses drawn with the numpy Generator rng
+        """
+        return 10.**np.interp(rng.random(n), self._cdf, self._lmass)
+
+
+class ConstantSFH(object):
+    """
+    Constant star formation rate between two ages, the ages are uniform in age and
+    returned as Log10(age/yr)
+    """
+    def __init__(self, age_min, age_max):
+        """
+        Parameters
+        ----------
+
+        age_min, age_max : float
+
+        Log10(age/yr) of the youngest and of the oldest stars
+
+        """
+        self.age_min = float(age_min)
+        self.age_max = float(age_max)
+        if not self.age_min <= self.age_max:
+            raise ValueError("age_min must not be larger than age_max")
+
+    def __repr__(self):
+        return 'ConstantSFH({0}, {1})'.format(self.age_min, self.age_max)
+
+    def sample(self, rng, n):
+        """
+        return n Log10(age/yr) drawn with the numpy Generator rng
+        """
+        return np.log10(rng.uniform(10.**self.age_min, 10.**self.age_max, n))
+
+
+class GaussianSFH(object):
+    """
+    Star formation burst, the Log10(age/yr) have a normal distribution (a single age if
+    sigma is 0)
+    """
+    def __init__(self, age, sigma=0.):
+        """
+        Parameters
+        ----------
+
+        age : float
+
+        Log10(age/yr) of the burst
+
+        sigma : float
+
+        standard deviation of Log10(age/yr), default is 0
+
+        """
+        self.age = float(age)
+        self.sigma = float(sigma)
+
+    def __repr__(self):
+        return 'GaussianSFH({0}, {1})'.format(self.age, self.sigma)
+
+    def sample(self, rng, n):
+        """
+        return n Log10(age/yr) drawn with the numpy Generator rng
+        """
+        if self.sigma == 0.:
+            return np.full(n, self.age)
+        return rng.normal(self.age, self.sigma, n)
+
+
+def _sample_shard(pms, imf, sfh, labels, n, seed):
+    rng = np.random.default_rng(seed)
+    mass = imf.sample(rng, n)
+    age = sfh.sample(rng, n)
+    values, status = pms.interpolator_bilinear_multi(mass, age, labels)
+    shard = collections.OrderedDict([('mass', mass), ('age', age)])
+    for label in labels:
+        shard[label] = values[label]
+    shard['status'] = status
+    return shard
+
+
+# youngest Log10(age/yr) of the default star formation history, the first 0.1 Myr of
+#   the tracks depend mostly on the initial conditions of the models
+_MIN_DEFAULT_AGE = 5.
+
+
+def _default_sfh(tracks):
+    #
+    # constant star formation in the age range covered by all the tracks
+    age_min = max(tracks.age_min.max(), _MIN_DEFAULT_AGE)
+    age_max = tracks.age_max.min()
+    if not age_min < age_max:
+        raise ValueError("The tracks {0} have no common age range after Log10(age/yr)={1}, "
+                         "an explicit sfh is needed".format(tracks, _MIN_DEFAULT_AGE))
+    return ConstantSFH(age_min, age_max)
+
+
+# tracks used by the shards in the worker processes
+_tracks = None
+
+
+def _init_worker(descriptor):
+    global _tracks
+    _tracks = PMSTracks.attach(descriptor)
+
+
+def _sample_shard_worker(imf, sfh, labels, n, seed):
+    return _sample_shard(_tracks, imf, sfh, labels, n, seed)
+
+
+class Population(object):
+    """
+    Generator of synthetic stellar populations
+
+    Examples
+    --------
+    pop = Population('BHAC15', KroupaIMF(0.01, 1.4), ConstantSFH(6., 7.))
+    for shard in pop.iter_shards(10000000, seed=42, n_workers=4):
+        ...                            # shard['mass'], shard['age'], shard['llum'], ...
+    pop.write(open('cluster.txt', 'w'), 10000000, seed=42)
+
+    """
+    def __init__(self, tracks, imf=None, sfh=None, labels=('llum', 'teff'), **kwargs):
+        """
+        Parameters
+        ----------
+
+        tracks : string or PMSTracks
+
+        the tracks, or the name of the set to be loaded
+
+        imf : object with a sample(rng, n) method
+
+        initial mass function (BrokenPowerLawIMF, KroupaIMF(), SalpeterIMF(), ChabrierIMF),
+        default is KroupaIMF() in the mass range of the tracks
+
+        sfh : object with a sample(rng, n) method
+
+        star formation history, returning Log10(age/yr) (ConstantSFH, GaussianSFH).
+        The default is a constant star formation between the largest of the first ages
+        and the smallest of the last ages of the tracks, starting at least at 0.1 Myr
+        (Log10(age/yr)=5). A ValueError is raised if this range is empty
+
+        labels : list of strings
+
+        quantities interpolated for each star, default is ('llum', 'teff')
+
+        kwargs :
+
+        options passed to PMSTracks() if tracks is a name
+
+        """
+        self.tracks = tracks if isinstance(tracks, PMSTracks) else PMSTracks(tracks, **kwargs)
+        self.imf = imf if imf is not None else KroupaIMF(self.tracks.mass[0], self.tracks.mass[-1])
+        self.sfh = sfh if sfh is not None else _default_sfh(self.tracks)
+        self.labels = list(labels)
+
+    def __repr__(self):
+        return 'Population({0}, {1}, {2})'.format(self.tracks, self.imf, self.sfh)
+
+    @property
+    def columns(self):
+        return ['mass', 'age'] + self.labels + ['status']
+
+    @staticmethod
+    def shard_seeds(seed, nshards):
+        """
+        return the np.random.SeedSequence of each shard, the children of SeedSequence(seed)
+        """
+        sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        return sequence.spawn(nshards)
+
+    def sample_shard(self, n, seed):
+        """
+        return one shard of n stars generated with the seed (an integer or a SeedSequence)
+
+        Returns
+        -------
+        shard : OrderedDict
+
+        one array for each column: 'mass' (Msun), 'age' (Log10(age/yr)), the labels and
+        'status' (the status codes of interpolator_bilinear_multi())
+
+        """
+        return _sample_shard(self.tracks, self.imf, self.sfh, self.labels, n, seed)
+
+    def iter_shards(self, n, shard_size=1000000, seed=None, n_workers=None):
+        """
+        generates the population one shard at a time
+
+        Parameters
+        ----------
+
+        n : integer
+
+        number of stars
+
+        shard_size : integer
+
+        number of stars of each shard (the last one can be smaller), default is 1000000
+
+        seed : integer or np.random.SeedSequence
+
+        seed of the population, default is None (a new random seed, its entropy is stored
+        in self.entropy so that the population can be reproduced)
+
+        n_workers : integer
+
+        number of worker processes, default is None (the shards are generated in this
+        process). The tracks are shared with the workers and at most 2*n_workers shards
+        are in memory at the same time. The shards are the same for any n_workers
+
+        Returns
+        -------
+        shards : generator of the shards (see sample_shard()), in order
+
+        """
+        sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.entropy = sequence.entropy
+        nshards = (n+shard_size-1)//shard_size
+        seeds = self.shard_seeds(sequence, nshards)
+        sizes = [min(shard_size, n-i*shard_size) for i in range(nshards)]
+        if not n_workers:
+            for size, shard_seed in zip(sizes, seeds):
+                yield self.sample_shard(size, shard_seed)
+            return
+        #
+        # the shards are submitted in order and returned in the same order, no more
+        #   than 2*n_workers shards are submitted before they are returned
+        descriptor = self.tracks.publish()
+        try:
+            with concurrent.futures.ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                                        initargs=(descriptor,)) as pool:
+                pending = collections.deque()
+                for size, shard_seed in zip(sizes, seeds):
+                    pending.append(pool.submit(_sample_shard_worker, self.imf, self.sfh, self.labels,
+                                               size, shard_seed))
+                    while len(pending) >= 2*n_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            self.tracks.unpublish()
+
+    def sample(self, n, shard_size=1000000, seed=None, n_workers=None):
+        """
+        return the whole population, the shards of iter_shards() concatenated
+
+        The population is kept in memory, use iter_shards() or write() for large populations.
+        """
+        shards = list(self.iter_shards(n, shard_size=shard_size, seed=seed, n_workers=n_workers))
+        if not shards:
+            return collections.OrderedDict((col, np.array([])) for col in self.columns)
+        return collections.OrderedDict((col, np.concatenate([shard[col] for shard in shards]))
+                                       for col in self.columns)
+
+    def write(self, outfile, n, shard_size=1000000, seed=None, n_workers=None, fmt='%.8g', delimiter=' ',
+              header=True):
+        """
+        writes the population in a text file, one shard at a time
+
+        Parameters
+        ----------
+
+        outfile : file object
+
+        output file (text mode)
+
+        n, shard_size, seed, n_workers :
+
+        see iter_shards()
+
+        fmt : string
+
+        format of the floating point values, default is '%.8g'
+
+        delimiter : string
+
+        column delimiter, default is ' '
+
+        header : boolean
+
+        write the column names in the first line, default is True
+
+        Returns
+        -------
+        n : integer, the number of stars written
+
+        """
+        if header:
+            outfile.write(delimiter.join(self.columns) + '\n')
+        nwritten = 0
+        formats = [fmt]*(len(self.columns)-1) + ['%d']
+        for shard in self.iter_shards(n, shard_size=shard_size, seed=seed, n_workers=n_workers):
+            np.savetxt(outfile, np.column_stack([shard[col] for col in self.columns]), fmt=formats,
+                       delimiter=delimiter)
+            nwritten += len(shard['mass'])
+        return nwritten
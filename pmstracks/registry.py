@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import re
+import json
+import glob
+import numpy as np
+from collections import OrderedDict
+
+#
+# Registry of the track sets: for each set the files to be read (relative to the
+#   directory of the set in TRACKS_DIR) and the name of the PMSTracks reader method.
+#   PMSTracks looks up the set in the registry instead of a fixed list of cases, new
+#   sets are added with register_tracks().
+#
+# The manifest is a small json file in TRACKS_DIR with the files, the mass and age range
+#   of each set, so that the sets can be listed without reading them.
+#   It is created with write_manifest() and it is ignored for the sets whose files
+#   changed after it was written.
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_FORMAT = 2
+
+
+class TrackSet(object):
+    """
+    Description of a set of tracks in the registry
+    """
+    def __init__(self, name, files, reader, description='', directory=None, mass_pattern=None, mass_scale=1.,
+                 photometry=None, photometry_parser='parse_bhac15_iso', parameters=None):
+        """
+        Parameters
+        ----------
+
+        name : string
+
+        string code of the tracks, used in PMSTracks(tracks=name)
+
+        files : string
+
+        name of the file of the tracks, or glob pattern if the tracks are in several files
+
+        reader : string
+
+        name of the PMSTracks method that reads the files
+
+        description : string
+
+        short description (reference) of the tracks
+
+        directory : string
+
+        directory of the files, relative to TRACKS_DIR, default is name
+
+        mass_pattern : string
+
+        for the sets with one file per track, regular expression extracting the mass from
+        the file name (first group), used to select the files in a mass range
+
+        mass_scale : float
+
+        factor converting the number extracted by mass_pattern to Msun, default is 1
+
+        photometry : dictionary
+
+        files of the photometric isochrones of the set (in the same directory), by name
+        of the photometric system, default is None (no photometry)
+
+        photometry_parser : string
+
+        name of the function of pmstracks.parsers that reads the photometry files,
+        default is 'parse_bhac15_iso'
+
+        parameters : dictionary
+
+        for the files with several tables, the model parameters of the tables of the
+        set (e.g. {'Z': 0.1}), passed to the reader. Default is None (all the tables)
+
+        """
+        self.name = name
+        self.files = files
+        self.reader = reader
+        self.description = description
+        self.directory = directory if directory is not None else name
+        self.mass_pattern = mass_pattern
+        self.mass_scale = mass_scale
+        self.photometry = OrderedDict(photometry if photometry is not None else [])
+        self.photometry_parser = photometry_parser
+        self.parameters = parameters
+
+    def __repr__(self):
+        return 'TrackSet({0})'.format(self.name)
+
+    @property
+    def multi_file(self):
+        return glob.has_magic(self.files)
+
+    def path(self, tracks_dir):
+        return os.path.join(tracks_dir, self.directory)
+
+    def infiles(self, tracks_dir):
+        """
+        return the file name of the tracks, or the sorted list of files if there is one file per track
+        """
+        if self.multi_file:
+            return sorted(glob.glob(os.path.join(self.path(tracks_dir), self.files)))
+        return os.path.join(self.path(tracks_dir), self.files)
+
+    def photometry_file(self, system, tracks_dir):
+        """
+        return the file of the photometric isochrones of system, ValueError if there is none
+        """
+        if system not in self.photometry:
+            raise ValueError("No {0} photometry for the {1} tracks, available: {2}".format(
+                system, self.name, list(self.photometry)))
+        return os.path.join(self.path(tracks_dir), self.photometry[system])
+
+    def file_mass(self, filename):
+        """
+        return the mass (Msun) encoded in the name of a track file, None if it is not found
+        """
+        if self.mass_pattern is None:
+            return None
+        match = re.search(self.mass_pattern, os.path.basename(filename))
+        if match is None:
+            return None
+        # rounded, so that e.g. 0700 * 1e-3 is 0.7
+        return round(float(match.group(1))*self.mass_scale, 10)
+
+    def select_files(self, infiles, mass_range):
+        """
+        return the files of the tracks needed for mass_range, from the masses in the file names
+
+        The files of the tracks within mass_range and of the closest tracks outside of it
+        are returned, all the files are returned if the masses are not known.
+        """
+        from .store import select_bracketed
+        masses = [self.file_mass(f) for f in infiles]
+        if not infiles or None in masses:
+            return infiles
+        select = select_bracketed(np.array(masses), mass_range[0], mass_range[1])
+        return [f for f, sel in zip(infiles, select) if sel]
+
+
+_registry = OrderedDict()
+
+
+def register_tracks(name, files, reader, description='', directory=None, mass_pattern=None, mass_scale=1.,
+                    photometry=None, photometry_parser='parse_bhac15_iso', parameters=None):
+    """
+    adds a set of tracks to the registry, see TrackSet for the parameters
+    """
+    _registry[name] = TrackSet(name, files, reader, description=description, directory=directory,
+                               mass_pattern=mass_pattern, mass_scale=mass_scale, photometry=photometry,
+                               photometry_parser=photometry_parser, parameters=parameters)
+    return _registry[name]
+
+
+def get_track_set(name):
+    """
+    return the TrackSet registered as name, ValueError if it is not registered
+    """
+    try:
+        return _registry[name]
+    except KeyError:
+        raise ValueError("No valid reader method specified in pmstracks.")
+
+
+def track_names():
+    """
+    return the names of the registered track sets
+    """
+    return list(_registry.keys())
+
+
+register_tracks('BHAC15', 'BHAC15_tracks.dat', 'reader_bhac15', 'Baraffe et al. (2015) tracks',
+                photometry=[('2MASS', 'BHAC15_iso.2mass'), ('CFHT', 'BHAC15_iso.CFHT'),
+                            ('CIT2', 'BHAC15_iso.CIT2'), ('JWST', 'BHAC15_iso.JWST'),
+                            ('SPHERE', 'BHAC15_iso.SPHERE'), ('SPITZER', 'BHAC15_iso.SPITZER'),
+                            ('UKIDSS', 'BHAC15_iso.ukidss')])
+register_tracks('Siess00', '*.hrd', 'reader_siess00', 'Siess et al. (2000) tracks',
+                mass_pattern=r'^m([0-9.]+)z')
+register_tracks('F16_std', '*.trk', 'reader_feiden16_std', 'Feiden (2016) standard tracks',
+                mass_pattern=r'^m([0-9]{4})_', mass_scale=1.e-3)
+register_tracks('F16_mag', '*.ntrk', 'reader_feiden16_mag', 'Feiden (2016) magnetic tracks',
+                mass_pattern=r'^m([0-9]{4})_', mass_scale=1.e-3)
+#
+# Baraffe et al. models, several sets of tracks or of isochrones in the same file.
+#   BCAH97 contains only mass-magnitude relations (no ages) and it is not a set of tracks
+register_tracks('BCAH98', 'BCAH98_models.3', 'reader_baraffe_tracks',
+                'Baraffe et al. (1998) tracks, [M/H]=0, Y=0.282, L_mix=1.9 H_P',
+                photometry=[('CIT', 'BCAH98_iso.3'), ('HST', 'BCAH98_iso.3HSTfilters')],
+                photometry_parser='parse_baraffe_isochrones')
+register_tracks('BCAH98_ext', 'BCAH98_models.3_extend', 'reader_baraffe_tracks',
+                'Baraffe et al. (1998) tracks, [M/H]=0, Y=0.282, L_mix=1.9 H_P, extended', directory='BCAH98',
+                photometry=[('CIT', 'BCAH98_iso.3_extend')], photometry_parser='parse_baraffe_isochrones')
+register_tracks('BCAH98_lmix1.0', 'BCAH98_models.1', 'reader_baraffe_tracks',
+                'Baraffe et al. (1998) tracks, [M/H]=0, Y=0.275, L_mix=1.0 H_P', directory='BCAH98',
+                photometry=[('CIT', 'BCAH98_iso.1'), ('HST', 'BCAH98_iso.1HSTfilters')],
+                photometry_parser='parse_baraffe_isochrones')
+register_tracks('BCAH98_lmix1.5', 'BCAH98_models.2', 'reader_baraffe_tracks',
+                'Baraffe et al. (1998) tracks, [M/H]=0, Y=0.275, L_mix=1.5 H_P', directory='BCAH98',
+                photometry=[('CIT', 'BCAH98_iso.2'), ('HST', 'BCAH98_iso.2HSTfilters')],
+                photometry_parser='parse_baraffe_isochrones')
+register_tracks('BCAH98_mh05', 'BCAH98_models.mh05', 'reader_baraffe_tracks',
+                'Baraffe et al. (1998) tracks, [M/H]=-0.5, Y=0.25', directory='BCAH98',
+                photometry=[('CIT', 'BCAH98_iso.mh05')], photometry_parser='parse_baraffe_isochrones')
+register_tracks('DUSTY00', 'DUSTY00_models', 'reader_baraffe_isochrones',
+                'Chabrier et al. (2000) DUSTY models (from the isochrones)',
+                photometry=[('CIT', 'DUSTY00_models'), ('HST', 'DUSTY00_models.HSTfilters')],
+                photometry_parser='parse_baraffe_isochrones')
+register_tracks('COND03', 'COND03_models', 'reader_baraffe_isochrones',
+                'Baraffe et al. (2003) COND models (from the isochrones)',
+                photometry=[('CIT', 'COND03_models')], photometry_parser='parse_baraffe_isochrones')
+for _z in (0.02, 0.10, 0.50, 0.90):
+    for _irrad, _text in (('noirrad', 'no irradiation'), ('irrad', 'irradiated at 0.045 AU from a Sun')):
+        register_tracks('PLANET08_Z{0:.2f}{1}'.format(_z, '_irrad' if _irrad == 'irrad' else ''),
+                        'PLANET08_tracks.' + _irrad, 'reader_baraffe_tracks',
+                        'Baraffe et al. (2008) planet tracks, Z={0:.2f}, {1}'.format(_z, _text),
+                        directory='PLANET08', parameters={'Z': _z})
+
+#
+# Families of track sets that differ by one model parameter, they are stacked along
+#   that parameter by TrackGrid. For the Feiden (2016) models the field strength of the
+#   magnetic tracks depends on the mass (it is in the file names, e.g. mag22kG), so there
+#   is no physical parameter shared by the two sets: the 'magnetic' axis only blends
+#   linearly the standard (0) and the magnetic (1) tracks, its intermediate values are not
+#   models with a weaker field. The same holds for the 'irradiation' axis of PLANET08.
+_families = OrderedDict()
+
+
+def register_family(name, axis, members, description=''):
+    """
+    adds a family of track sets to the registry
+
+    Parameters
+    ----------
+    name : string
+
+    name of the family, used in TrackGrid(name)
+
+    axis : string
+
+    name of the parameter that changes between the sets
+
+    members : list of (float, string)
+
+    value of the parameter and name of the track set, for each set of the family
+
+    description : string
+
+    short description of the family
+
+    """
+    _families[name] = {'axis': axis, 'members': [(float(value), tracks) for value, tracks in members],
+                       'description': description}
+    return _families[name]
+
+
+def get_family(name):
+    """
+    return the family registered as name (a dictionary with 'axis', 'members' and
+    'description'), ValueError if it is not registered
+    """
+    try:
+        return _families[name]
+    except KeyError:
+        raise ValueError("No family of tracks {0}, available: {1}".format(name, list(_families)))
+
+
+def family_names():
+    """
+    return the names of the registered families of track sets
+    """
+    return list(_families.keys())
+
+
+register_family('F16', 'magnetic', [(0., 'F16_std'), (1., 'F16_mag')],
+                'Feiden (2016) tracks, linear blend of the standard (0) and magnetic (1) tracks')
+register_family('BCAH98_lmix', 'L_mix', [(1.0, 'BCAH98_lmix1.0'), (1.5, 'BCAH98_lmix1.5'), (1.9, 'BCAH98')],
+                'Baraffe et al. (1998) tracks, [M/H]=0, mixing length in units of H_P')
+register_family('BCAH98_mh', '[M/H]', [(-0.5, 'BCAH98_mh05'), (0., 'BCAH98')],
+                'Baraffe et al. (1998) tracks, metallicity')
+register_family('PLANET08', 'Z', [(_z, 'PLANET08_Z{0:.2f}'.format(_z)) for _z in (0.02, 0.10, 0.50, 0.90)],
+                'Baraffe et al. (2008) planet tracks without irradiation, heavy elements mass fraction')
+register_family('PLANET08_irrad', 'Z', [(_z, 'PLANET08_Z{0:.2f}_irrad'.format(_z)) for _z in (0.02, 0.10, 0.50, 0.90)],
+                'Baraffe et al. (2008) irradiated planet tracks, heavy elements mass fraction')
+for _z in (0.02, 0.10, 0.50, 0.90):
+    register_family('PLANET08_Z{0:.2f}_irradiation'.format(_z), 'irradiation',
+                    [(0., 'PLANET08_Z{0:.2f}'.format(_z)), (1., 'PLANET08_Z{0:.2f}_irrad'.format(_z))],
+                    'Baraffe et al. (2008) planet tracks, Z={0:.2f}, linear blend of the non irradiated (0) '
+                    'and irradiated (1) tracks'.format(_z))
+
+
+def _manifest_file(tracks_dir):
+    return os.path.join(tracks_dir, MANIFEST_NAME)
+
+
+def _file_list(infiles, tracks_dir):
+    if not isinstance(infiles, list):
+        infiles = [infiles]
+    return [{'name': os.path.relpath(f, tracks_dir), 'size': os.path.getsize(f)} for f in infiles]
+
+
+def read_manifest(tracks_dir):
+    """
+    return the manifest of tracks_dir as a dictionary (empty if there is no manifest)
+    """
+    try:
+        with open(_manifest_file(tracks_dir)) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return {}
+    return manifest.get('tracks', {})
+
+
+def manifest_entry(pms, tracks_dir):
+    """
+    return the manifest entry of a loaded PMSTracks object
+
+    The entry contains the description of the set, the files with their sizes, the mass
+    and age range and the number of tracks of the set.
+    """
+    entry = get_track_set(pms.tracks_name)
+    return {'description': entry.description, 'files': _file_list(entry.infiles(tracks_dir), tracks_dir),
+            'mass_range': [float(pms.mass[0]), float(pms.mass[-1])],
+            'age_range': [float(pms.age_min.min()), float(pms.age_max.max())],
+            'ntracks': len(pms.tracks)}
+
+
+def write_manifest(tracks_dir, names=None):
+    """
+    reads the track sets and writes their manifest in tracks_dir
+
+    Parameters
+    ----------
+    tracks_dir : string
+
+    directory of the tracks
+
+    names : list of strings
+
+    sets to be (re)described, default is all the registered sets whose files exist.
+    The entries of the other sets already in the manifest are kept
+
+    """
+    from .pmstracks import PMSTracks
+    tracks = read_manifest(tracks_dir)
+    if names is None:
+        names = [name for name in track_names() if os.path.isdir(get_track_set(name).path(tracks_dir))]
+    for name in names:
+        tracks[name] = manifest_entry(PMSTracks(name, cache=False), tracks_dir)
+    with open(_manifest_file(tracks_dir), 'w') as f:
+        json.dump({'format': MANIFEST_FORMAT, 'tracks': tracks}, f, indent=1, sort_keys=True)
+    return tracks
+
+
+def list_tracks(tracks_dir):
+    """
+    return the description of the registered track sets, without reading the tracks
+
+    Returns
+    -------
+    tracks : OrderedDict
+
+    for each registered set, the manifest entry (see manifest_entry()) if the manifest
+    is up to date with the files of the set, otherwise only the 'description' and the
+    'files', while 'mass_range' and 'age_range' are None
+
+    """
+    manifest = read_manifest(tracks_dir)
+    result = OrderedDict()
+    for name in track_names():
+        entry = get_track_set(name)
+        files = _file_list(entry.infiles(tracks_dir), tracks_dir) if os.path.isdir(entry.path(tracks_dir)) else []
+        described = manifest.get(name)
+        if described is not None and [(f['name'], f['size']) for f in described['files']] == \
+                [(f['name'], f['size']) for f in files]:
+            result[name] = described
+        else:
+            result[name] = {'description': entry.description, 'files': files,
+                            'mass_range': None, 'age_range': None}
+    return result
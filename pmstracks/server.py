@@ -0,0 +1,384 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import sys
+import json
+import math
+import time
+import queue
+import argparse
+import threading
+import collections
+import concurrent.futures
+import numpy as np
+
+try:
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+from .pmstracks import PMSTracks
+
+#
+# A small HTTP/JSON service for the tracks interpolation and inversion. The tracks
+#   are loaded once when the server starts. The requests are handled in separate
+#   threads, which pass the points to a MicroBatcher: the points of all the requests
+#   received within max_wait seconds are concatenated and processed with a single
+#   call of the vectorized methods, and the results are split back to the requests.
+#
+# Endpoints:
+#   POST /interpolate  {"tracks": "BHAC15", "mass": ..., "age": ..., "labels": ["llum", "teff"]}
+#                      -> {"llum": ..., "teff": ..., "status": ...}
+#   POST /invert       {"tracks": "BHAC15", "llum": ..., "teff": ...}
+#                      -> {"mass": ..., "age": ..., "status": ...}
+#   GET  /stats        counters of requests, points, batches, latency and throughput
+#   GET  /tracks       the track sets loaded
+# The values can be numbers or lists of numbers, nan and infinite values are returned as null.
+
+
+class _Server(ThreadingHTTPServer):
+    # many clients can connect at the same time, the default listen backlog is 5
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class MicroBatcher(object):
+    """
+    Collects the points submitted by several threads and processes them in batches
+
+    func is called with concatenated arrays and must return a list of arrays of the
+    same length, which are split back to the submitters.
+
+    """
+    def __init__(self, func, max_batch=100000, max_wait=0.002, stats=None):
+        """
+        Parameters
+        ----------
+
+        func : callable
+
+        function processing a batch, func(*arrays) -> list of arrays
+
+        max_batch : integer
+
+        maximum number of points in a batch, default is 100000
+
+        max_wait : float
+
+        maximum time (s) waited for other requests after the first of a batch, default is 0.002
+
+        stats : ServerStats
+
+        if given, the batches are recorded in stats
+
+        """
+        self.func = func
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = stats
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, *arrays):
+        """
+        return a concurrent.futures.Future with the list of the result arrays for these points
+        """
+        future = concurrent.futures.Future()
+        self._queue.put((arrays, future))
+        return future
+
+    def close(self):
+        """
+        stops the batching thread after the pending requests are processed
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        running = True
+        while running:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            npoints = len(item[0][0])
+            deadline = time.time() + self.max_wait
+            while npoints < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0., deadline-time.time()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+                npoints += len(item[0][0])
+            self._process(batch, npoints)
+
+    def _process(self, batch, npoints):
+        t0 = time.time()
+        try:
+            args = [np.concatenate([arrays[i] for arrays, future in batch]) for i in range(len(batch[0][0]))]
+            results = self.func(*args)
+            edges = np.cumsum([len(arrays[0]) for arrays, future in batch])[:-1]
+            parts = [np.split(res, edges) for res in results]
+            for i, (arrays, future) in enumerate(batch):
+                future.set_result([part[i] for part in parts])
+        except Exception as e:
+            for arrays, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        if self.stats is not None:
+            self.stats.record_batch(len(batch), npoints, time.time()-t0)
+
+
+class ServerStats(object):
+    """
+    Thread safe counters of the requests and batches processed by the server
+    """
+    def __init__(self, nlatency=10000):
+        self._lock = threading.Lock()
+        self.start_time = time.time()
+        self.requests = 0
+        self.errors = 0
+        self.points = 0
+        self.batches = 0
+        self.batch_points = 0
+        self.batch_time = 0.
+        self.latencies = collections.deque(maxlen=nlatency)
+
+    def record_request(self, latency, npoints, error=False):
+        with self._lock:
+            self.requests += 1
+            self.points += npoints
+            if error:
+                self.errors += 1
+            self.latencies.append(latency)
+
+    def record_batch(self, nrequests, npoints, seconds):
+        with self._lock:
+            self.batches += 1
+            self.batch_points += npoints
+            self.batch_time += seconds
+
+    def as_dict(self):
+        """
+        return the counters, the latency percentiles (ms, on the last requests) and the throughput
+        """
+        with self._lock:
+            uptime = time.time()-self.start_time
+            latencies = np.array(self.latencies)
+            result = {'uptime': uptime, 'requests': self.requests, 'errors': self.errors,
+                      'points': self.points, 'batches': self.batches,
+                      'points_per_batch': self.batch_points/float(self.batches) if self.batches else 0.,
+                      'requests_per_second': self.requests/uptime,
+                      'points_per_second': self.points/uptime,
+                      'busy_fraction': self.batch_time/uptime}
+        for p in (50, 90, 99):
+            result['latency_ms_p{}'.format(p)] = float(np.percentile(latencies, p))*1.e3 if len(latencies) else 0.
+        return result
+
+
+def _to_json(arr, scalar):
+    # nan and infinite values are not valid JSON
+    values = [v if math.isfinite(v) else None for v in arr.tolist()]
+    return values[0] if scalar else values
+
+
+class TrackServer(object):
+    """
+    HTTP/JSON server for the interpolation and inversion of preloaded PMS tracks
+
+    Examples
+    --------
+    server = TrackServer(['BHAC15', 'F16_mag'], port=8080)
+    server.serve_forever()
+
+    """
+    def __init__(self, tracks=('BHAC15',), host='127.0.0.1', port=8080, max_batch=100000,
+                 max_wait=0.002, verbose=False):
+        """
+        Parameters
+        ----------
+
+        tracks : list of strings
+
+        track sets to be loaded, default is ('BHAC15',)
+
+        host, port : string, integer
+
+        address of the server, default is 127.0.0.1:8080 (port 0 chooses a free port)
+
+        max_batch : integer
+
+        maximum number of points processed in one vectorized call, default is 100000
+
+        max_wait : float
+
+        time (s) the batches wait for concurrent requests, default is 0.002
+
+        verbose : boolean
+
+        log the requests on stderr, default is False
+
+        """
+        self.verbose = verbose
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.tracks = dict((name, PMSTracks(name)) for name in tracks)
+        self.stats = ServerStats()
+        self._batchers = {}
+        self._lock = threading.Lock()
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.track_server = self
+
+    @property
+    def address(self):
+        return self.httpd.server_address
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """
+        starts the server in a background thread
+        """
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        for batcher in self._batchers.values():
+            batcher.close()
+
+    def _batcher(self, key, func):
+        with self._lock:
+            if key not in self._batchers:
+                self._batchers[key] = MicroBatcher(func, max_batch=self.max_batch,
+                                                   max_wait=self.max_wait, stats=self.stats)
+            return self._batchers[key]
+
+    def _get_tracks(self, query):
+        name = query.get('tracks', sorted(self.tracks)[0] if len(self.tracks) == 1 else None)
+        if name not in self.tracks:
+            raise ValueError("tracks must be one of {}".format(sorted(self.tracks)))
+        return name, self.tracks[name]
+
+    def interpolate(self, query):
+        """
+        return the answer to a /interpolate query, see the module description
+        """
+        name, pms = self._get_tracks(query)
+        labels = query.get('labels', ('llum', 'teff'))
+        labels = (labels,) if isinstance(labels, str) else tuple(labels)
+        for label in labels:
+            if label not in pms.store.columns or label == 'lage':
+                raise ValueError("unknown label {}".format(label))
+
+        def func(mass, age):
+            values, status = pms.interpolator_bilinear_multi(mass, age, labels)
+            return [values[label] for label in labels] + [status]
+        scalar = np.ndim(query['mass']) == 0 and np.ndim(query['age']) == 0
+        mass, age = [np.atleast_1d(np.asarray(x, dtype=float)) for x in
+                     np.broadcast_arrays(query['mass'], query['age'])]
+        results = self._batcher((name, 'interpolate', labels), func).submit(mass, age).result()
+        answer = dict((label, _to_json(res, scalar)) for label, res in zip(labels + ('status',), results))
+        return answer, len(mass)
+
+    def invert(self, query):
+        """
+        return the answer to a /invert query, see the module description
+        """
+        name, pms = self._get_tracks(query)
+
+        def func(llum, teff):
+            return list(pms.invert_hrd(llum, teff))
+        scalar = np.ndim(query['llum']) == 0 and np.ndim(query['teff']) == 0
+        llum, teff = [np.atleast_1d(np.asarray(x, dtype=float)) for x in
+                      np.broadcast_arrays(query['llum'], query['teff'])]
+        results = self._batcher((name, 'invert'), func).submit(llum, teff).result()
+        answer = dict((label, _to_json(res, scalar)) for label, res in zip(('mass', 'age', 'status'), results))
+        return answer, len(llum)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.track_server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        server = self.server.track_server
+        if self.path == '/stats':
+            self._send(200, server.stats.as_dict())
+        elif self.path == '/tracks':
+            self._send(200, sorted(server.tracks))
+        else:
+            self._send(404, {'error': 'unknown path {}'.format(self.path)})
+
+    def do_POST(self):
+        server = self.server.track_server
+        t0 = time.time()
+        methods = {'/interpolate': server.interpolate, '/invert': server.invert}
+        if self.path not in methods:
+            self._send(404, {'error': 'unknown path {}'.format(self.path)})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            query = json.loads(self.rfile.read(length).decode())
+            if not isinstance(query, dict):
+                raise ValueError("the query must be a JSON object")
+            answer, npoints = methods[self.path](query)
+        except (ValueError, KeyError, TypeError) as e:
+            server.stats.record_request(time.time()-t0, 0, error=True)
+            self._send(400, {'error': '{0}: {1}'.format(type(e).__name__, e)})
+            return
+        server.stats.record_request(time.time()-t0, npoints)
+        self._send(200, answer)
+
+
+def main(argv=None):
+    """
+    Entry point of the pmstracks-serve command
+    """
+    parser = argparse.ArgumentParser(prog='pmstracks-serve',
+                                     description='HTTP/JSON server for the interpolation and inversion of PMS tracks')
+    parser.add_argument('-t', '--tracks', default='BHAC15',
+                        help='comma separated list of the track sets to be loaded, default is BHAC15')
+    parser.add_argument('--host', default='127.0.0.1', help='server address, default is 127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8080, help='server port, default is 8080')
+    parser.add_argument('--max-batch', type=int, default=100000, help='maximum points per batch')
+    parser.add_argument('--max-wait', type=float, default=0.002, help='batching time window (s)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='log the requests')
+    args = parser.parse_args(argv)
+    server = TrackServer(args.tracks.split(','), host=args.host, port=args.port,
+                         max_batch=args.max_batch, max_wait=args.max_wait, verbose=args.verbose)
+    print('Serving {0} on http://{1}:{2}'.format(sorted(server.tracks), *server.address[:2]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,487 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class TrackStore(object):
+    """
+    Columnar storage of a set of PMS tracks
+
+    The per-timestep quantities of all the tracks are concatenated in one contiguous
+    array per label (the tracks are stored one after the other, as in a CSR matrix),
+    and offsets[i]:offsets[i+1] is the range of points of the i-th track.
+    Only the mass of each track is stored, the redundant per-timestep 'mass' array and
+    the 'nage' entry of the track dictionaries are derived from the offsets.
+
+    The tracks can still be accessed as dictionaries, store[i]['llum'] (or the elements
+    of store.tracks()) returns a view of the i-th track within the 'llum' column.
+
+    """
+    def __init__(self, model_mass, offsets, columns, dtype=None):
+        """
+        Parameters
+        ----------
+
+        model_mass : array
+
+        mass of each track
+
+        offsets : integer array
+
+        index of the first point of each track in the columns, with the total number
+        of points as last element (len(model_mass)+1 elements)
+
+        columns : dictionary
+
+        one array for each per-timestep label, with the points of all the tracks
+
+        dtype : numpy dtype
+
+        floating point type of the columns, e.g. np.float32 to halve the memory used,
+        default is None (the columns are kept with their type)
+
+        """
+        self.model_mass = np.asarray(model_mass, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if len(self.offsets) != len(self.model_mass)+1:
+            raise ValueError("offsets must have one element more than model_mass")
+        self.columns = {}
+        for label, col in columns.items():
+            col = np.ascontiguousarray(col, dtype=dtype)
+            if len(col) != self.offsets[-1]:
+                raise ValueError("column {0} has {1} points instead of {2}".format(label, len(col),
+                                                                                 self.offsets[-1]))
+            self.columns[label] = col
+        self._shared = None
+
+    @classmethod
+    def from_tracks(cls, tracks, dtype=None):
+        """
+        Creates the store from a list of track dictionaries, as returned by the readers
+        """
+        nage = [len(trk['lage']) for trk in tracks]
+        offsets = np.concatenate([[0], np.cumsum(nage)]).astype(np.int64)
+        labels = [label for label in sorted(tracks[0].keys())
+                  if label not in ('model_mass', 'mass', 'nage')]
+        columns = {label: np.concatenate([trk[label] for trk in tracks]) for label in labels}
+        return cls([trk['model_mass'] for trk in tracks], offsets, columns, dtype=dtype)
+
+    def __len__(self):
+        return len(self.model_mass)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("track index out of range")
+        return TrackView(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield TrackView(self, i)
+
+    def __repr__(self):
+        return 'TrackStore({0} tracks, {1} points)'.format(len(self), self.offsets[-1])
+
+    @property
+    def labels(self):
+        """
+        sorted list of the per-timestep labels stored
+        """
+        return sorted(self.columns.keys())
+
+    @property
+    def nbytes(self):
+        """
+        memory used by the store arrays, in bytes
+        """
+        return (sum(col.nbytes for col in self.columns.values()) +
+                self.offsets.nbytes + self.model_mass.nbytes)
+
+    def tracks(self):
+        """
+        return the list of the track dictionaries (views on the columns)
+        """
+        return list(self)
+
+    def decimate(self, tol, xlabel='lage'):
+        """
+        return a new store with the points of the tracks that are not needed by the linear interpolation
+
+        Each track is simplified with simplify_track(), so that the linear interpolation
+        in xlabel of the decimated tracks differs from the interpolation of the original
+        tracks by less than tol[label] for each label in tol.
+
+        Parameters
+        ----------
+
+        tol : dictionary
+
+        maximum interpolation error allowed for each label, e.g. {'llum': 0.001, 'teff': 1.}
+        (same units as the stored quantities), the labels that are not in tol are not checked
+
+        xlabel : string
+
+        label of the independent variable of the interpolation, default is 'lage'
+
+        Returns
+        -------
+        store : TrackStore
+
+        the decimated tracks, with the same dtype
+
+        """
+        keep = []
+        x = self.columns[xlabel]
+        for i in range(len(self)):
+            i0 = self.offsets[i]
+            i1 = self.offsets[i+1]
+            idx = simplify_track(x[i0:i1], dict((label, self.columns[label][i0:i1]) for label in tol), tol)
+            keep.append(i0+idx)
+        keep = np.concatenate(keep) if keep else np.array([], dtype=np.int64)
+        nage = [len(k) for k in np.split(keep, np.searchsorted(keep, self.offsets[1:-1]))]
+        offsets = np.concatenate([[0], np.cumsum(nage)]).astype(np.int64)
+        columns = dict((label, col[keep]) for label, col in self.columns.items())
+        return TrackStore(self.model_mass, offsets, columns)
+
+    def _arrays(self):
+        arrays = [('model_mass', self.model_mass), ('offsets', self.offsets)]
+        return arrays + [('col_'+label, self.columns[label]) for label in self.labels]
+
+    #
+    # The store is copied in one block of shared memory (or in a file), the arrays are
+    #   aligned to 64 bytes. The returned descriptor is a small dictionary that can be
+    #   pickled and sent to the worker processes, which use it to attach to the block
+    def publish(self, filename=None, name=None):
+        """
+        copies the store in shared memory or in a file that other processes can attach to
+
+        Parameters
+        ----------
+
+        filename : string
+
+        if given, the store is written to this file, that is then memory mapped read only
+        by attach(). Default is None (the store is copied in a multiprocessing.shared_memory
+        block)
+
+        name : string
+
+        name of the shared memory block, default is None (a unique name is chosen)
+
+        Returns
+        -------
+        descriptor : dictionary
+
+        the information needed by TrackStore.attach() to access the published store
+
+        Examples
+        --------
+        descriptor = store.publish()
+        # in another process
+        store = TrackStore.attach(descriptor)
+        # when all the processes are done
+        store.unpublish()
+
+        """
+        layout = []
+        nbytes = 0
+        for key, arr in self._arrays():
+            layout.append((key, arr.dtype.str, nbytes, len(arr)))
+            nbytes += (arr.nbytes+63)//64*64
+        if filename is None:
+            if shared_memory is None:
+                raise RuntimeError("multiprocessing.shared_memory is not available, use filename")
+            if self._shared is not None:
+                raise RuntimeError("the store is already published as {}".format(self._shared.name))
+            shm = shared_memory.SharedMemory(name=name, create=True, size=max(nbytes, 1))
+            buf = shm.buf
+            descriptor = {'kind': 'shm', 'name': shm.name}
+        else:
+            buf = np.memmap(filename, dtype=np.uint8, mode='w+', shape=(max(nbytes, 1),))
+            descriptor = {'kind': 'file', 'name': os.path.abspath(filename)}
+        for (key, arr), (key, dtype, start, n) in zip(self._arrays(), layout):
+            np.frombuffer(buf, dtype=dtype, count=n, offset=start)[:] = arr
+        if filename is None:
+            self._shared = shm
+        else:
+            buf.flush()
+            del buf
+        descriptor.update({'nbytes': nbytes, 'layout': layout})
+        return descriptor
+
+    def unpublish(self):
+        """
+        releases the shared memory block created by publish()
+
+        The processes attached to the store can keep using it, the memory is freed
+        when all of them are terminated.
+        """
+        if self._shared is not None:
+            self._shared.close()
+            self._shared.unlink()
+            self._shared = None
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        return a store using the arrays published by TrackStore.publish(), without copies
+
+        The arrays of the returned store are read only.
+
+        Parameters
+        ----------
+
+        descriptor : dictionary
+
+        the value returned by TrackStore.publish()
+
+        Returns
+        -------
+        store : TrackStore
+
+        """
+        if descriptor['kind'] == 'shm':
+            try:
+                # python >= 3.13, the block is owned by the publishing process
+                shm = shared_memory.SharedMemory(name=descriptor['name'], track=False)
+            except TypeError:
+                shm = shared_memory.SharedMemory(name=descriptor['name'])
+            buf = shm.buf
+        else:
+            shm = None
+            buf = np.memmap(descriptor['name'], dtype=np.uint8, mode='r',
+                            shape=(max(descriptor['nbytes'], 1),))
+        arrays = {}
+        for key, dtype, start, n in descriptor['layout']:
+            arr = np.frombuffer(buf, dtype=dtype, count=n, offset=start)
+            arr.flags.writeable = False
+            arrays[key] = arr
+        columns = dict((key[4:], arr) for key, arr in arrays.items() if key.startswith('col_'))
+        store = cls.__new__(cls)
+        store.model_mass = arrays['model_mass']
+        store.offsets = arrays['offsets']
+        store.columns = columns
+        # the attached block must live as long as the arrays, it is not released by unpublish()
+        store._shared = None
+        store._attached = shm if shm is not None else buf
+        return store
+
+    def window(self, age_range, xlabel='lage'):
+        """
+        return a new store with only the points of the tracks needed in the age window
+
+        For each track the points within age_range are kept, together with all the points
+        at the closest age below and above the window, so that the interpolation of the
+        tracks at the ages within the window is the same as that of the complete tracks.
+        Outside of the window the tracks are truncated.
+
+        Parameters
+        ----------
+
+        age_range : list of two floats
+
+        minimum and maximum age of the window (same units as the tracks ages), None for
+        no limit
+
+        xlabel : string
+
+        label of the ages, default is 'lage'
+
+        Returns
+        -------
+        store : TrackStore
+
+        """
+        x = self.columns[xlabel]
+        keep = np.zeros(len(x), dtype=bool)
+        for i in range(len(self)):
+            i0 = self.offsets[i]
+            i1 = self.offsets[i+1]
+            keep[i0:i1] = select_bracketed(x[i0:i1], age_range[0], age_range[1])
+        nage = np.add.reduceat(keep, self.offsets[:-1]) if len(x) else np.zeros(len(self), dtype=int)
+        nage[np.diff(self.offsets) == 0] = 0
+        offsets = np.concatenate([[0], np.cumsum(nage)]).astype(np.int64)
+        columns = dict((label, col[keep]) for label, col in self.columns.items())
+        return TrackStore(self.model_mass, offsets, columns)
+
+
+#
+# Bracketing of values in a grid of nodes, shared by the interpolations on regular
+#   grids (PhotometricGrid) and by the third axis of TrackGrid
+def bracket(nodes, x):
+    """
+    return the index of the lower node of the interval containing each x and the position in it
+
+    Parameters
+    ----------
+    nodes : numpy array
+
+    increasing values of the nodes, at least two
+
+    x : numpy array
+
+    values to be bracketed
+
+    Returns
+    -------
+    i, f
+
+    i: integer array, index of the lower node, clipped to [0, len(nodes)-2]
+    f: float array, (x-nodes[i])/(nodes[i+1]-nodes[i]), outside [0, 1] for x outside the nodes
+
+    """
+    i = np.clip(np.searchsorted(nodes, x, side='right')-1, 0, len(nodes)-2)
+    f = (x-nodes[i])/(nodes[i+1]-nodes[i])
+    return i, f
+
+
+#
+# Selection of the values within a range, together with the closest values outside of
+#   it, used to load only the tracks (and the points) needed for a mass and age window
+def select_bracketed(values, vmin=None, vmax=None):
+    """
+    return a boolean mask selecting the values in [vmin, vmax] and the bracketing values
+
+    All the elements equal to the largest value below vmin and to the smallest value
+    above vmax are also selected. None means no limit.
+
+    Examples
+    --------
+    select_bracketed(np.array([0.1, 0.2, 0.3, 0.4, 0.5]), 0.25, 0.35)
+    -> [False, True, True, True, False]
+
+    """
+    values = np.asarray(values, dtype=float)
+    vmin = -np.inf if vmin is None else vmin
+    vmax = np.inf if vmax is None else vmax
+    select = (values >= vmin) & (values <= vmax)
+    below = values[values < vmin]
+    if len(below):
+        select |= values == below.max()
+    above = values[values > vmax]
+    if len(above):
+        select |= values == above.min()
+    return select
+
+
+#
+# Douglas-Peucker simplification of a track, with the error measured along the y axes:
+#   the track is recursively split at the point with the largest error of the
+#   straight line between the first and last point, until all the errors are within
+#   the tolerances
+def simplify_track(x, ys, tol):
+    """
+    return the indices of the points of a track needed to keep the linear interpolation within tol
+
+    The linear interpolation in x of the returned points differs from the interpolation
+    of all the points by less than tol[label] for all the ys labels. Both are piecewise
+    linear, so the maximum difference is at the original points and it is bounded by
+    the error of each removed point.
+    The first and last points, the points with repeated x values (used by np.interp to
+    resolve the steps) and the points with non finite values are always kept.
+
+    Parameters
+    ----------
+    x : numpy array
+
+    independent variable, sorted in increasing order
+
+    ys : dictionary
+
+    arrays with the dependent variables, same length as x
+
+    tol : dictionary
+
+    maximum error allowed for each of the ys labels
+
+    Returns
+    -------
+    idx : numpy integer array, sorted indices of the points to be kept
+
+    """
+    n = len(x)
+    if n <= 2:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    labels = list(ys.keys())
+    yy = np.array([np.asarray(ys[label], dtype=float) for label in labels])
+    scale = np.array([1./tol[label] for label in labels])[:, None]
+    #
+    fixed = ~np.isfinite(x) | ~np.isfinite(yy).all(axis=0)
+    repeated = np.diff(x) == 0
+    fixed[1:] |= repeated
+    fixed[:-1] |= repeated
+    fixed[0] = fixed[-1] = True
+    keep = fixed.copy()
+    #
+    anchors = np.flatnonzero(fixed)
+    stack = [(i, j) for i, j in zip(anchors[:-1], anchors[1:]) if j > i+1]
+    while stack:
+        i, j = stack.pop()
+        xs = x[i+1:j]
+        line = yy[:, i:i+1] + (yy[:, j:j+1]-yy[:, i:i+1])*((xs-x[i])/(x[j]-x[i]))
+        err = (np.abs(yy[:, i+1:j]-line)*scale).max(axis=0)
+        k = np.argmax(err)
+        if err[k] > 1.:
+            k += i+1
+            keep[k] = True
+            if k > i+1:
+                stack.append((i, k))
+            if j > k+1:
+                stack.append((k, j))
+    return np.flatnonzero(keep)
+
+
+class TrackView(Mapping):
+    """
+    Read only dictionary view of one track of a TrackStore
+
+    The keys are those of the track dictionaries created by the readers: 'model_mass',
+    'nage', 'mass' and the per-timestep labels of the store. The arrays are views
+    of the store columns, so that their elements can be modified in place, while the
+    'mass' array is a read only broadcast of the mass of the track.
+
+    """
+    __slots__ = ('_store', '_index')
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, key):
+        store = self._store
+        i0 = store.offsets[self._index]
+        i1 = store.offsets[self._index+1]
+        if key in store.columns:
+            return store.columns[key][i0:i1]
+        elif key == 'model_mass':
+            return float(store.model_mass[self._index])
+        elif key == 'nage':
+            return int(i1-i0)
+        elif key == 'mass':
+            return np.broadcast_to(store.model_mass[self._index], (i1-i0,))
+        raise KeyError(key)
+
+    def __iter__(self):
+        for key in ['model_mass', 'mass', 'nage'] + self._store.labels:
+            yield key
+
+    def __len__(self):
+        return 3+len(self._store.columns)
+
+    def __repr__(self):
+        return 'TrackView(model_mass={0}, nage={1})'.format(self['model_mass'], self['nage'])
@@ -24,7 +24,12 @@ setup(
     #              "pmstracks/tracks": ['*','*/*','*/*/*']},
     setup_requires=['setuptools_scm'],
     include_package_data=True,
+    python_requires=">=3.8",
     install_requires=["matplotlib","numpy", "scipy"],
+    entry_points={
+        'console_scripts': ['pmstracks-derive=pmstracks.cli:main',
+                            'pmstracks-serve=pmstracks.server:main'],
+    },
     #data_files=[('pmstracks/tracks', ['*/*','*/*/*'])],
     classifiers=[
         "Development Status :: 3 - Alpha",
@@ -32,7 +37,8 @@ setup(
         "Intended Audience :: Science/Research",
         # "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
-        'Programming Language :: Python :: 2',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
     ],
     # ext_modules = ["DiscEvolution"]
 )
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the line by line reference readers are in the benchmarks directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from pmstracks import PMSTracks
+
+
+@pytest.fixture(scope='session')
+def bhac15():
+    return PMSTracks('BHAC15', cache=False)
+
+
+@pytest.fixture(scope='session')
+def sample_points(bhac15):
+    #
+    # random points around the tracks, plus points outside the mass and age ranges
+    #   and nan values
+    rng = np.random.default_rng(1)
+    mass = np.concatenate([10.**rng.uniform(np.log10(0.005), np.log10(2.), 400),
+                           [bhac15.mass[0], bhac15.mass[-1], 0., np.nan, 0.5, np.nan]])
+    age = np.concatenate([rng.uniform(5., 10.5, 400), [7., 7., 7., 7., np.nan, np.nan]])
+    return mass, age
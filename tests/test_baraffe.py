@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks, registry
+
+BARAFFE_SETS = [name for name in registry.track_names() if name.startswith(('BCAH98', 'DUSTY00', 'COND03', 'PLANET08'))]
+
+
+@pytest.mark.parametrize('name', BARAFFE_SETS)
+def test_baraffe_tracks_sorted(name):
+    pms = PMSTracks(name, cache=False)
+    assert len(pms.tracks) >= 2
+    assert np.all(np.diff(pms.mass) > 0)
+    for track in pms.tracks:
+        assert len(track['lage']) >= 2
+        assert np.all(np.diff(track['lage']) > 0)
+        assert np.all(np.isfinite(track['llum'])) and np.all(np.isfinite(track['teff']))
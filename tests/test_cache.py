@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import os
+import shutil
+
+import numpy as np
+
+from pmstracks import PMSTracks
+from pmstracks import cache as tcache
+from reference_readers import same_tracks
+
+
+def test_cache_round_trip(tmp_path, capsys):
+    ref = PMSTracks('BHAC15', cache=False)
+    first = PMSTracks('BHAC15', cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('BHAC15_*.npz'))) == 1
+    capsys.readouterr()
+    second = PMSTracks('BHAC15', cache_dir=str(tmp_path), verbose=True)
+    assert 'Tracks read from cache' in capsys.readouterr().out
+    for pms in (first, second):
+        np.testing.assert_array_equal(pms.mass, ref.mass)
+        for name in ref.store.columns:
+            np.testing.assert_array_equal(pms.store.columns[name], ref.store.columns[name])
+
+
+def test_cache_invalidated_by_mtime(tmp_path):
+    ptrk = PMSTracks('BHAC15', cache=False)
+    infile = str(tmp_path / os.path.basename(ptrk.infile_models))
+    shutil.copy(ptrk.infile_models, infile)
+    mass, tracks = ptrk.reader()
+    cfile = tcache.cache_file(str(tmp_path / 'cache'), 'BHAC15')
+    tcache.save_tracks(cfile, mass, tracks, tcache.files_signature(infile))
+    #
+    cmass, ctracks = tcache.load_tracks(cfile, tcache.files_signature(infile))
+    assert same_tracks(mass, tracks, cmass, ctracks)
+    st = os.stat(infile)
+    os.utime(infile, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert tcache.load_tracks(cfile, tcache.files_signature(infile)) == (None, None)
+
+
+def test_cache_keyed_by_version(tmp_path, monkeypatch):
+    cfile = tcache.cache_file(str(tmp_path), 'BHAC15')
+    monkeypatch.setattr(tcache, '__version__', '0.0.0')
+    assert tcache.cache_file(str(tmp_path), 'BHAC15') != cfile
+
+
+def test_only_the_complete_set_is_cached(tmp_path):
+    ref = PMSTracks('Siess00', cache=False, mass_range=(0.5, 1.))
+    PMSTracks('Siess00', cache_dir=str(tmp_path), mass_range=(0.5, 1.))
+    assert list(tmp_path.glob('*.npz')) == []
+    #
+    # the windows are then taken from the cache of the complete set
+    PMSTracks('Siess00', cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob('Siess00_*.npz'))) == 1
+    for mass_range in ((0.5, 1.), (1., 2.)):
+        window = PMSTracks('Siess00', cache_dir=str(tmp_path), mass_range=mass_range)
+        if mass_range == (0.5, 1.):
+            np.testing.assert_array_equal(window.mass, ref.mass)
+            np.testing.assert_array_equal(window.store.columns['llum'], ref.store.columns['llum'])
+    assert len(list(tmp_path.glob('Siess00_*.npz'))) == 1
+
+
+def test_old_cache_files_pruned(tmp_path):
+    stale = [tmp_path / 'BHAC15_0123456789ab.npz', tmp_path / 'BHAC15_abcdefabcdef.npz']
+    other = [tmp_path / 'Siess00_0123456789ab.npz', tmp_path / 'BHAC15_notes.txt']
+    for f in stale + other:
+        f.write_bytes(b'')
+    PMSTracks('BHAC15', cache_dir=str(tmp_path))
+    cached = list(tmp_path.glob('BHAC15_*.npz'))
+    assert len(cached) == 1 and cached[0] not in stale
+    assert all(f.exists() for f in other)
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks
+
+
+@pytest.fixture
+def pms():
+    return PMSTracks('BHAC15', cache=False)
+
+
+def test_isochrone_cache(pms):
+    iso = pms.isochrone(6.5)
+    ref, status = pms.interpolator_bilinear_batch(pms.mass, 6.5, 'teff')
+    np.testing.assert_array_equal(iso['teff'], ref)
+    np.testing.assert_array_equal(iso['status'], status)
+    assert pms.isochrone(6.5) is iso
+    assert pms.isochrone_cache.stats()['hits'] == 1
+    with pytest.raises(ValueError):
+        iso['teff'][0] = 0.
+    #
+    pms.tracks_changed()
+    assert len(pms.isochrone_cache) == 0
+    assert pms.isochrone(6.5) is not iso
+
+
+def test_query_cache_quantized(pms):
+    assert pms.query_cache is None
+    pms.enable_query_cache(mass_precision=1.e-3, age_precision=1.e-3)
+    value, status, message = pms.interpolator_bilinear(0.5002, 6.5004, 'llum')
+    ref, ref_status, ref_message = pms.interpolator_bilinear(0.5, 6.5, 'llum')
+    assert value == ref and status == ref_status
+    stats = pms.query_cache.stats()
+    assert stats['hits'] == 1 and stats['size'] == 1
+    #
+    pms.tracks_changed()
+    assert len(pms.query_cache) == 0
+    pms.disable_query_cache()
+    exact, status, message = pms.interpolator_bilinear(0.5002, 6.5004, 'llum')
+    assert exact != value
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import io
+
+import numpy as np
+import pytest
+
+from pmstracks import cli
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv('PMSTRACKS_CACHE_DIR', str(tmp_path))
+
+
+def _derive(text, **kwargs):
+    out = io.StringIO()
+    nlines = cli.derive_catalog(io.StringIO(text), out, **kwargs)
+    return nlines, out.getvalue().splitlines()
+
+
+def test_bad_inputs_are_flagged():
+    nlines, lines = _derive('mass,age\n0.5,7\n,7\nabc,7\n0.5,inf\n0.5,nan\n')
+    assert nlines == 5 and lines[0] == 'mass,age,llum,teff,status'
+    rows = [line.split(',') for line in lines[1:]]
+    assert rows[0][-1] == '0'
+    for row in rows[1:]:
+        assert row[-3:] == ['nan', 'nan', str(cli.BAD_INPUT)]
+
+
+def test_commented_header():
+    nlines, lines = _derive('# a commented description\n# id age mass\n1 7.0 0.5\n2 6.5 0.2\n')
+    ref_nlines, ref = _derive('id age mass\n1 7.0 0.5\n2 6.5 0.2\n')
+    assert nlines == 2
+    assert lines[0] == '# id age mass llum teff status'
+    assert lines[1:] == ref[1:]
+    # a header that is not commented is still taken from the first line
+    nlines, lines = _derive('# a commented description\nid age mass\n1 7.0 0.5\n')
+    assert nlines == 1 and lines[1:] == ref[1:2]
+
+
+@pytest.mark.parametrize('mode', ['forward', 'inverse'])
+def test_workers_keep_the_order(mode):
+    rng = np.random.default_rng(3)
+    if mode == 'forward':
+        text = 'mass age\n' + ''.join('{0} {1}\n'.format(m, a) for m, a in
+                                      zip(rng.uniform(0.02, 1.4, 2000), rng.uniform(6., 8., 2000)))
+    else:
+        text = 'llum teff\n' + ''.join('{0} {1}\n'.format(l, t) for l, t in
+                                       zip(rng.uniform(-3., 0.5, 2000), rng.uniform(2500., 5000., 2000)))
+    serial = _derive(text, mode=mode, chunk_size=150)
+    parallel = _derive(text, mode=mode, chunk_size=150, n_workers=2)
+    assert serial[0] == 2000
+    assert parallel == serial
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks, TrackEnsemble
+from pmstracks import inversion
+
+SETS = ('BHAC15', 'Siess00')
+
+
+@pytest.fixture(scope='module')
+def stars():
+    rng = np.random.default_rng(24)
+    mass = rng.uniform(0.1, 1.2, (20, 15))
+    age = rng.uniform(6., 8., (20, 15))
+    return mass, age
+
+
+def test_thread_and_process_executors_agree(stars):
+    mass, age = stars
+    results = []
+    for executor in ('thread', 'process'):
+        with TrackEnsemble(SETS, n_workers=2, executor=executor, chunk_size=64, cache=False) as ens:
+            values, status = ens.interpolate(mass, age)
+            llum, teff = values['llum'][..., 0], values['teff'][..., 0]
+            inv_mass, inv_age, inv_status = ens.invert(llum, teff)
+        assert status.shape == mass.shape + (len(SETS),)
+        assert inv_mass.shape == mass.shape + (len(SETS),)
+        results.append((values['llum'], values['teff'], status, inv_mass, inv_age, inv_status))
+    for thread, process in zip(*results):
+        np.testing.assert_array_equal(thread, process)
+
+
+def test_ensemble_columns_are_the_sets(stars):
+    mass, age = stars
+    with TrackEnsemble(SETS, cache=False) as ens:
+        values, status = ens.interpolate(mass, age, 'llum')
+        for j, pms in enumerate(ens.tracks):
+            expected, expected_status = pms.interpolator_bilinear_multi(mass, age, ['llum'])
+            np.testing.assert_array_equal(values['llum'][..., j], expected['llum'])
+            np.testing.assert_array_equal(status[..., j], expected_status)
+
+
+def test_hrd_index_built_once_by_threads(monkeypatch, stars):
+    built = []
+    original = inversion.HRDInversion.__init__
+
+    def counting_init(self, pms):
+        built.append(pms.tracks_name)
+        original(self, pms)
+    monkeypatch.setattr(inversion.HRDInversion, '__init__', counting_init)
+    pms = PMSTracks('BHAC15', cache=False)
+    with TrackEnsemble([pms], n_workers=4, chunk_size=10) as ens:
+        mass, age, status = ens.invert(np.full(100, -0.5), np.full(100, 3500.))
+    assert built == ['BHAC15']
+    assert mass.shape == (100, 1)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks, TrackGrid
+
+
+@pytest.fixture(scope='module')
+def lmix():
+    return TrackGrid('BCAH98_lmix', cache=False)
+
+
+@pytest.mark.parametrize('index', [0, 1, 2])
+def test_grid_at_a_node_is_the_set(lmix, index):
+    rng = np.random.default_rng(23)
+    trk = PMSTracks(lmix.tracks[index].tracks_name, cache=False)
+    m = rng.uniform(trk.mass[0], trk.mass[-1], 300)
+    a = rng.uniform(6., 9., 300)
+    values, status = lmix.interpolate(m, a, lmix.values[index], ['llum', 'teff'])
+    expected, expected_status = trk.interpolator_bilinear_multi(m, a, ['llum', 'teff'])
+    np.testing.assert_array_equal(status, expected_status)
+    for label in ('llum', 'teff'):
+        np.testing.assert_allclose(values[label], expected[label], rtol=1e-12, equal_nan=True)
+
+
+def test_grid_between_nodes(lmix):
+    m, a = np.full(3, 0.9), np.full(3, 7.)
+    values, status = lmix.interpolate(m, a, [1.0, 1.25, 1.5], 'llum')
+    np.testing.assert_array_equal(status, 0)
+    assert values['llum'][1] == pytest.approx(0.5*(values['llum'][0]+values['llum'][2]))
+    values, status = lmix.interpolate(0.9, 7., 3.)
+    assert status == 4 and np.isnan(values['llum'])
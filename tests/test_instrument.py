@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import instrument
+
+
+@pytest.fixture
+def metrics():
+    instrument.reset()
+    instrument.enable()
+    yield
+    instrument.disable()
+    instrument.reset()
+
+
+def test_snapshot_counts_queries(bhac15, metrics):
+    mass = np.array([0.5, 0.5, 5.])
+    age = np.array([6.5, 11., 6.5])
+    bhac15.interpolator_bilinear_batch(mass, age, 'llum')
+    bhac15.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    bhac15.interpolator_bilinear(0.5, 6.5, 'teff')
+    snap = instrument.snapshot()
+    phases = snap['phases']
+    assert phases['interpolator_bilinear_batch']['calls'] == 1
+    assert phases['interpolator_bilinear_batch']['points'] == 3
+    # the batch interpolator calls the multi one
+    assert phases['interpolator_bilinear_multi']['calls'] == 2
+    assert snap['status']['interpolator_bilinear_multi'] == {0: 2, 1: 2, 2: 2}
+    assert snap['status']['interpolator_bilinear'] == {0: 1}
+
+
+def test_disabled_is_a_noop(bhac15):
+    instrument.reset()
+    assert not instrument.is_enabled()
+    bhac15.interpolator_bilinear_batch([0.5], [6.5], 'llum')
+    bhac15.interpolator_bilinear(0.5, 6.5, 'llum')
+    assert instrument.snapshot() == {'phases': {}, 'status': {}}
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize('label', ['llum', 'teff'])
+def test_batch_equals_scalar(bhac15, sample_points, label):
+    mass, age = sample_points
+    value, status = bhac15.interpolator_bilinear_batch(mass, age, label)
+    for i in range(len(mass)):
+        ref, ref_status, message = bhac15.interpolator_bilinear(mass[i], age[i], label)
+        assert status[i] == ref_status
+        np.testing.assert_array_equal(value[i], ref)
+
+
+def test_batch_status_codes(bhac15, sample_points):
+    mass, age = sample_points
+    value, status = bhac15.interpolator_bilinear_batch(mass, age, 'llum')
+    assert set(np.unique(status)) <= {0, 1, 2}
+    assert (status[(mass < bhac15.mass[0]) | (mass > bhac15.mass[-1])] == 1).all()
+    assert (status == 0).any() and (status == 2).any()
+
+
+def test_batch_keeps_shape(bhac15):
+    mass = np.full((3, 4), 0.5)
+    age = np.linspace(6., 7., 4)
+    value, status = bhac15.interpolator_bilinear_batch(mass, age, 'teff')
+    assert value.shape == (3, 4) and status.shape == (3, 4)
+
+
+def test_multi_equals_batch(bhac15, sample_points):
+    mass, age = sample_points
+    values, status = bhac15.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    for label in ('llum', 'teff'):
+        ref, ref_status = bhac15.interpolator_bilinear_batch(mass, age, label)
+        np.testing.assert_array_equal(values[label], ref)
+        np.testing.assert_array_equal(status, ref_status)
+
+
+def test_sort_tracks_reorders_all_columns(bhac15):
+    #
+    # a track read out of age order, with an extra per-point column
+    rng = np.random.default_rng(0)
+    tracks = []
+    for trk in bhac15.tracks[:3]:
+        tracks.append(dict((key, np.array(trk[key])) for key in ('mass', 'lage', 'llum', 'teff')))
+        tracks[-1]['model_mass'] = trk['model_mass']
+        tracks[-1]['nage'] = trk['nage']
+        tracks[-1]['radius'] = np.arange(trk['nage'], dtype=float)
+    ref = [dict(trk) for trk in tracks]
+    for trk in tracks:
+        perm = rng.permutation(trk['nage'])
+        for key in ('mass', 'lage', 'llum', 'teff', 'radius'):
+            trk[key] = trk[key][perm]
+
+    class Tracks(object):
+        pass
+    obj = Tracks()
+    obj.mass = np.array(bhac15.mass[:3][::-1])
+    obj.tracks = tracks[::-1]
+    mass, tracks = type(bhac15)._sort_tracks(obj)
+    np.testing.assert_array_equal(mass, bhac15.mass[:3])
+    for trk, trk_ref in zip(tracks, ref):
+        for key in ('mass', 'lage', 'llum', 'teff', 'radius'):
+            np.testing.assert_array_equal(trk[key], trk_ref[key])
+
+
+def test_domain_status_matches_batch_status(bhac15, sample_points):
+    mass, age = sample_points
+    domain = bhac15.domain_status(mass, age)
+    value, status = bhac15.interpolator_bilinear_batch(mass, age, 'llum')
+    np.testing.assert_array_equal((domain & 63) != 0, status != 0)
+    np.testing.assert_array_equal((domain & bhac15.DOMAIN_NOT_FINITE) != 0,
+                                  ~(np.isfinite(mass) & np.isfinite(age)))
+    np.testing.assert_array_equal(bhac15.in_domain(mass, age), domain == 0)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+
+
+def test_invert_round_trip(bhac15):
+    rng = np.random.default_rng(2)
+    mass = 10.**rng.uniform(np.log10(0.02), np.log10(1.4), 20000)
+    age = rng.uniform(6., 8., 20000)
+    values, status = bhac15.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    ok = status == 0
+    imass, iage, istatus = bhac15.invert_hrd(values['llum'][ok], values['teff'][ok])
+    good = istatus == 0
+    assert good.mean() > 0.7
+    assert np.median(np.abs(imass[good]/mass[ok][good]-1.)) < 0.01
+    assert np.percentile(np.abs(iage[good]-age[ok][good]), 99) < 0.3
+    assert np.isnan(iage[istatus > 0]).all()
+
+
+def test_invert_flags_overlapping_tracks(bhac15):
+    # stars close to 1.1 Msun and Log10(age)=7.4, where the tracks overlap
+    mass = np.linspace(1.05, 1.15, 50)
+    age = np.full(50, 7.4)
+    values, status = bhac15.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    imass, iage, istatus = bhac15.invert_hrd(values['llum'], values['teff'])
+    assert set(np.unique(istatus)) <= {0, 3}
+    assert (np.abs(iage-age)[istatus == 0] < 0.1).all()
+
+
+def test_invert_mc_independent_of_chunk_size(bhac15):
+    llum = [-1., -0.5, 0.]
+    teff = [3200., 3800., 4300.]
+    small = bhac15.invert_hrd_mc(llum, teff, 0.05, 50., ndraw=500, chunk_size=500, seed=1)
+    large = bhac15.invert_hrd_mc(llum, teff, 0.05, 50., ndraw=500, chunk_size=100000, seed=1)
+    other = bhac15.invert_hrd_mc(llum, teff, 0.05, 50., ndraw=500, chunk_size=100000, seed=2)
+    for key in ('mass', 'age', 'fvalid'):
+        np.testing.assert_array_equal(small[key], large[key])
+    assert not np.array_equal(small['age'], other['age'])
+    assert (small['fvalid'] > 0.5).all()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks.lattice import TrackLattice
+
+
+@pytest.fixture(scope='module')
+def lattice(bhac15):
+    return TrackLattice(bhac15, 100, 100)
+
+
+def test_lattice_close_to_tracks(lattice):
+    max_abs, max_rel = lattice.max_error('llum')
+    assert max_abs < 0.1
+    assert max_rel == pytest.approx(10.**max_abs-1.)
+    max_abs, max_rel = lattice.max_error('teff')
+    assert max_rel < 0.05
+
+
+def test_lattice_invalid_inputs(lattice):
+    # regression: nan and non positive masses raised IndexError
+    mass = np.array([np.nan, 0., -1., np.inf, 0.5, 0.5, 0.5])
+    age = np.array([7., 7., 7., 7., np.nan, np.inf, -np.inf])
+    value, status = lattice.interpolate(mass, age, 'llum')
+    np.testing.assert_array_equal(status, [1, 1, 1, 1, 2, 2, 2])
+    assert np.isnan(value[:5]).all()
+
+
+def test_lattice_max_error_without_valid_points(bhac15):
+    coarse = TrackLattice(bhac15, 3, 3)
+    assert not coarse.valid.any()
+    assert np.isnan(coarse.max_error('llum')).all()
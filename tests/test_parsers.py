@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import pytest
+
+from pmstracks import PMSTracks
+from reference_readers import REFERENCE_READERS, same_tracks
+
+
+@pytest.mark.parametrize('name', ['BHAC15', 'Siess00', 'F16_std', 'F16_mag'])
+def test_reader_equals_reference(name):
+    ptrk = PMSTracks(name, cache=False)
+    mass_ref, tracks_ref = REFERENCE_READERS[name](ptrk.infile_models)
+    mass, tracks = ptrk.reader()
+    assert same_tracks(mass_ref, tracks_ref, mass, tracks)
+
+
+def test_parallel_reader_equals_serial():
+    serial = PMSTracks('Siess00', cache=False)
+    parallel = PMSTracks('Siess00', cache=False, n_workers=2)
+    assert same_tracks(*(serial.reader() + parallel.reader()))
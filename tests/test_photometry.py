@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import parsers, registry, TRACKS_DIR
+from pmstracks.photometry import PhotometricGrid
+
+
+def _tables(name, system):
+    track_set = registry.get_track_set(name)
+    parser = getattr(parsers, track_set.photometry_parser)
+    return parser(track_set.photometry_file(system, TRACKS_DIR))
+
+
+@pytest.mark.parametrize('name, system', [('BHAC15', '2MASS'), ('BCAH98', 'CIT'), ('DUSTY00', 'CIT')])
+def test_magnitudes_at_the_nodes(bhac15, name, system):
+    lage, labels, tables = _tables(name, system)
+    grid = PhotometricGrid.from_tables(lage, labels, tables)
+    for age, table in zip(lage, tables):
+        values, status = grid.interpolate(table[:, 0], np.full(len(table), age))
+        np.testing.assert_array_equal(status, 0)
+        for j, label in enumerate(labels[1:]):
+            np.testing.assert_allclose(values[label], table[:, j+1], rtol=1e-10, atol=1e-10)
+    if name == 'BHAC15':
+        mags, status = bhac15.magnitudes(tables[0][:, 0], np.full(len(tables[0]), lage[0]), system)
+        np.testing.assert_array_equal(status, 0)
+        np.testing.assert_allclose(mags[labels[-1]], tables[0][:, -1], rtol=1e-10)
+
+
+def test_isochrones_with_different_mass_ranges():
+    # the second isochrone starts at a higher mass and has a node missing in the first
+    lage = [6., 7.]
+    tables = [np.array([[0.1, 1.], [0.3, 3.]]), np.array([[0.2, 4.], [0.25, 4.5], [0.4, 6.]])]
+    grid = PhotometricGrid.from_tables(lage, ['mass', 'M'], tables)
+    np.testing.assert_allclose(grid.values[0, :, 0], [1., 2., 2.5, 3., np.nan])
+    #
+    # half way in age the mass range is [0.15, 0.35], and the middle of it is read at the
+    #   middle of the range of each isochrone
+    values, status = grid.interpolate([0.12, 0.16, 0.25, 0.35, 0.38], [6.5]*5, 'M')
+    np.testing.assert_array_equal(status, [2, 0, 0, 0, 2])
+    np.testing.assert_allclose(values['M'][1:4], [0.5*(1.1+4.1), 0.5*(2.+5.), 0.5*(3.+6.)])
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import io
+
+import numpy as np
+import pytest
+
+from pmstracks.population import Population, KroupaIMF, ConstantSFH
+
+
+@pytest.fixture(scope='module')
+def population(bhac15):
+    return Population(bhac15, KroupaIMF(0.02, 1.4), ConstantSFH(6., 7.))
+
+
+def test_seed_reproducible(population):
+    a = population.sample(3000, shard_size=1000, seed=7)
+    b = population.sample(3000, shard_size=1000, seed=7)
+    c = population.sample(3000, shard_size=1000, seed=8)
+    for col in population.columns:
+        np.testing.assert_array_equal(a[col], b[col])
+    assert not np.array_equal(a['mass'], c['mass'])
+    shard = population.sample_shard(1000, Population.shard_seeds(7, 3)[2])
+    np.testing.assert_array_equal(shard['mass'], a['mass'][2000:])
+
+
+def test_workers_give_same_population(population):
+    a = population.sample(2500, shard_size=1000, seed=3)
+    b = population.sample(2500, shard_size=1000, seed=3, n_workers=2)
+    for col in population.columns:
+        np.testing.assert_array_equal(a[col], b[col])
+
+
+def test_write(population):
+    out = io.StringIO()
+    assert population.write(out, 10, seed=1) == 10
+    lines = out.getvalue().splitlines()
+    assert lines[0].split() == population.columns and len(lines) == 11
+
+
+def test_default_sfh(bhac15):
+    sfh = Population(bhac15).sfh
+    assert 5. <= sfh.age_min < sfh.age_max
+    with pytest.raises(ValueError):
+        ConstantSFH(7., 6.)
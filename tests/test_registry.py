@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import subprocess
+import sys
+
+import pytest
+
+import pmstracks
+from pmstracks import PMSTracks
+
+
+@pytest.mark.parametrize('name', ['BHAC15', 'Siess00', 'BCAH98', 'PLANET08_Z0.02'])
+def test_list_tracks_matches_loaded_tracks(name):
+    entry = pmstracks.list_tracks()[name]
+    pms = PMSTracks(name, cache=False)
+    assert entry['mass_range'] == [pms.mass[0], pms.mass[-1]]
+    assert entry['age_range'] == [pms.age_min.min(), pms.age_max.max()]
+    assert entry['ntracks'] == len(pms.tracks)
+    assert len(entry['files']) >= 1
+
+
+def test_import_is_lazy():
+    code = ("import sys, pmstracks; "
+            "print(int(any(m.split('.')[0] in ('matplotlib', 'scipy') for m in sys.modules)))")
+    out = subprocess.check_output([sys.executable, '-c', code])
+    assert out.strip() == b'0'
+
+
+def test_star_import():
+    namespace = {}
+    exec('from pmstracks import *', namespace)
+    assert namespace['PMSTracks'] is PMSTracks
+    assert 'list_tracks' in namespace and 'Population' in namespace
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import json
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+import numpy as np
+import pytest
+
+from pmstracks.server import TrackServer, _to_json
+
+
+@pytest.fixture(scope='module')
+def server():
+    srv = TrackServer(['BHAC15'], port=0)
+    srv.start()
+    yield srv
+    srv.shutdown()
+
+
+def test_single_label_string(server):
+    # regression: a bare string was split in single characters
+    answer, npoints = server.interpolate({'mass': 0.5, 'age': 7., 'labels': 'llum'})
+    assert sorted(answer) == ['llum', 'status']
+    assert answer['status'] == 0 and npoints == 1
+
+
+def test_interpolate_matches_tracks(server, bhac15):
+    mass = [0.1, 0.5, 5.]
+    answer, npoints = server.interpolate({'mass': mass, 'age': 6.5})
+    values, status = bhac15.interpolator_bilinear_multi(np.array(mass), 6.5, ['llum', 'teff'])
+    assert answer['status'] == status.tolist()
+    assert answer['teff'] == values['teff'].tolist()
+
+
+def test_non_finite_values_are_null():
+    # regression: infinite values were written as Infinity
+    values = _to_json(np.array([np.inf, -np.inf, np.nan, 1.]), False)
+    assert json.dumps(values, allow_nan=False) == '[null, null, null, 1.0]'
+    assert _to_json(np.array([np.nan]), True) is None
+
+
+def _post(server, path, body):
+    host, port = server.address[:2]
+    request = Request('http://{0}:{1}{2}'.format(host, port, path), data=body.encode(),
+                      headers={'Content-Type': 'application/json'})
+    try:
+        response = urlopen(request, timeout=10)
+        return response.getcode(), json.loads(response.read().decode())
+    except HTTPError as e:
+        return e.code, json.loads(e.read().decode())
+
+
+@pytest.mark.parametrize('body', ['[1, 2]', '3', '"mass"', 'null'])
+def test_query_must_be_an_object(server, body):
+    # regression: a JSON body that is not an object killed the handler thread
+    errors = server.stats.as_dict()['errors']
+    code, answer = _post(server, '/interpolate', body)
+    assert code == 400 and 'error' in answer
+    assert server.stats.as_dict()['errors'] == errors+1
+    code, answer = _post(server, '/interpolate', '{"mass": 0.5, "age": 7.0}')
+    assert code == 200 and answer['status'] == 0
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import concurrent.futures
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks
+
+
+def test_decimation_error_within_tolerance(bhac15):
+    tol = {'llum': 0.002, 'teff': 2.}
+    decimated = PMSTracks('BHAC15', cache=False, decimate_tol=tol)
+    assert decimated.decimation_ratio > 1.
+    np.testing.assert_array_equal(decimated.mass, bhac15.mass)
+    for trk, dtrk in zip(bhac15.tracks, decimated.tracks):
+        assert dtrk['lage'][0] == trk['lage'][0] and dtrk['lage'][-1] == trk['lage'][-1]
+        for label in tol:
+            # the tracks have a few repeated ages, compare the two interpolations
+            ref = np.interp(trk['lage'], trk['lage'], trk[label])
+            err = np.abs(np.interp(trk['lage'], dtrk['lage'], dtrk[label])-ref)
+            assert err.max() <= tol[label]*(1.+1.e-9)
+
+
+def _attached_interpolation(descriptor, mass, age):
+    pms = PMSTracks.attach(descriptor)
+    values, status = pms.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    return pms.tracks_name, values, status
+
+
+def test_publish_attach_in_spawned_process(bhac15):
+    pms = PMSTracks('BHAC15', cache=False)
+    mass = np.linspace(0.05, 1.2, 50)
+    age = np.linspace(6., 7.5, 50)
+    descriptor = pms.publish()
+    try:
+        with pytest.raises(RuntimeError):
+            pms.publish()
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            name, values, status = pool.submit(_attached_interpolation, descriptor, mass, age).result()
+    finally:
+        pms.unpublish()
+    ref, ref_status = bhac15.interpolator_bilinear_multi(mass, age, ['llum', 'teff'])
+    assert name == 'BHAC15'
+    np.testing.assert_array_equal(status, ref_status)
+    for label in ref:
+        np.testing.assert_array_equal(values[label], ref[label])
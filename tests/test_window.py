@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from pmstracks import PMSTracks
+
+
+@pytest.mark.parametrize('name', ['BHAC15', 'Siess00'])
+def test_windowed_load_matches_full_load(name):
+    mass_range, age_range = (0.3, 1.2), (6.0, 7.5)
+    full = PMSTracks(name, cache=False)
+    window = PMSTracks(name, cache=False, mass_range=mass_range, age_range=age_range)
+    assert len(window.tracks) < len(full.tracks)
+
+    rng = np.random.default_rng(20)
+    m = rng.uniform(mass_range[0], mass_range[1], 500)
+    a = rng.uniform(age_range[0], age_range[1], 500)
+    v_full, s_full = full.interpolator_bilinear_batch(m, a, 'llum')
+    v_win, s_win = window.interpolator_bilinear_batch(m, a, 'llum')
+    np.testing.assert_array_equal(s_win, s_full)
+    np.testing.assert_allclose(v_win, v_full, rtol=0, atol=1e-12, equal_nan=True)